@@ -1,9 +1,12 @@
 import sys
-from flask import Flask, render_template_string, redirect, url_for, request, flash, jsonify
+from flask import Flask, render_template_string, redirect, url_for, request, flash, jsonify, Response
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from tasks import scrape_and_transform_chain, process_document_task
 from db_extractor import PostgresExtractor
+from metrics import get_queue_metrics, render_prometheus
+from scraper.nashville.crawl_state import reset_crawl_state
+from uploads import save_upload, get_upload_status, set_upload_status, clear_upload_records, is_duplicate_upload
 import os
 import redis
 UPLOAD_FOLDER = '/app/uploads'
@@ -325,6 +328,16 @@ def scrape_status():
         print(f"Error reading Redis status: {e}", file=sys.stderr)
         status = 'idle'         
     return jsonify({'status': status})
+@app.route('/queue_metrics')
+def queue_metrics():
+    try:
+        return jsonify({'queues': get_queue_metrics()})
+    except Exception as e:
+        print(f"Error reading queue metrics: {e}", file=sys.stderr)
+        return jsonify({'queues': {}, 'error': str(e)}), 500
+@app.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 @app.route('/upload_document', methods=['POST'])
 def upload_document():
     uploaded_files = request.files.getlist('document')
@@ -333,25 +346,34 @@ def upload_document():
         flash('No files selected for upload.', 'error')
         return redirect(url_for('index'))
     redis_client = get_redis_connection()
-    if redis_client:
-        try:
-            redis_client.set('scrape_status', 'running')
-            print("Set scrape_status to 'running' for file upload.")
-        except Exception as e:
-            print(f"Error setting Redis status: {e}", file=sys.stderr)
-    else:
+    if not redis_client:
         print("Redis client not available, skipping status set.")
     files_processed = 0
-    files_skipped = 0    
+    files_skipped = 0
     for file in uploaded_files:
         if file and allowed_file(file.filename):
             try:
                 filename = secure_filename(file.filename)
                 file_extension = filename.rsplit('.', 1)[1].lower()
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                print(f"✓ Saved file for processing: {filepath}")
-                process_document_task.delay(filepath, file_extension)
+                content_hash, filepath = save_upload(file, app.config['UPLOAD_FOLDER'], file_extension)
+                print(f"✓ Saved file for processing: {filepath} ({filename})")
+                existing = get_upload_status(redis_client, content_hash)
+                if is_duplicate_upload(existing):
+                    print(f"Upload {filename} matches {content_hash} ({existing.get('status')}), skipping.")
+                    if existing.get('status') == 'complete':
+                        flash(f'{filename} was already processed as {existing.get("filename", filename)}.', 'success')
+                    else:
+                        flash(f'{filename} is already being processed as {existing.get("filename", filename)} ({existing.get("status")}).', 'warning')
+                    continue
+                if redis_client and files_processed == 0:
+                    try:
+                        redis_client.set('scrape_status', 'running')
+                        print("Set scrape_status to 'running' for file upload.")
+                    except Exception as e:
+                        print(f"Error setting Redis status: {e}", file=sys.stderr)
+                set_upload_status(redis_client, content_hash, 'queued',
+                                  filename=filename, extension=file_extension)
+                process_document_task.delay(filepath, file_extension, content_hash, filename)
                 print(f"Dispatched document task for {filename}.")
                 files_processed += 1
             except Exception as e:
@@ -368,6 +390,12 @@ def upload_document():
         flash(
             f'Skipped {files_skipped} file(s) due to errors or disallowed types.', 'warning')            
     return redirect(url_for('index'))
+@app.route('/upload_status/<content_hash>')
+def upload_status(content_hash):
+    record = get_upload_status(get_redis_connection(), content_hash)
+    if not record:
+        return jsonify({'hash': content_hash, 'status': 'unknown'}), 404
+    return jsonify({'hash': content_hash, **record})
 @app.route('/clear', methods=['POST'])
 def clear_data():
     conn = None
@@ -380,6 +408,8 @@ def clear_data():
             "TRUNCATE TABLE events, raw_data RESTART IDENTITY CASCADE;")
         conn.commit()
         print("Database cleared by user action.")
+        clear_upload_records(get_redis_connection())
+        reset_crawl_state()
         flash('All event and raw data cleared successfully.', 'success')
         cursor.close()
     except Exception as e:
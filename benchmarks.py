@@ -0,0 +1,378 @@
+import os
+import re
+import json
+import argparse
+import random
+import tempfile
+import textwrap
+import time
+import pandas as pd
+import pymupdf
+from openpyxl import Workbook
+from pyproj import Transformer
+from scraper.nashville.spiders.nashville_arcgis import NashvilleArcGISSpider
+from scraper.nashville.document_extractor import DocumentExtractor
+from scraper.nashville.pdf_text import extract_pdf_pages
+from scraper.nashville import line_classifier
+from scraper.nashville.spiders.pdf_spider import PDFSpider
+from llm_prefilter import evaluate
+from transform_registry import TRANSFORM_SPECS, TransformerRegistry
+def make_arcgis_features(count=10000, ring_size=12, seed=42):
+    """Synthetic ArcGIS query response: half points, half polygons, in EPSG:2274 feet around Nashville."""
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        x, y = rng.uniform(1700000, 1800000), rng.uniform(620000, 720000)
+        if i % 2:
+            geometry = {'rings': [[[x + rng.uniform(-200, 200), y + rng.uniform(-200, 200)] for _ in range(ring_size)]]}
+        else:
+            geometry = {'x': x, 'y': y}
+        features.append({'attributes': {'FacilityName': f"Facility {i}", 'Address': f"{i} Main St"}, 'geometry': geometry})
+    return features
+def per_point_coords(spider, features):
+    """The pre-vectorization path: one pyproj call and one Python centroid per feature."""
+    transformer = Transformer.from_crs(spider.SOURCE_CRS, spider.TARGET_CRS, always_xy=True)
+    coords = []
+    for feature in features:
+        geom = feature['geometry']
+        if 'x' in geom:
+            x, y = geom['x'], geom['y']
+        else:
+            ring = geom['rings'][0]
+            x = sum(p[0] for p in ring) / len(ring)
+            y = sum(p[1] for p in ring) / len(ring)
+        coords.append(transformer.transform(x, y))
+    return coords
+def bench_arcgis_reprojection(count=10000, repeat=3):
+    spider = NashvilleArcGISSpider()
+    features = make_arcgis_features(count)
+    timings = {}
+    for label, fn in (('per_point', lambda: per_point_coords(spider, features)),
+                      ('vectorized', lambda: spider._reproject(*spider._collect_coords(features)))):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        timings[label] = best
+        print(f"arcgis {label:<10} {count} features: {best * 1000:.1f} ms")
+    print(f"arcgis speedup: {timings['per_point'] / timings['vectorized']:.1f}x")
+    return timings
+def make_workbook(path, sheets=20, rows=200000, seed=42):
+    """Write a workbook with an empty first sheet (so every sheet is read) and data sheets holding `rows` rows in total."""
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    workbook.create_sheet('Summary')
+    rows_per_sheet = rows // (sheets - 1)
+    for sheet_index in range(1, sheets):
+        sheet = workbook.create_sheet(f"Sheet {sheet_index}")
+        sheet.append(['Event Export'])
+        sheet.append([])
+        sheet.append(['Event Name', 'Venue', 'Address', 'Date', 'Description', 'Website'])
+        for row in range(rows_per_sheet):
+            sheet.append([f"Event {sheet_index}-{row}", f"Venue {rng.randint(1, 500)}", f"{row} Broadway, Nashville, TN",
+                          f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", 'Live music ' * rng.randint(1, 5), None])
+    workbook.save(path)
+def legacy_excel_items(extractor):
+    """The pre-streaming reader: read_excel for sheet 0, then re-open the workbook once per sheet."""
+    df = pd.read_excel(extractor.file_path, sheet_name=0)
+    items = extractor._dataframe_to_items(df)
+    if items:
+        return items
+    all_items = []
+    for sheet_name in pd.ExcelFile(extractor.file_path).sheet_names:
+        all_items.extend(extractor._dataframe_to_items(pd.read_excel(extractor.file_path, sheet_name=sheet_name)))
+    return all_items
+def bench_excel_reader(sheets=20, rows=200000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'events.xlsx')
+        make_workbook(path, sheets, rows)
+        extractor = DocumentExtractor(path)
+        timings = {}
+        for label, fn in (('legacy', lambda: legacy_excel_items(extractor)),
+                          ('streaming', lambda: extractor.extract_items())):
+            started = time.perf_counter()
+            count = len(fn())
+            timings[label] = time.perf_counter() - started
+            print(f"excel {label:<10} {sheets} sheets / {rows} rows: {timings[label]:.2f} s, {count} items")
+        print(f"excel speedup: {timings['legacy'] / timings['streaming']:.1f}x")
+        return timings
+def make_event_frame(rows=200000, seed=42):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'Event Name': [f"Event {i}" if i % 50 else '' for i in range(rows)],
+        'Venue': [f"Venue {rng.randint(1, 500)}" for _ in range(rows)],
+        'Address': [f" {i} Broadway, Nashville, TN " for i in range(rows)],
+        'Date': [f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(rows)],
+        'Description': ['Live music ' * rng.randint(0, 5) for _ in range(rows)],
+        'Website': [f"https://example.com/e/{i}" if i % 3 else None for i in range(rows)],
+    })
+def legacy_frame_items(extractor, df):
+    """The pre-vectorization path: to_dict('records'), then per-cell cleaning, validation and building."""
+    df = extractor._normalize_dataframe_columns(df)
+    items = [extractor._clean_item(item) for item in df.to_dict('records')]
+    return [extractor._build_item(item) for item in extractor._validate_items(items)]
+def bench_dataframe_items(rows=200000):
+    frame = make_event_frame(rows)
+    with tempfile.NamedTemporaryFile(suffix='.csv') as placeholder:
+        extractor = DocumentExtractor(placeholder.name)
+        timings = {}
+        for label, fn in (('row_wise', lambda df: legacy_frame_items(extractor, df)),
+                          ('vectorized', extractor._dataframe_to_items)):
+            df = frame.copy()
+            started = time.perf_counter()
+            count = len(fn(df))
+            timings[label] = time.perf_counter() - started
+            print(f"dataframe {label:<10} {rows} rows: {timings[label]:.2f} s, {count} items")
+        print(f"dataframe speedup: {timings['row_wise'] / timings['vectorized']:.1f}x")
+        return timings
+def make_brochure(path, pages=500, seed=42):
+    """Write a text-heavy PDF brochure with `pages` pages of event listings."""
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        lines = []
+        for entry in range(12):
+            lines += [f"Event {page_number}-{entry}: Live at Venue {rng.randint(1, 500)}",
+                      f"Date: 2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                      f"Address: {rng.randint(1, 9999)} Broadway, Nashville, TN", '']
+        page.insert_text((40, 40), '\n'.join(lines), fontsize=8)
+    doc.save(path)
+    doc.close()
+def bench_pdf_pages(pages=500, workers=4):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'brochure.pdf')
+        make_brochure(path, pages)
+        timings = {}
+        for label, worker_count in (('serial', 1), ('parallel', workers)):
+            started = time.perf_counter()
+            text_pages = extract_pdf_pages(path, workers=worker_count)
+            timings[label] = time.perf_counter() - started
+            print(f"pdf {label:<10} {pages} pages, {worker_count} workers: {timings[label]:.2f} s, "
+                  f"{sum(len(text) for text in text_pages)} chars")
+        print(f"pdf speedup: {timings['serial'] / timings['parallel']:.1f}x")
+        return timings
+def make_labelled_pages(pages=200, seed=42):
+    """Labelled brochure blocks: dated listings (a few with only relative dates) among ads, directories and boilerplate."""
+    rng = random.Random(seed)
+    months = ['January', 'March', 'June', 'September', 'Oct', 'Dec']
+    samples = []
+    for page_number in range(pages):
+        page = []
+        for entry in range(10):
+            kind = rng.random()
+            if kind < 0.3:
+                date = (f"{rng.choice(months)} {rng.randint(1, 28)}, 2025" if rng.random() < 0.9
+                        else 'This Saturday night')
+                address = f"{rng.randint(1, 999)} Broadway, Nashville" if rng.random() < 0.7 else 'The Ryman'
+                page.append((f"Live at Venue {page_number}-{entry}\n{date}\n{address}\nTickets $20 at the door", True))
+            elif kind < 0.55:
+                page.append((f"Visit Joe's Diner {entry}! Best burgers in town.\nhttps://joes{entry}.example.com\n"
+                             f"Call 615-555-{rng.randint(1000, 9999)}", False))
+            elif kind < 0.8:
+                page.append((f"Hardware Co. {entry}\n{rng.randint(1, 999)} Main St\nOpen daily 9-5", False))
+            else:
+                page.append(('Published by the Nashville Visitors Bureau. All rights reserved. ' * 3, False))
+        samples.append(page)
+    return samples
+def bench_prefilter(pages=200, thresholds=(2, 3, 4, 5)):
+    samples = make_labelled_pages(pages)
+    results = {}
+    for threshold in thresholds:
+        results[threshold] = evaluate(samples, min_score=threshold)
+        print(f"prefilter min_score={threshold}: recall {results[threshold]['recall']:.2f}, "
+              f"precision {results[threshold]['precision']:.2f}, chars sent {results[threshold]['cost']:.0%}")
+    return results
+LEGACY_DATE_PATTERNS = [
+    r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s+\d{1,2},?\s+\d{4}',
+    r'\d{1,2}/\d{1,2}/\d{2,4}',
+    r'\d{4}-\d{2}-\d{2}'
+]
+LABELLED_LINES = [
+    ('https://www.nashville.com/event/harvest-nights/', 'url'),
+    ('Oct 2, 2025, 5:00pm to 9:00pm', 'date'),
+    ('10/31/2025', 'date'),
+    ('2025-12-31 Midnight countdown', 'date'),
+    ('1402 Clinton St', 'address'),
+    ('200 Broadway Ave.', 'address'),
+    ('Festival of Lights', 'name'),
+    ('Christmas Concert', 'name'),
+    ('Standup Comedy Showcase', 'name'),
+    ('Strawberry Festival', 'name'),
+    ('Adrift: A Boat Party', 'name'),
+    ('Hundreds of vendors and food trucks', 'name'),
+    ('free admission for kids', 'description'),
+    ('tickets on sale now', 'description'),
+]
+def legacy_classify(line):
+    """The pre-compilation PDFSpider path: uncompiled patterns and substring keyword scans per line."""
+    if re.search(PDFSpider.URL_PATTERN, line):
+        return 'url'
+    if any(re.search(pattern, line.lower()) for pattern in LEGACY_DATE_PATTERNS):
+        return 'date'
+    if any(keyword in line.lower() for keyword in PDFSpider.ADDRESS_KEYWORDS):
+        return 'address'
+    if 5 <= len(line) <= 100 and line[0].isupper():
+        return 'name'
+    return 'description'
+def load_fixture_lines(path='nashville_com_output.json'):
+    """Labelled lines from a scraped fixture: URLs and venue addresses, plus description text wrapped like PDF lines."""
+    with open(path) as f:
+        records = json.load(f)
+    labelled, unlabelled = [], []
+    for record in records:
+        labelled.append((record['url'].strip(), 'url'))
+        labelled.append((record['venue_address'].strip(), 'address'))
+        unlabelled += [line for paragraph in (record.get('description') or '').split('\n')
+                       for line in textwrap.wrap(paragraph.strip(), 70) if len(line) > 3]
+    return labelled, unlabelled
+def bench_line_classifier(lines=200000):
+    classifier = PDFSpider.LINE_CLASSIFIER
+    labelled, unlabelled = load_fixture_lines()
+    labelled += LABELLED_LINES
+    for label, fn in (('legacy', legacy_classify), ('compiled', classifier.classify)):
+        correct = sum(fn(line) == tag for line, tag in labelled)
+        print(f"classifier {label:<10} accuracy {correct}/{len(labelled)} labelled lines")
+    changed = sum(legacy_classify(line) != tag for line, tag in zip(unlabelled, classifier.classify_lines(unlabelled)))
+    print(f"classifier tags changed on {changed}/{len(unlabelled)} fixture description lines")
+    pool = [line for line, _ in labelled] + unlabelled
+    rng = random.Random(42)
+    dump = [rng.choice(pool) for _ in range(lines)]
+    timings = {}
+    for label, fn in (('legacy', lambda: [legacy_classify(line) for line in dump]),
+                      ('compiled', lambda: classifier.classify_lines(dump))):
+        started = time.perf_counter()
+        fn()
+        timings[label] = time.perf_counter() - started
+        print(f"classifier {label:<10} {lines} lines: {timings[label]:.2f} s")
+    print(f"classifier speedup: {timings['legacy'] / timings['compiled']:.1f}x")
+    return timings
+def make_raw_rows(rows=200000, seed=42):
+    """raw_data rows as run_transformations reads them, half SeatGeek events and half uploaded document rows."""
+    rng = random.Random(seed)
+    raw_rows = []
+    for i in range(rows):
+        spider = 'seatgeek' if i % 2 else 'document'
+        raw_rows.append((i, json.dumps({
+            'name': f"Event {i}", 'venue_name': f"Venue {rng.randint(1, 500)}", 'venue_address': f"{i} Broadway",
+            'venue_city': 'Nashville', 'description': 'Live music ' * rng.randint(1, 5), 'url': f"https://example.com/e/{i}",
+            'category': rng.choice(['live_music', 'sports', 'arts']), 'event_date': '2025-06-01T20:00:00',
+            'latitude': str(36 + rng.random()), 'longitude': str(-86 - rng.random()), 'genre': 'Rock',
+        }), spider))
+    return raw_rows
+def legacy_float(raw_data, key):
+    return float(raw_data.get(key)) if raw_data.get(key) else None
+def legacy_safe_float(value):
+    try:
+        return float(value) if value else None
+    except (ValueError, TypeError):
+        return None
+def legacy_place(raw_data, source, category):
+    """The hand-written dict shared by the Yelp and Google Places transforms."""
+    clean_item = {
+        'source': source, 'name': raw_data.get('name'), 'venue_name': raw_data.get('name'),
+        'venue_address': raw_data.get('venue_address'), 'venue_city': raw_data.get('venue_city', 'Nashville'),
+        'description': raw_data.get('description'), 'url': raw_data.get('url'),
+        'category': raw_data.get('category', category).title(),
+        'latitude': legacy_float(raw_data, 'latitude'), 'longitude': legacy_float(raw_data, 'longitude'),
+        'event_date': None, 'season': None, 'genre': None,
+    }
+    return clean_item if clean_item.get('name') else None
+def legacy_event(raw_data, source, category, venue_city='Nashville'):
+    """The hand-written dict shared by the Ticketmaster, generic and SeatGeek transforms."""
+    return {
+        'source': source, 'name': raw_data.get('name'), 'venue_name': raw_data.get('venue_name'),
+        'venue_address': raw_data.get('venue_address'), 'venue_city': raw_data.get('venue_city', venue_city),
+        'description': raw_data.get('description'), 'url': raw_data.get('url'),
+        'category': raw_data.get('category', category).title(), 'event_date': raw_data.get('event_date'),
+        'latitude': legacy_float(raw_data, 'latitude'), 'longitude': legacy_float(raw_data, 'longitude'),
+        'season': raw_data.get('season'), 'genre': raw_data.get('genre'),
+    }
+def legacy_transform_row(raw_id, raw_json_str, source_spider):
+    """The pre-registry path: the if/elif dispatch, then json.loads and a hand-written dict per row."""
+    raw_item = {'raw_json': raw_json_str, 'source_spider': source_spider}
+    if source_spider == 'nashville_arcgis':
+        raw_data = json.loads(raw_item['raw_json'])
+        try:
+            latitude, longitude = legacy_float(raw_data, 'latitude'), legacy_float(raw_data, 'longitude')
+        except (ValueError, TypeError):
+            latitude, longitude = None, None
+        clean_item = {
+            'source': 'Nashville ArcGIS', 'name': raw_data.get('name'), 'venue_name': raw_data.get('name'),
+            'venue_address': raw_data.get('venue_address'), 'venue_city': raw_data.get('venue_city', 'Nashville'),
+            'description': raw_data.get('description'), 'url': raw_data.get('url'),
+            'category': raw_data.get('category', 'Civic Facility').replace('_', ' ').title(),
+            'latitude': latitude, 'longitude': longitude, 'event_date': None, 'season': None, 'genre': None,
+        }
+        return clean_item if clean_item.get('name') and clean_item.get('venue_name') else None
+    elif source_spider == 'ticketmaster':
+        clean_item = legacy_event(json.loads(raw_item['raw_json']), 'Ticketmaster', 'Event', venue_city=None)
+        return clean_item if clean_item.get('name') and clean_item.get('venue_name') else None
+    elif source_spider == 'yelp':
+        return legacy_place(json.loads(raw_item['raw_json']), 'Yelp', 'Business')
+    elif source_spider == 'google_places':
+        return legacy_place(json.loads(raw_item['raw_json']), 'Google Places', 'Attraction')
+    elif source_spider == 'generic':
+        source_map = {'nashville.com-events': 'Nashville Events', 'nashville.com-hotels': 'Nashville Hotels',
+                      'underdog': 'Underdog Venue'}
+        clean_item = legacy_event(json.loads(raw_item['raw_json']), source_map.get(source_spider, source_spider), 'General')
+        return clean_item if clean_item.get('name') else None
+    elif source_spider == 'pdf' or source_spider.startswith('manual_upload_'):
+        return None
+    elif source_spider == 'document' or any(ext in source_spider for ext in ['csv', 'xlsx', 'xls', 'docx']):
+        raw_data = json.loads(raw_item['raw_json'])
+        file_type = 'unknown'
+        if 'csv' in source_spider:
+            file_type = 'csv'
+        elif 'xlsx' in source_spider or 'xls' in source_spider:
+            file_type = 'excel'
+        elif 'docx' in source_spider:
+            file_type = 'word'
+        clean_item = {
+            'source': f'Document Upload ({file_type.upper()})', 'name': raw_data.get('name'),
+            'venue_name': raw_data.get('venue_name') or raw_data.get('name'),
+            'venue_address': raw_data.get('venue_address'), 'venue_city': raw_data.get('venue_city', 'Nashville'),
+            'description': raw_data.get('description'), 'url': raw_data.get('url'),
+            'category': raw_data.get('category', 'Document Extracted').replace('_', ' ').title(),
+            'event_date': raw_data.get('event_date'),
+            'latitude': legacy_safe_float(raw_data.get('latitude')),
+            'longitude': legacy_safe_float(raw_data.get('longitude')),
+            'season': raw_data.get('season'), 'genre': raw_data.get('genre'),
+        }
+        return [clean_item] if clean_item.get('name') else []
+    elif source_spider == 'seatgeek':
+        clean_item = legacy_event(json.loads(raw_item['raw_json']), 'SeatGeek', 'Event')
+        return clean_item if clean_item.get('name') and clean_item.get('venue_name') else None
+def registry_transform(registry, raw_rows):
+    batches = {}
+    for row in raw_rows:
+        batches.setdefault(registry.resolve(row[2]), []).append(row)
+    return [output for transformer, batch in batches.items() for output in transformer.transform_batch(batch)[0]]
+def bench_transform(rows=200000):
+    raw_rows = make_raw_rows(rows)
+    registry = TransformerRegistry(TRANSFORM_SPECS)
+    timings = {}
+    for label, fn in (('per_row', lambda: [legacy_transform_row(*row) for row in raw_rows]),
+                      ('registry', lambda: registry_transform(registry, raw_rows))):
+        started = time.perf_counter()
+        count = sum(1 for result in fn() if result)
+        timings[label] = time.perf_counter() - started
+        print(f"transform {label:<10} {rows} rows: {timings[label]:.2f} s, {count} results")
+    print(f"transform speedup: {timings['per_row'] / timings['registry']:.1f}x")
+    return timings
+BENCHMARKS = {
+    'arcgis': bench_arcgis_reprojection,
+    'excel': bench_excel_reader,
+    'dataframe': bench_dataframe_items,
+    'pdf': bench_pdf_pages,
+    'prefilter': bench_prefilter,
+    'classifier': bench_line_classifier,
+    'transform': bench_transform,
+}
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run ETL micro-benchmarks.')
+    parser.add_argument('names', nargs='*', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    args = parser.parse_args()
+    for name in args.names:
+        BENCHMARKS[name]()
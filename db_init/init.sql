@@ -27,4 +27,15 @@ ON events USING GIN (search_vector);
 CREATE INDEX IF NOT EXISTS idx_events_category
 ON events (category);
 CREATE INDEX IF NOT EXISTS idx_events_source_category
-ON events (source, category);
\ No newline at end of file
+ON events (source, category);
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key TEXT PRIMARY KEY,
+    model_name TEXT,
+    prompt_version TEXT,
+    response_json TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    last_used_at TIMESTAMPTZ DEFAULT now(),
+    hit_count INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used
+ON llm_cache (last_used_at);
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import threading
+import psycopg2
+from metrics import incr, set_gauge
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '20000'))
+LLM_CACHE_EVICT_EVERY = 100
+class LLMCache:
+    """
+    Postgres-backed cache of parsed LLM extraction results, keyed by llm_extraction.cache_key().
+    Entries are evicted least-recently-used once the table grows past max_entries.
+    Any database error is logged and treated as a miss so extraction never depends on the cache.
+    The table is created by db_init/init.sql; if it is missing the cache disables itself.
+    """
+    def __init__(self, dsn=None, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.dsn = dsn or os.environ.get('DATABASE_URL')
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.dsn)
+            self._conn.autocommit = True
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('llm_cache')")
+                table = cursor.fetchone()[0]
+            if table is None:
+                # No point retrying every call; get/put skip the cache once dsn is cleared.
+                self.dsn = None
+                self._conn.close()
+                raise RuntimeError("llm_cache table does not exist (see db_init/init.sql), caching disabled")
+        return self._conn
+    def get(self, key):
+        if not self.dsn:
+            return None
+        try:
+            with self._lock, self._connection().cursor() as cursor:
+                cursor.execute(
+                    "UPDATE llm_cache SET last_used_at = now(), hit_count = hit_count + 1 "
+                    "WHERE cache_key = %s RETURNING response_json", (key,))
+                row = cursor.fetchone()
+        except Exception as e:
+            print(f"LLM cache: lookup failed: {e}", file=sys.stderr)
+            self._conn = None
+            row = None
+        incr('llm_cache_requests_total', {'result': 'hit' if row else 'miss'})
+        return json.loads(row[0]) if row else None
+    def put(self, key, events, model_name=None, prompt_version=None):
+        if not self.dsn:
+            return
+        try:
+            with self._lock, self._connection().cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO llm_cache (cache_key, model_name, prompt_version, response_json) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET response_json = EXCLUDED.response_json, last_used_at = now()",
+                    (key, model_name, prompt_version, json.dumps(events)))
+                self._writes += 1
+                if self._writes % LLM_CACHE_EVICT_EVERY == 1:
+                    self._evict(cursor)
+        except Exception as e:
+            print(f"LLM cache: store failed: {e}", file=sys.stderr)
+            self._conn = None
+    def _evict(self, cursor):
+        cursor.execute(
+            "DELETE FROM llm_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM llm_cache ORDER BY last_used_at DESC OFFSET %s)", (self.max_entries,))
+        if cursor.rowcount:
+            incr('llm_cache_evictions_total', value=cursor.rowcount)
+        cursor.execute("SELECT count(*) FROM llm_cache")
+        set_gauge('llm_cache_entries', value=cursor.fetchone()[0])
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
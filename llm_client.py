@@ -0,0 +1,127 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '120'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_SECONDS = float(os.getenv('LLM_BACKOFF_SECONDS', '2'))
+TRANSIENT_ERRORS = frozenset([
+    'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+    'TooManyRequests', 'GatewayTimeout', 'TimeoutError', 'ConnectionError',
+])
+class LLMTimeoutError(TimeoutError):
+    pass
+def is_transient(error):
+    """True for rate-limit, timeout and 5xx style errors worth retrying."""
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+class GeminiBackend:
+    """Adapts a google.generativeai GenerativeModel to the backend interface."""
+    # The SDK applies the request timeout itself, so calls run on the caller's thread.
+    enforces_timeout = True
+    def __init__(self, model):
+        self.model = model
+        self.model_name = getattr(model, 'model_name', 'gemini')
+    def generate_content(self, prompt, generation_config=None, timeout=None):
+        request_options = {'timeout': timeout} if timeout else None
+        return self.model.generate_content(prompt, generation_config=generation_config, request_options=request_options)
+class LLMClient:
+    """
+    Thread-safe front end for model calls, shared by every extraction in the process.
+    Caps in-flight calls at max_concurrency, spaces call starts to stay under
+    requests_per_minute, and retries transient errors with exponential backoff and jitter.
+    max_concurrency also sizes the one worker pool that map() fans extraction work out on,
+    so it bounds both the threads and the model calls LLM extraction uses.
+    The backend is any object with generate_content(prompt, generation_config=..., timeout=...),
+    e.g. GeminiBackend or llm_extraction.FakeModel. Backends that set enforces_timeout are
+    trusted to stop at `timeout`; others run on a thread of their own that the caller stops
+    waiting for after `timeout` seconds.
+    """
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES, backoff_seconds=LLM_BACKOFF_SECONDS):
+        self.backend = backend
+        self.model_name = getattr(backend, 'model_name', type(backend).__name__)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._rate_lock = threading.Lock()
+        self._next_start = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='llm',
+                                        initializer=self._mark_worker)
+        self._local = threading.local()
+    def _mark_worker(self):
+        self._local.worker = True
+    def map(self, func, items):
+        """
+        Apply func to every item on the client's worker pool, returning results in order.
+        Calls made from inside a worker run inline, so nested fan-out (documents, then the
+        chunks of each) never needs more than max_concurrency threads and cannot deadlock.
+        """
+        items = list(items)
+        if len(items) <= 1 or getattr(self._local, 'worker', False):
+            return [func(item) for item in items]
+        return list(self._pool.map(func, items))
+    def _wait_for_turn(self):
+        if not self.interval:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+    def _call(self, prompt, generation_config):
+        """
+        One backend call holding a concurrency slot until the call itself returns. When a
+        backend without its own timeout hangs, the caller gets LLMTimeoutError but the slot
+        stays taken until the abandoned call finishes, so hung calls count against the limit.
+        """
+        self._slots.acquire()
+        if getattr(self.backend, 'enforces_timeout', False):
+            try:
+                return self.backend.generate_content(prompt, generation_config=generation_config, timeout=self.timeout)
+            finally:
+                self._slots.release()
+        outcome = {}
+        done = threading.Event()
+        def run():
+            try:
+                outcome['response'] = self.backend.generate_content(
+                    prompt, generation_config=generation_config, timeout=self.timeout)
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                self._slots.release()
+                done.set()
+        threading.Thread(target=run, name='llm-call', daemon=True).start()
+        if not done.wait(self.timeout or None):
+            raise LLMTimeoutError(f"{self.model_name} call timed out after {self.timeout:.0f}s")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['response']
+    def generate_content(self, prompt, generation_config=None):
+        attempt = 0
+        while True:
+            self._wait_for_turn()
+            try:
+                return self._call(prompt, generation_config)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                error = e
+            delay = self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+            attempt += 1
+            print(f"WARNING: {self.model_name} call failed ({type(error).__name__}: {error}); "
+                  f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+def build_backend(name=LLM_BACKEND, model=None):
+    """Backend for LLM_BACKEND: 'gemini' wraps the given model, 'fake' answers every prompt with no events."""
+    if name == 'fake':
+        from llm_extraction import FakeModel
+        return FakeModel()
+    return GeminiBackend(model) if model is not None else None
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import time
+import hashlib
+LLM_CHUNK_CHARS = int(os.getenv('LLM_CHUNK_CHARS', '12000'))
+LLM_CHUNK_OVERLAP_CHARS = int(os.getenv('LLM_CHUNK_OVERLAP_CHARS', '1000'))
+class FakeModel:
+    """
+    Stand-in for a Gemini GenerativeModel, for running extraction locally without an API key.
+    The responder receives each prompt and returns the list of event dicts to answer with;
+    latency simulates the model's response time in benchmarks.
+    """
+    model_name = 'fake'
+    def __init__(self, responder=None, latency=0.0):
+        self.responder = responder or (lambda prompt: [])
+        self.latency = latency
+        self.prompts = []
+    def generate_content(self, prompt, generation_config=None, timeout=None):
+        self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(json.dumps(self.responder(prompt)))
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+def cache_key(prompt_version, model_name, schema, text):
+    """SHA-256 over everything that determines the model's answer for a chunk."""
+    payload = json.dumps({'prompt_version': prompt_version, 'model': model_name, 'schema': schema, 'text': text},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+def _split_long_page(text, max_chars):
+    """Split a page longer than max_chars at line breaks (or hard-cut lines that are too long)."""
+    pieces, current = [], ''
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ''
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+def _overlap_tail(text, overlap_chars):
+    """Last overlap_chars of text, starting at a line boundary where possible."""
+    if overlap_chars <= 0 or not text:
+        return ''
+    tail = text[-overlap_chars:]
+    newline = tail.find('\n')
+    return tail[newline + 1:] if 0 <= newline < len(tail) - 1 else tail
+def chunk_pages(pages, max_chars=LLM_CHUNK_CHARS, overlap_chars=LLM_CHUNK_OVERLAP_CHARS):
+    """
+    Group page texts into chunks of at most roughly max_chars, never splitting a page unless
+    it is larger than a chunk on its own. Each chunk after the first starts with the tail of
+    the previous one so events straddling a boundary appear whole in at least one chunk.
+    Returns:
+        List of dicts with 'text', 'first_page' and 'last_page' (1-based)
+    """
+    units = []
+    for page_number, page_text in enumerate(pages, start=1):
+        if not page_text or not page_text.strip():
+            continue
+        for piece in (_split_long_page(page_text, max_chars) if len(page_text) > max_chars else [page_text]):
+            units.append((page_number, piece))
+    chunks, current, first_page, last_page = [], [], None, None
+    size = 0
+    for page_number, piece in units:
+        if current and size + len(piece) > max_chars:
+            chunks.append({'text': '\n'.join(current), 'first_page': first_page, 'last_page': last_page})
+            tail = _overlap_tail(current[-1], overlap_chars)
+            current, size, first_page = ([tail], len(tail), last_page) if tail else ([], 0, None)
+        current.append(piece)
+        size += len(piece)
+        first_page = first_page or page_number
+        last_page = page_number
+    if current:
+        chunks.append({'text': '\n'.join(current), 'first_page': first_page, 'last_page': last_page})
+    return chunks
+def _event_key(event):
+    name = re.sub(r'[^a-z0-9]+', ' ', str(event.get('name') or '').lower()).strip()
+    date = re.sub(r'[^a-z0-9]+', ' ', str(event.get('event_date') or '').lower()).strip()
+    return name, date
+def merge_events(chunk_results):
+    """
+    Merge per-chunk event lists in document order, collapsing events seen in more than one
+    chunk (same normalized name and date) and filling fields missing from the first copy.
+    """
+    merged, index_by_key = [], {}
+    for events in chunk_results:
+        for event in events or []:
+            if not isinstance(event, dict):
+                continue
+            if not event.get('name'):
+                merged.append(event)
+                continue
+            key = _event_key(event)
+            if key in index_by_key:
+                existing = merged[index_by_key[key]]
+                for field, value in event.items():
+                    if value and not existing.get(field):
+                        existing[field] = value
+                continue
+            index_by_key[key] = len(merged)
+            merged.append(dict(event))
+    return merged
+def fan_out(model, func, items):
+    """Run func over items on the model's worker pool when it has one (LLMClient.map), else in turn."""
+    if hasattr(model, 'map'):
+        return model.map(func, items)
+    return [func(item) for item in items]
+def _extract_chunk(model, prompt, schema, label):
+    response = model.generate_content(prompt, generation_config={"response_schema": schema})
+    try:
+        events = json.loads(response.text)
+    except json.JSONDecodeError as json_err:
+        print(f"CRITICAL ERROR: AI returned invalid JSON for {label}. Error: {json_err}")
+        print(f"AI Response Text: {response.text[:500]}...")
+        return None
+    return events if isinstance(events, list) else []
+def extract_events(pages, build_prompt, model, schema, label='document', cache=None, prompt_version='v1',
+                   max_chars=LLM_CHUNK_CHARS, overlap_chars=LLM_CHUNK_OVERLAP_CHARS):
+    """
+    Extract events from a long document by prompting the model once per chunk, concurrently
+    on the model's worker pool when it has one (see LLMClient.map).
+    Args:
+        pages: Page texts in order (pass [text] for documents without pages)
+        build_prompt: Callable taking a chunk dict and the chunk count, returning the prompt
+        model: Object with generate_content(prompt, generation_config=...), e.g. LLMClient
+        schema: Response schema passed to the model
+        label: Document name used in log lines
+        cache: Optional LLMCache consulted before every model call
+        prompt_version: Version of the prompt template, part of the cache key
+    Returns:
+        Merged, de-duplicated list of event dicts
+    Raises:
+        Exception: The first chunk error if every chunk failed
+    """
+    chunks = chunk_pages(pages, max_chars, overlap_chars)
+    if not chunks:
+        return []
+    model_name = getattr(model, 'model_name', type(model).__name__)
+    def run(chunk):
+        key = cache_key(prompt_version, model_name, schema, chunk['text']) if cache else None
+        if key and (cached := cache.get(key)) is not None:
+            return cached, None
+        try:
+            events = _extract_chunk(model, build_prompt(chunk, len(chunks)), schema, label)
+            if events is None:
+                return [], None
+            if key:
+                cache.put(key, events, model_name, prompt_version)
+            return events, None
+        except Exception as e:
+            print(f"ERROR: AI extraction failed for {label} pages {chunk['first_page']}-{chunk['last_page']}. Error: {e}")
+            return [], e
+    results = fan_out(model, run, chunks)
+    errors = [error for _, error in results if error]
+    if len(errors) == len(chunks):
+        raise errors[0]
+    events = merge_events(events for events, _ in results)
+    print(f"--- AI extracted {len(events)} events from {label} in {len(chunks)} chunks ({len(errors)} failed) ---")
+    return events
@@ -0,0 +1,88 @@
+import os
+import re
+from metrics import incr
+from scraper.nashville.line_classifier import DATE_RE, ADDRESS_RE, URL_RE
+PREFILTER_ENABLED = os.getenv('LLM_PREFILTER_ENABLED', '1') == '1'
+PREFILTER_MIN_SCORE = float(os.getenv('LLM_PREFILTER_MIN_SCORE', '3'))
+PREFILTER_CONTEXT = int(os.getenv('LLM_PREFILTER_CONTEXT', '1'))
+PREFILTER_BLOCK_LINES = 8
+DATE_WEIGHT = 3.0
+ADDRESS_WEIGHT = 2.0
+URL_WEIGHT = 0.5
+BLANK_LINES_RE = re.compile(r'\n\s*\n')
+def split_blocks(page_text, block_lines=PREFILTER_BLOCK_LINES):
+    """Split a page into paragraphs, or into runs of block_lines lines when it has no blank lines."""
+    paragraphs = [p for p in BLANK_LINES_RE.split(page_text) if p.strip()]
+    if len(paragraphs) > 1:
+        return paragraphs
+    lines = page_text.splitlines()
+    return ['\n'.join(lines[i:i + block_lines]) for i in range(0, len(lines), block_lines)
+            if any(line.strip() for line in lines[i:i + block_lines])]
+def score_block(text):
+    """
+    Event likelihood of a block of text: weighted hits of the PDFSpider date, address and URL
+    patterns (see line_classifier). A date counts most since ads and directories rarely carry one; addresses and
+    URLs count once so a directory page full of them does not outscore a dated listing.
+    """
+    return (DATE_WEIGHT * min(len(DATE_RE.findall(text)), 2)
+            + ADDRESS_WEIGHT * bool(ADDRESS_RE.search(text))
+            + URL_WEIGHT * bool(URL_RE.search(text)))
+def _kept_indexes(blocks, min_score, context):
+    keep = set()
+    for index, block in enumerate(blocks):
+        if score_block(block) >= min_score:
+            keep.update(range(max(0, index - context), min(len(blocks), index + context + 1)))
+    return keep
+def select_candidates(pages, min_score=PREFILTER_MIN_SCORE, context=PREFILTER_CONTEXT):
+    """
+    Keep only the blocks of each page that look like event listings, plus `context`
+    neighbouring blocks on either side (event names usually sit just above the date).
+    Pages with no candidates come back empty so page numbers stay aligned. If nothing in
+    the document scores, the pages are returned unchanged rather than dropping it outright.
+    Returns:
+        (filtered page texts, chars in, chars kept)
+    """
+    filtered, chars_in, chars_kept = [], 0, 0
+    for page_text in pages:
+        blocks = split_blocks(page_text or '')
+        keep = _kept_indexes(blocks, min_score, context)
+        kept_text = '\n\n'.join(blocks[index] for index in sorted(keep))
+        filtered.append(kept_text)
+        chars_in += len(page_text or '')
+        chars_kept += len(kept_text)
+    if not chars_kept:
+        return list(pages), chars_in, chars_in
+    return filtered, chars_in, chars_kept
+def prefilter_pages(pages, label='document', min_score=PREFILTER_MIN_SCORE, context=PREFILTER_CONTEXT):
+    """select_candidates() with logging and metrics; a no-op when LLM_PREFILTER_ENABLED is off."""
+    if not PREFILTER_ENABLED:
+        return pages
+    filtered, chars_in, chars_kept = select_candidates(pages, min_score, context)
+    incr('llm_prefilter_chars_total', {'result': 'kept'}, chars_kept)
+    incr('llm_prefilter_chars_total', {'result': 'dropped'}, chars_in - chars_kept)
+    if chars_in:
+        print(f"--- Prefilter kept {chars_kept}/{chars_in} chars ({100 * chars_kept / chars_in:.0f}%) of {label} ---")
+    return filtered
+def evaluate(samples, min_score=PREFILTER_MIN_SCORE, context=0):
+    """
+    Recall and cost of the prefilter against labelled blocks.
+    Args:
+        samples: List of pages, each a list of (block text, is_event) pairs
+    Returns:
+        Dict with recall, precision and the fraction of characters sent to the model
+    """
+    kept_events = events = kept_blocks = chars_in = chars_kept = 0
+    for page in samples:
+        keep = _kept_indexes([text for text, _ in page], min_score, context)
+        for index, (text, is_event) in enumerate(page):
+            chars_in += len(text)
+            events += is_event
+            if index in keep:
+                chars_kept += len(text)
+                kept_blocks += 1
+                kept_events += is_event
+    return {
+        'recall': kept_events / events if events else 1.0,
+        'precision': kept_events / kept_blocks if kept_blocks else 0.0,
+        'cost': chars_kept / chars_in if chars_in else 0.0,
+    }
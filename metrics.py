@@ -0,0 +1,162 @@
+import os
+import sys
+import redis
+QUEUES = ['ingest', 'transform', 'crawl', 'celery']
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ':'
+METRIC_KEY_PREFIX = 'metrics:'
+METRIC_DEFINITIONS = {
+    'etl_tasks_total': ('counter', 'Celery tasks finished, by task and final state.'),
+    'etl_task_errors_total': ('counter', 'Celery task failures, by task and exception type.'),
+    'etl_task_duration_seconds': ('summary', 'Celery task run time in seconds.'),
+    'etl_task_duration_seconds_max': ('gauge', 'Longest observed Celery task run time in seconds.'),
+    'etl_task_queue_wait_seconds': ('summary', 'Time between task publish and task start, by queue.'),
+    'etl_task_queue_wait_seconds_max': ('gauge', 'Longest observed queue wait in seconds, by queue.'),
+    'etl_items_in_total': ('counter', 'Items read by an ETL stage, by stage and source.'),
+    'etl_items_out_total': ('counter', 'Items produced by an ETL stage, by stage and source.'),
+    'etl_item_errors_total': ('counter', 'Items that raised inside an ETL stage, by stage and source.'),
+    'llm_cache_requests_total': ('counter', 'LLM extraction cache lookups, by result (hit or miss).'),
+    'llm_cache_evictions_total': ('counter', 'LLM cache entries evicted to stay under LLM_CACHE_MAX_ENTRIES.'),
+    'llm_cache_entries': ('gauge', 'Entries in the LLM extraction cache at the last eviction check.'),
+    'llm_prefilter_chars_total': ('counter', 'Characters of PDF text kept for or dropped before LLM extraction, by result.'),
+    'etl_queue_depth': ('gauge', 'Messages waiting in a Celery queue.'),
+    'scrapy_spider_runs_total': ('counter', 'Finished spider runs, by spider and finish reason.'),
+    'scrapy_items_scraped_total': ('counter', 'Items scraped across all runs, by spider.'),
+    'scrapy_requests_total': ('counter', 'Requests issued across all runs, by spider.'),
+    'scrapy_response_bytes_total': ('counter', 'Response bytes downloaded across all runs, by spider.'),
+    'scrapy_errors_total': ('counter', 'ERROR log lines across all runs, by spider.'),
+    'scrapy_watermark_requests_saved_total': ('counter', 'Requests avoided by incremental crawls vs the last full crawl, by spider.'),
+    'scrapy_watermark_bytes_saved_total': ('counter', 'Response bytes avoided by incremental crawls vs the last full crawl, by spider.'),
+    'scrapy_detail_fetches_avoided_total': ('counter', 'Detail pages skipped because the freshness index had a recent, unchanged entry, by spider.'),
+    'scrapy_httpcache_hits_total': ('counter', 'Responses served from the HTTP cache, by spider.'),
+    'scrapy_httpcache_revalidations_total': ('counter', 'Cached responses revalidated with a 304, by spider.'),
+    'scrapy_httpcache_bytes_saved_total': ('counter', 'Response bytes served from the HTTP cache instead of the network, by spider.'),
+    'scrapy_ratelimit_throttled_total': ('counter', 'Requests delayed by the shared API token bucket, by spider.'),
+    'scrapy_quota_exhausted_total': ('counter', 'Requests dropped because an API daily quota was used up, by spider.'),
+    'scrapy_last_run_stat': ('gauge', 'Scrapy stats from the most recent run, by spider and stat.'),
+}
+_redis_client = None
+def get_metrics_redis():
+    global _redis_client
+    if _redis_client is None:
+        try:
+            _redis_client = redis.Redis(host=os.getenv('REDIS_HOST', 'redis'), port=6379, db=0,
+                                        decode_responses=True, socket_timeout=2)
+        except Exception as e:
+            print(f"Metrics: Error creating Redis client: {e}", file=sys.stderr)
+            return None
+    return _redis_client
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+def _label_key(labels):
+    if not labels:
+        return ''
+    return ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in sorted(labels.items()))
+def incr(name, labels=None, value=1):
+    r = get_metrics_redis()
+    if not r or not value:
+        return
+    try:
+        r.hincrbyfloat(f"{METRIC_KEY_PREFIX}{name}", _label_key(labels), value)
+    except Exception as e:
+        print(f"Metrics: Error incrementing {name}: {e}", file=sys.stderr)
+def set_gauge(name, labels=None, value=0):
+    r = get_metrics_redis()
+    if not r:
+        return
+    try:
+        r.hset(f"{METRIC_KEY_PREFIX}{name}", _label_key(labels), value)
+    except Exception as e:
+        print(f"Metrics: Error setting {name}: {e}", file=sys.stderr)
+def observe(name, labels=None, value=0.0):
+    r = get_metrics_redis()
+    if not r or value is None or value < 0:
+        return
+    field = _label_key(labels)
+    try:
+        pipe = r.pipeline()
+        pipe.hincrbyfloat(f"{METRIC_KEY_PREFIX}{name}_count", field, 1)
+        pipe.hincrbyfloat(f"{METRIC_KEY_PREFIX}{name}_sum", field, value)
+        pipe.hget(f"{METRIC_KEY_PREFIX}{name}_max", field)
+        current_max = pipe.execute()[2]
+        if current_max is None or value > float(current_max):
+            r.hset(f"{METRIC_KEY_PREFIX}{name}_max", field, value)
+    except Exception as e:
+        print(f"Metrics: Error observing {name}: {e}", file=sys.stderr)
+def _queue_keys(queue):
+    return [queue if step == 0 else f"{queue}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS]
+def get_queue_depths(queues=None):
+    r = get_metrics_redis()
+    depths = {}
+    if not r:
+        return depths
+    try:
+        pipe = r.pipeline()
+        for queue in queues or QUEUES:
+            for key in _queue_keys(queue):
+                pipe.llen(key)
+        results = pipe.execute()
+    except Exception as e:
+        print(f"Metrics: Error reading queue depths: {e}", file=sys.stderr)
+        return depths
+    steps = len(PRIORITY_STEPS)
+    for i, queue in enumerate(queues or QUEUES):
+        depths[queue] = sum(results[i * steps:(i + 1) * steps])
+    return depths
+def record_queue_wait(queue, wait_seconds):
+    observe('etl_task_queue_wait_seconds', {'queue': queue}, wait_seconds)
+def get_queue_waits(queues=None):
+    r = get_metrics_redis()
+    waits = {}
+    if not r:
+        return waits
+    name = f"{METRIC_KEY_PREFIX}etl_task_queue_wait_seconds"
+    for queue in queues or QUEUES:
+        field = _label_key({'queue': queue})
+        try:
+            count, total, maximum = r.hget(f"{name}_count", field), r.hget(f"{name}_sum", field), r.hget(f"{name}_max", field)
+        except Exception as e:
+            print(f"Metrics: Error reading queue wait for {queue}: {e}", file=sys.stderr)
+            continue
+        count = int(float(count or 0))
+        total = float(total or 0)
+        waits[queue] = {
+            'count': count,
+            'sum_seconds': total,
+            'avg_seconds': total / count if count else 0.0,
+            'max_seconds': float(maximum or 0),
+        }
+    return waits
+def get_queue_metrics():
+    depths = get_queue_depths()
+    waits = get_queue_waits()
+    return {queue: {'depth': depths.get(queue), 'wait': waits.get(queue)} for queue in QUEUES}
+def _format_value(value):
+    number = float(value)
+    return str(int(number)) if number.is_integer() else repr(number)
+def render_prometheus():
+    r = get_metrics_redis()
+    lines = []
+    stored = {}
+    if r:
+        try:
+            pipe = r.pipeline()
+            keys = []
+            for name, (metric_type, _) in METRIC_DEFINITIONS.items():
+                suffixes = ['_count', '_sum'] if metric_type == 'summary' else ['']
+                for suffix in suffixes:
+                    keys.append(f"{name}{suffix}")
+                    pipe.hgetall(f"{METRIC_KEY_PREFIX}{name}{suffix}")
+            stored = dict(zip(keys, pipe.execute()))
+        except Exception as e:
+            print(f"Metrics: Error reading metrics from Redis: {e}", file=sys.stderr)
+    stored['etl_queue_depth'] = {_label_key({'queue': queue}): depth for queue, depth in get_queue_depths().items()}
+    for name, (metric_type, help_text) in METRIC_DEFINITIONS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        suffixes = ['_count', '_sum'] if metric_type == 'summary' else ['']
+        for suffix in suffixes:
+            for field, value in sorted((stored.get(f"{name}{suffix}") or {}).items()):
+                labels = f"{{{field}}}" if field else ''
+                lines.append(f"{name}{suffix}{labels} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import redis
+STATE_KEY_PREFIX = 'crawlstate:'
+# Freshness trade-off of windowed crawls (see plan_window_crawl): between full crawls, every
+# FULL_CRAWL_INTERVAL_HOURS, runs re-fetch only the next INCREMENTAL_CRAWL_DAYS plus horizon
+# days not yet crawled. Changes to events further out (new listings, reschedules, cancellations)
+# are picked up only at the next full crawl, so they can be up to FULL_CRAWL_INTERVAL_HOURS late.
+# Each full crawl counts how many such events changed (watermark/missed_updates); raise
+# INCREMENTAL_CRAWL_DAYS or lower FULL_CRAWL_INTERVAL_HOURS if that number is significant.
+FULL_CRAWL_INTERVAL_HOURS = float(os.getenv('FULL_CRAWL_INTERVAL_HOURS', '24'))
+INCREMENTAL_CRAWL_DAYS = int(os.getenv('INCREMENTAL_CRAWL_DAYS', '14'))
+FINGERPRINT_FIELDS = ('name', 'event_date', 'venue_name', 'venue_address', 'url', 'description')
+logger = logging.getLogger(__name__)
+_redis_client = None
+def get_state_redis() -> Optional[redis.Redis]:
+    global _redis_client
+    if _redis_client is None:
+        try:
+            _redis_client = redis.Redis(host=os.getenv('REDIS_HOST', 'redis'), port=6379, db=0,
+                                        decode_responses=True, socket_timeout=2)
+        except Exception as e:
+            logger.error(f"Crawl state: could not create Redis client: {e}")
+            return None
+    return _redis_client
+def load_state(namespace: str, key: str) -> Dict[str, Any]:
+    r = get_state_redis()
+    if not r:
+        return {}
+    try:
+        raw = r.hget(f"{STATE_KEY_PREFIX}{namespace}", key)
+        return json.loads(raw) if raw else {}
+    except Exception as e:
+        logger.error(f"Crawl state: could not load {namespace}/{key}: {e}")
+        return {}
+def save_state(namespace: str, key: str, value: Dict[str, Any]) -> None:
+    r = get_state_redis()
+    if not r:
+        return
+    try:
+        r.hset(f"{STATE_KEY_PREFIX}{namespace}", key, json.dumps(value))
+    except Exception as e:
+        logger.error(f"Crawl state: could not save {namespace}/{key}: {e}")
+def load_state_many(namespace: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    r = get_state_redis()
+    if not r or not keys:
+        return {}
+    try:
+        raw_values = r.hmget(f"{STATE_KEY_PREFIX}{namespace}", keys)
+        return {key: json.loads(raw) for key, raw in zip(keys, raw_values) if raw}
+    except Exception as e:
+        logger.error(f"Crawl state: could not load {len(keys)} keys from {namespace}: {e}")
+        return {}
+def save_state_many(namespace: str, values: Dict[str, Dict[str, Any]]) -> None:
+    r = get_state_redis()
+    if not r or not values:
+        return
+    try:
+        r.hset(f"{STATE_KEY_PREFIX}{namespace}", mapping={key: json.dumps(value) for key, value in values.items()})
+    except Exception as e:
+        logger.error(f"Crawl state: could not save {len(values)} keys to {namespace}: {e}")
+def replace_state(namespace: str, values: Dict[str, Dict[str, Any]]) -> None:
+    """Overwrite a whole namespace, dropping keys not in values."""
+    r = get_state_redis()
+    if not r:
+        return
+    try:
+        pipe = r.pipeline()
+        pipe.delete(f"{STATE_KEY_PREFIX}{namespace}")
+        if values:
+            pipe.hset(f"{STATE_KEY_PREFIX}{namespace}", mapping={key: json.dumps(value) for key, value in values.items()})
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Crawl state: could not replace {namespace}: {e}")
+def reset_crawl_state() -> int:
+    """Forget all watermarks and freshness data, forcing full crawls next run."""
+    r = get_state_redis()
+    if not r:
+        return 0
+    cleared = 0
+    try:
+        for key in r.scan_iter(match=f"{STATE_KEY_PREFIX}*", count=500):
+            cleared += r.delete(key)
+    except Exception as e:
+        logger.error(f"Crawl state: could not reset state: {e}")
+    return cleared
+def plan_window_crawl(source: str, now: datetime, horizon_days: int, force_full: bool = False) -> Dict[str, Any]:
+    """
+    Decide which date ranges a windowed API spider has to request this run.
+    A full crawl covers the whole horizon and runs when forced, when no watermark exists or
+    when the last full crawl is older than FULL_CRAWL_INTERVAL_HOURS. Otherwise only the
+    near-term range (where listings change most) and the part of the horizon that was not
+    covered by the previous run are requested. Events between the two are not re-checked
+    until the next full crawl; that crawl reports how many of them had changed.
+    Args:
+        source: Spider name used as the watermark key
+        now: Start of the crawl horizon
+        horizon_days: Length of the crawl horizon
+        force_full: Ignore the watermark and crawl everything
+    Returns:
+        Plan dictionary with 'mode', 'ranges', 'horizon_end', the loaded 'watermark', the
+        'skipped_range' incremental runs leave unchecked and the 'fingerprints' seen so far
+    """
+    watermark = load_state('watermark', source)
+    horizon_end = now + timedelta(days=horizon_days)
+    near_end = min(now + timedelta(days=INCREMENTAL_CRAWL_DAYS), horizon_end)
+    previous_end = datetime.fromisoformat(watermark['horizon_end']) if watermark.get('horizon_end') else None
+    plan = {'horizon_end': horizon_end, 'watermark': watermark, 'fingerprints': {},
+            'skipped_range': (near_end, min(previous_end, horizon_end)) if previous_end else None}
+    last_full = watermark.get('last_full_crawl')
+    full_due = not last_full or time.time() - last_full > FULL_CRAWL_INTERVAL_HOURS * 3600
+    if force_full or full_due or not previous_end:
+        return {**plan, 'mode': 'full', 'ranges': [(now, horizon_end)]}
+    ranges = [(now, near_end)]
+    if previous_end < horizon_end:
+        ranges.append((max(previous_end, near_end), horizon_end))
+    return {**plan, 'mode': 'incremental', 'ranges': ranges}
+def record_event(plan: Dict[str, Any], event_id: Any, item: Dict[str, Any], window_start: datetime) -> None:
+    """
+    Remember a crawled event's content so finish_window_crawl can tell which events in the
+    range incremental runs skip had changed by the time a full crawl fetched them.
+    Args:
+        plan: Plan returned by plan_window_crawl
+        event_id: API id of the event
+        item: Scraped item
+        window_start: Start of the request window the event was listed in
+    """
+    if event_id is None:
+        return
+    payload = json.dumps([item.get(field) for field in FINGERPRINT_FIELDS], default=str)
+    skipped = plan['skipped_range']
+    plan['fingerprints'][str(event_id)] = {
+        'fingerprint': hashlib.sha1(payload.encode('utf-8')).hexdigest(),
+        'skipped': bool(skipped and skipped[0] <= window_start < skipped[1]),
+    }
+def count_missed_updates(source: str, plan: Dict[str, Any]) -> int:
+    """
+    Events in the skipped range that a full crawl found new or changed since they were last
+    fetched: updates the incremental runs since the previous full crawl did not see.
+    """
+    skipped_ids = [event_id for event_id, seen in plan['fingerprints'].items() if seen['skipped']]
+    previous = load_state_many(f'fingerprint:{source}', skipped_ids)
+    return sum(previous.get(event_id, {}).get('fingerprint') != plan['fingerprints'][event_id]['fingerprint']
+               for event_id in skipped_ids)
+def finish_window_crawl(spider, plan: Dict[str, Any], reason: str) -> Dict[str, int]:
+    """
+    Persist the watermark and event fingerprints after a successful windowed crawl and report
+    what incremental mode saved and, for full crawls, how many updates it had missed.
+    Args:
+        spider: Spider that ran the crawl (its name and stats are used)
+        plan: Plan returned by plan_window_crawl
+        reason: Spider close reason; the watermark only advances on 'finished'
+    Returns:
+        Dictionary with 'requests_saved', 'bytes_saved' and 'missed_updates'
+    """
+    savings = {'requests_saved': 0, 'bytes_saved': 0, 'missed_updates': 0}
+    missed_note = ''
+    if reason != 'finished':
+        spider.logger.warning(f"Crawl ended with '{reason}', keeping previous watermark")
+        return savings
+    stats = spider.crawler.stats
+    requests_made = stats.get_value('downloader/request_count', 0)
+    bytes_downloaded = stats.get_value('downloader/response_bytes', 0)
+    watermark = dict(plan['watermark'])
+    watermark['horizon_end'] = plan['horizon_end'].isoformat()
+    watermark['last_crawl'] = time.time()
+    if plan['mode'] == 'full':
+        watermark['last_full_crawl'] = watermark['last_crawl']
+        watermark['full_requests'] = requests_made
+        watermark['full_bytes'] = bytes_downloaded
+        # Needs fingerprints from earlier runs, or every event would count as missed.
+        if plan['skipped_range'] and watermark.get('fingerprints_saved'):
+            savings['missed_updates'] = count_missed_updates(spider.name, plan)
+            watermark['missed_updates'] = savings['missed_updates']
+            watermark['skipped_events'] = sum(seen['skipped'] for seen in plan['fingerprints'].values())
+            missed_note = (f"; {savings['missed_updates']}/{watermark['skipped_events']} events outside the "
+                           f"incremental range had changed since last fetched")
+    else:
+        savings['requests_saved'] = max(watermark.get('full_requests', 0) - requests_made, 0)
+        savings['bytes_saved'] = max(watermark.get('full_bytes', 0) - bytes_downloaded, 0)
+    fingerprints = {event_id: {'fingerprint': seen['fingerprint']} for event_id, seen in plan['fingerprints'].items()}
+    if plan['mode'] == 'full':
+        # A full crawl sees every listed event, so it replaces the set and past events drop out.
+        replace_state(f'fingerprint:{spider.name}', fingerprints)
+    else:
+        save_state_many(f'fingerprint:{spider.name}', fingerprints)
+    watermark['fingerprints_saved'] = True
+    save_state('watermark', spider.name, watermark)
+    for name, value in savings.items():
+        stats.set_value(f'watermark/{name}', value)
+    spider.logger.info(
+        f"{plan['mode'].title()} crawl done: {requests_made} requests, {bytes_downloaded} bytes; "
+        f"saved {savings['requests_saved']} requests and {savings['bytes_saved']} bytes vs last full crawl{missed_note}")
+    return savings
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+API_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+def iter_date_windows(start: datetime, horizon_days: int, window_days: int) -> Iterator[Tuple[datetime, datetime]]:
+    """Yield consecutive [start, end) windows covering horizon_days from start."""
+    return iter_date_windows_between(start, start + timedelta(days=horizon_days), window_days)
+def iter_date_windows_between(start: datetime, end: datetime, window_days: int) -> Iterator[Tuple[datetime, datetime]]:
+    """Yield consecutive [start, end) windows of window_days covering start to end."""
+    step = timedelta(days=window_days)
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + step, end)
+        yield window_start, window_end
+        window_start = window_end
+def split_window(window_start: datetime, window_end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Split a window into two equal halves."""
+    middle = window_start + (window_end - window_start) / 2
+    return [(window_start, middle), (middle, window_end)]
+def split_tail(window_start: datetime, span: timedelta) -> List[Tuple[datetime, Optional[datetime]]]:
+    """Split an open-ended window into a bounded span and the open-ended rest."""
+    return [(window_start, window_start + span), (window_start + span, None)]
+def format_api_datetime(value: datetime) -> str:
+    return value.strftime(API_DATETIME_FORMAT)
@@ -0,0 +1,565 @@
+import os
+import codecs
+import hashlib
+import logging
+from itertools import islice
+from typing import Dict, Any, List, Optional, Iterator
+from pathlib import Path
+import pandas as pd
+from docx import Document
+from openpyxl import load_workbook
+from scraper.nashville import line_classifier
+from scraper.nashville.line_classifier import LineClassifier
+class DocumentExtractor:
+    """Extracts event/business records from structured documents (CSV, Excel, Word)."""
+    SUPPORTED_EXTENSIONS = {'.csv', '.xlsx', '.xls', '.docx'}
+    COLUMN_MAPPINGS = {
+        'name': ['name', 'event_name', 'title', 'event', 'business_name'],
+        'venue_name': ['venue', 'venue_name', 'location', 'place'],
+        'venue_address': ['address', 'venue_address', 'street_address', 'location_address'],
+        'event_date': ['date', 'event_date', 'datetime', 'when', 'event_time'],
+        'description': ['description', 'details', 'info', 'about'],
+        'url': ['url', 'website', 'link', 'web'],
+        'category': ['category', 'type', 'genre', 'event_type'],
+    }
+    CSV_CHUNK_SIZE = int(os.getenv('DOCUMENT_CSV_CHUNK_SIZE', '50000'))
+    ENCODING_SAMPLE_BYTES = 64 * 1024
+    EXCEL_BATCH_ROWS = int(os.getenv('DOCUMENT_EXCEL_BATCH_ROWS', '5000'))
+    HEADER_SCAN_ROWS = 20
+    LINE_CLASSIFIER = LineClassifier(line_classifier.ADDRESS_KEYWORDS + ['tn'], url_anywhere=False,
+                                     max_name_length=150)
+
+    def __init__(self, file_path: Optional[str], logger: Optional[logging.Logger] = None):
+        """
+        Initialize extractor with file path.
+        Args:
+            file_path: Absolute path to the document to process
+            logger: Logger to report extraction problems to
+        Raises:
+            ValueError: If file_path is not provided or has an unsupported type
+            FileNotFoundError: If file_path does not exist
+        """
+        self._validate_initialization(file_path)
+        self.file_path = file_path
+        self.file_extension = self._get_file_extension(file_path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.rows_seen = 0
+    def _validate_initialization(self, file_path: Optional[str]) -> None:
+        """Validate extractor initialization parameters."""
+        if not file_path:
+            raise ValueError("file_path argument is required")
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Document file not found: {file_path}")
+    def _get_file_extension(self, file_path: str) -> str:
+        """Extract and validate file extension."""
+        extension = Path(file_path).suffix.lower()
+        if extension not in self.SUPPORTED_EXTENSIONS:
+            raise ValueError(
+                f"Unsupported file type: {extension}. Supported: {self.SUPPORTED_EXTENSIONS}")
+        return extension
+    def extract_items(self) -> List[Dict[str, Any]]:
+        """
+        Extract, validate and build output items for the document.
+        Returns:
+            List of item dictionaries with BusinessItem fields
+        """
+        return [item for batch in self.iter_item_batches() for item in batch]
+    def iter_item_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Extract, validate and build output items one batch at a time.
+        CSV and Excel files are streamed in row chunks so memory stays bounded;
+        Word documents produce a single batch.
+        Yields:
+            Lists of item dictionaries with BusinessItem fields
+        """
+        streaming_extractors = {
+            '.csv': self._iter_csv_batches,
+            '.xlsx': self._iter_excel_batches,
+            '.xls': self._iter_excel_batches,
+        }
+        if streaming := streaming_extractors.get(self.file_extension):
+            batches = streaming()
+        else:
+            batches = iter([self._extract_items_by_type()])
+        self.rows_seen = valid = 0
+        for items in batches:
+            valid += len(items)
+            if items:
+                yield items
+        self.logger.info(
+            f"Extracted {self.rows_seen} items, {valid} valid")
+    def _extract_items_by_type(self) -> List[Dict[str, Any]]:
+        """
+        Route extraction based on file type.
+        Returns:
+            List of validated item dictionaries with BusinessItem fields
+        """
+        extractors = {
+            '.csv': self._extract_from_csv,
+            '.xlsx': self._extract_from_excel,
+            '.xls': self._extract_from_excel,
+            '.docx': self._extract_from_word,
+        }
+        extractor = extractors.get(self.file_extension)
+        if not extractor:
+            raise ValueError(f"No extractor for {self.file_extension}")
+        return extractor()
+    def _extract_from_csv(self) -> List[Dict[str, Any]]:
+        """
+        Extract data from CSV file.
+        Returns:
+            List of item dictionaries
+        """
+        return [item for batch in self._iter_csv_batches() for item in batch]
+    def _iter_csv_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a CSV file in chunks, normalizing column names once per file.
+        Yields:
+            Lists of item dictionaries, one per chunk
+        Raises:
+            ValueError: If the file cannot be parsed, naming how many rows were read before it;
+                callers load the batches in one transaction so earlier chunks are not kept
+        """
+        encoding = self._detect_encoding()
+        rename_map = None
+        rows_read = 0
+        try:
+            reader = pd.read_csv(self.file_path, encoding=encoding, encoding_errors='replace',
+                                 chunksize=self.CSV_CHUNK_SIZE)
+            with reader:
+                for chunk in reader:
+                    if rename_map is None:
+                        rename_map = self._column_rename_map(chunk.columns)
+                    rows_read += len(chunk)
+                    yield self._dataframe_to_items(chunk, rename_map)
+        except pd.errors.EmptyDataError:
+            self.logger.warning(f"CSV {self.file_path} is empty")
+        except pd.errors.ParserError as e:
+            self.logger.error(f"Error reading CSV {self.file_path} after {rows_read} rows: {e}")
+            raise ValueError(f"Could not parse CSV after {rows_read} rows: {e}") from e
+    def _detect_encoding(self) -> str:
+        """
+        Detect the text encoding from a sample at the start of the file.
+        Returns:
+            'utf-8-sig', 'utf-8' or 'latin-1'
+        """
+        with open(self.file_path, 'rb') as f:
+            sample = f.read(self.ENCODING_SAMPLE_BYTES)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return 'latin-1'
+    def _extract_from_excel(self) -> List[Dict[str, Any]]:
+        """
+        Extract data from Excel file.
+        Returns:
+            List of item dictionaries
+        """
+        return [item for batch in self._iter_excel_batches() for item in batch]
+    def _iter_excel_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream an Excel workbook opened once, reading sheet 0 and the
+        remaining sheets only if sheet 0 yields nothing.
+        Yields:
+            Lists of item dictionaries, EXCEL_BATCH_ROWS rows at a time
+        Raises:
+            ValueError: If the workbook cannot be read, naming how many rows were read before it;
+                callers load the batches in one transaction so earlier batches are not kept
+        """
+        sheets = self._iter_xlsx_sheets() if self.file_extension == '.xlsx' else self._iter_xls_sheets()
+        found_items = False
+        rows_before = self.rows_seen
+        try:
+            for index, (sheet_name, rows) in enumerate(sheets):
+                if index > 0 and found_items:
+                    break
+                for items in self._iter_sheet_batches(rows):
+                    found_items = found_items or bool(items)
+                    yield items
+        except Exception as e:
+            rows_read = self.rows_seen - rows_before
+            self.logger.error(f"Excel extraction error in {self.file_path} after {rows_read} rows: {e}")
+            raise ValueError(f"Excel parse error after {rows_read} rows: {e}") from e
+        finally:
+            sheets.close()
+    def _iter_xlsx_sheets(self) -> Iterator[tuple]:
+        """Yield (sheet name, lazy row iterator) pairs from a read-only openpyxl workbook."""
+        workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                yield worksheet.title, worksheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    def _iter_xls_sheets(self) -> Iterator[tuple]:
+        """Yield (sheet name, row iterator) pairs from a legacy .xls workbook parsed once."""
+        with pd.ExcelFile(self.file_path) as xls:
+            for sheet_name in xls.sheet_names:
+                df = xls.parse(sheet_name, header=None)
+                yield sheet_name, df.itertuples(index=False, name=None)
+    def _iter_sheet_batches(self, rows) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Detect the header row of a sheet and convert the rows below it in batches.
+        Args:
+            rows: Iterator of row value tuples
+        Yields:
+            Lists of item dictionaries
+        """
+        rows = iter(rows)
+        head = list(islice(rows, self.HEADER_SCAN_ROWS))
+        header_index = self._detect_header_row(head)
+        if header_index is None:
+            return
+        columns = self._unique_columns(head[header_index])
+        rename_map = self._column_rename_map(columns)
+        pending = head[header_index + 1:]
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= self.EXCEL_BATCH_ROWS:
+                yield self._rows_to_items(pending, columns, rename_map)
+                pending = []
+        if pending:
+            yield self._rows_to_items(pending, columns, rename_map)
+    def _detect_header_row(self, rows: List[tuple]) -> Optional[int]:
+        """
+        Pick the header row: the first row with the most known column aliases,
+        or the first row with at least two filled cells if none match.
+        Args:
+            rows: Leading rows of a sheet
+        Returns:
+            Index of the header row, or None if the sheet has no usable row
+        """
+        aliases = {alias for alternatives in self.COLUMN_MAPPINGS.values() for alias in alternatives}
+        best_index, best_score, first_filled = None, 0, None
+        for index, row in enumerate(rows):
+            cells = [str(value).lower().strip() for value in row if not self._is_blank(value)]
+            if first_filled is None and len(cells) >= 2:
+                first_filled = index
+            score = sum(1 for cell in cells if cell in aliases)
+            if score > best_score:
+                best_index, best_score = index, score
+        return best_index if best_index is not None else first_filled
+    def _unique_columns(self, header: tuple) -> List[str]:
+        """Turn a header row into unique column labels, filling blanks and suffixing duplicates."""
+        columns, seen = [], {}
+        for position, value in enumerate(header):
+            label = f"column_{position}" if self._is_blank(value) else str(value).strip()
+            if label in seen:
+                seen[label] += 1
+                label = f"{label}.{seen[label]}"
+            else:
+                seen[label] = 0
+            columns.append(label)
+        return columns
+    def _rows_to_items(self, rows: List[tuple], columns: List[str], rename_map: Dict[Any, str]) -> List[Dict[str, Any]]:
+        """Build a DataFrame from raw sheet rows and convert it to item dictionaries."""
+        width = len(columns)
+        records = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+        df = pd.DataFrame.from_records(records, columns=columns).dropna(how='all')
+        return self._dataframe_to_items(df, rename_map)
+    def _is_blank(self, value: Any) -> bool:
+        """Check if a cell value is empty."""
+        return value is None or (isinstance(value, float) and value != value) or str(value).strip() == ''
+    def _extract_from_word(self) -> List[Dict[str, Any]]:
+        """
+        Extract data from Word document.
+        Returns:
+            List of item dictionaries
+        """
+        try:
+            doc = Document(self.file_path)
+            items = self._extract_from_word_tables(doc)
+            if not items:
+                items = self._extract_from_word_text(doc)
+            return items
+        except Exception as e:
+            self.logger.error(f"Word extraction error: {e}")
+            return []
+    def _extract_from_word_tables(self, doc: Document) -> List[Dict[str, Any]]:
+        """
+        Extract data from Word document tables.
+        Args:
+            doc: python-docx Document object
+        Returns:
+            List of item dictionaries
+        """
+        items = []
+        for table in doc.tables:
+            try:
+                data = [[cell.text.strip() for cell in row.cells]
+                        for row in table.rows]
+                if len(data) < 2:
+                    continue
+                df = pd.DataFrame(data[1:], columns=data[0])
+                items.extend(self._dataframe_to_items(df))
+            except Exception as e:
+                self.logger.debug(f"Table extraction error: {e}")
+                continue
+        return items
+    def _extract_from_word_text(self, doc: Document) -> List[Dict[str, Any]]:
+        """
+        Extract data from Word document paragraphs.
+        Args:
+            doc: python-docx Document object
+        Returns:
+            List of item dictionaries
+        """
+        items = []
+        current_item = {}
+        texts = [para.text.strip() for para in doc.paragraphs]
+        for text, tag in zip(texts, self.LINE_CLASSIFIER.classify_lines(texts)):
+            if not text or len(text) < 3:
+                if current_item.get('name'):
+                    items.append(current_item.copy())
+                    current_item = {}
+                continue
+            if ':' in text and not text.startswith('http'):
+                key, value = self._parse_key_value(text)
+                if key and value:
+                    current_item[key] = value
+            else:
+                self._classify_text_line(text, current_item, tag)
+        if current_item.get('name'):
+            items.append(current_item)
+        self.rows_seen += len(items)
+        valid_items = self._validate_items([self._clean_item(item) for item in items])
+        return [self._build_item(item_data) for item_data in valid_items]
+    def _dataframe_to_items(self, df: pd.DataFrame, rename_map: Optional[Dict[Any, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Convert DataFrame to validated output items using column-wise operations.
+        Args:
+            df: pandas DataFrame
+            rename_map: Precomputed column rename map, computed from df when omitted
+        Returns:
+            List of item dictionaries with BusinessItem fields
+        """
+        if df.empty:
+            return []
+        df = self._normalize_dataframe_columns(df, rename_map)
+        df = df.loc[:, ~df.columns.duplicated(keep='last')]
+        self.rows_seen += len(df)
+        if 'name' not in df.columns:
+            return []
+        cleaned = pd.DataFrame({col: self._clean_column(df[col]) for col in df.columns}, index=df.index)
+        name = cleaned['name']
+        valid = name.notna() & (name.str.len() >= 3) & name.str.contains(r'[^\W\d_]', regex=True, na=False)
+        if skipped := int((~valid).sum()):
+            self.logger.debug(f"Skipping {skipped} rows without a valid name")
+        cleaned = cleaned[valid]
+        if cleaned.empty:
+            return []
+        return self._build_items_frame(cleaned).to_dict('records')
+    def _clean_column(self, series: pd.Series) -> pd.Series:
+        """
+        Stringify and strip a column, turning nulls and blank strings into NaN.
+        Args:
+            series: Raw column
+        Returns:
+            Object column of stripped strings or NaN
+        """
+        text = series.astype(str).str.strip()
+        return text.where(series.notna() & (text != ''))
+    def _build_items_frame(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Build output item columns from cleaned data, mirroring _build_item.
+        Args:
+            data: Cleaned DataFrame with a valid 'name' column
+        Returns:
+            DataFrame with one column per BusinessItem field
+        """
+        def column(field: str) -> pd.Series:
+            return data[field] if field in data.columns else pd.Series(None, index=data.index, dtype=object)
+        name = data['name']
+        venue_address = column('venue_address').fillna('')
+        url = column('url')
+        has_url = url.notna() & (url.str.len() > 5) & url.str.startswith('http', na=False)
+        generated = pd.Series(
+            [self._generated_url(n, a) for n, a in zip(name[~has_url], venue_address[~has_url])],
+            index=name.index[~has_url], dtype=object)
+        event_date = column('event_date')
+        return pd.DataFrame({
+            'source': self._get_source_name(),
+            'name': name,
+            'venue_name': column('venue_name').fillna(name),
+            'venue_address': venue_address,
+            'venue_city': column('venue_city').fillna('Nashville'),
+            'description': column('description').fillna(''),
+            'event_date': event_date.astype(object).where(event_date.notna(), None),
+            'category': column('category').fillna('document_extracted'),
+            'url': url.where(has_url, generated),
+        }, index=data.index)
+    def _normalize_dataframe_columns(self, df: pd.DataFrame, rename_map: Optional[Dict[Any, str]] = None) -> pd.DataFrame:
+        """
+        Normalize DataFrame column names to standard fields.
+        Args:
+            df: pandas DataFrame
+            rename_map: Precomputed column rename map, computed from df when omitted
+        Returns:
+            DataFrame with normalized column names
+        """
+        if rename_map is None:
+            rename_map = self._column_rename_map(df.columns)
+        df.rename(columns=rename_map, inplace=True)
+        return df
+    def _column_rename_map(self, columns) -> Dict[Any, str]:
+        """
+        Map original column names to lower-cased names, using standard field names where known.
+        Args:
+            columns: Original column labels
+        Returns:
+            Dictionary of original label to normalized name
+        """
+        lowered = {col: str(col).lower().strip() for col in columns}
+        rename_map = dict(lowered)
+        for standard_name, alternatives in self.COLUMN_MAPPINGS.items():
+            for col, lower in lowered.items():
+                if lower in alternatives:
+                    rename_map[col] = standard_name
+                    break
+        return rename_map
+    def _parse_key_value(self, text: str) -> tuple[Optional[str], Optional[str]]:
+        """
+        Parse key-value pair from text.
+        Args:
+            text: Text containing key: value format
+        Returns:
+            Tuple of (key, value)
+        """
+        parts = text.split(':', 1)
+        if len(parts) != 2:
+            return None, None
+        key = parts[0].strip().lower()
+        value = parts[1].strip()
+        for standard_name, alternatives in self.COLUMN_MAPPINGS.items():
+            if key in alternatives:
+                return standard_name, value
+        return key, value
+    def _classify_text_line(self, text: str, item: Dict[str, Any], tag: str) -> None:
+        """
+        Add a classified text line to item.
+        Args:
+            text: Text line
+            item: Item dictionary to update (modified in place)
+            tag: Tag from LINE_CLASSIFIER for this line
+        """
+        if tag == line_classifier.URL:
+            item['url'] = text
+        elif tag == line_classifier.DATE:
+            item['event_date'] = text
+        elif tag == line_classifier.ADDRESS:
+            item['venue_address'] = text
+        elif tag == line_classifier.NAME:
+            if not item.get('name'):
+                item['name'] = text
+                item['venue_name'] = text
+            else:
+                item.setdefault('description', []).append(text)
+        else:
+            item.setdefault('description', []).append(text)
+    def _clean_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Clean and standardize item data.
+        Args:
+            item: Raw item dictionary
+        Returns:
+            Cleaned item dictionary
+        """
+        cleaned = {}
+        if isinstance(item.get('description'), list):
+            item['description'] = ' '.join(item['description'])[:500]
+        for key, value in item.items():
+            if pd.isna(value) or value == '' or value is None:
+                continue
+            cleaned[key] = str(value).strip()
+        return cleaned
+    def _validate_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Validate and filter items.
+        Args:
+            items: List of item dictionaries
+        Returns:
+            List of valid items
+        """
+        valid_items = []
+        for item in items:
+            if self._is_valid_item(item):
+                valid_items.append(item)
+            else:
+                self.logger.debug(
+                    f"Skipping invalid item: {item.get('name', 'Unknown')}")
+        return valid_items
+    def _is_valid_item(self, item: Dict[str, Any]) -> bool:
+        """
+        Check if item meets minimum requirements.
+        Args:
+            item: Item dictionary
+        Returns:
+            True if valid, False otherwise
+        """
+        name = item.get('name', '')
+        if not name or len(name) < 3:
+            return False
+        if not any(c.isalpha() for c in name):
+            return False
+        return True
+    def _build_item(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build output item dictionary from cleaned data.
+        Args:
+            data: Item data dictionary
+        Returns:
+            Dictionary with BusinessItem fields
+        """
+        return {
+            'source': self._get_source_name(),
+            'name': data.get('name', '').strip(),
+            'venue_name': data.get('venue_name', data.get('name', '')).strip(),
+            'venue_address': data.get('venue_address', '').strip(),
+            'venue_city': data.get('venue_city', 'Nashville'),
+            'description': data.get('description', '').strip(),
+            'event_date': data.get('event_date'),
+            'category': data.get('category', 'document_extracted'),
+            'url': self._get_or_generate_url(data),
+        }
+    def _get_source_name(self) -> str:
+        """Get display name for data source."""
+        return f"document_upload_{self.file_extension[1:]}"
+    def _get_or_generate_url(self, data: Dict[str, Any]) -> str:
+        """
+        Get existing URL or generate unique identifier.
+        Args:
+            data: Item data dictionary
+        Returns:
+            URL string
+        """
+        url = data.get('url', '').strip()
+        if url and len(url) > 5 and url.startswith('http'):
+            return url
+        return self._generated_url(data.get('name', ''), data.get('venue_address', ''))
+    def _generated_url(self, name: str, venue_address: str) -> str:
+        """Build a stable document:// identifier from the item name, address and file name."""
+        content = f"{name}|{venue_address}|{os.path.basename(self.file_path)}"
+        hash_value = hashlib.md5(content.encode()).hexdigest()[:12]
+        return f"document://{self.file_extension[1:]}-event/{hash_value}"
+def extract_document_items(file_path: str, logger: Optional[logging.Logger] = None) -> List[Dict[str, Any]]:
+    """
+    Extract items from a structured document without running a crawl.
+    Args:
+        file_path: Absolute path to the document to process
+        logger: Optional logger for extraction messages
+    Returns:
+        List of item dictionaries with BusinessItem fields
+    """
+    return DocumentExtractor(file_path, logger=logger).extract_items()
+def iter_document_item_batches(file_path: str, logger: Optional[logging.Logger] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream items from a structured document in batches without running a crawl.
+    Args:
+        file_path: Absolute path to the document to process
+        logger: Optional logger for extraction messages
+    Yields:
+        Lists of item dictionaries with BusinessItem fields
+    """
+    return DocumentExtractor(file_path, logger=logger).iter_item_batches()
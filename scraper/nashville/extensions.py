@@ -0,0 +1,56 @@
+from numbers import Number
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from metrics import incr, set_gauge
+class MetricsStatsExtension:
+    """Pushes each spider's Scrapy stats into the shared Redis metrics store when it closes."""
+    COUNTER_STATS = {
+        'item_scraped_count': 'scrapy_items_scraped_total',
+        'downloader/request_count': 'scrapy_requests_total',
+        'downloader/response_bytes': 'scrapy_response_bytes_total',
+        'log_count/ERROR': 'scrapy_errors_total',
+        'watermark/requests_saved': 'scrapy_watermark_requests_saved_total',
+        'watermark/bytes_saved': 'scrapy_watermark_bytes_saved_total',
+        'generic/detail_fetches_avoided': 'scrapy_detail_fetches_avoided_total',
+        'httpcache/hit': 'scrapy_httpcache_hits_total',
+        'httpcache/revalidate': 'scrapy_httpcache_revalidations_total',
+        'httpcache/bytes_saved': 'scrapy_httpcache_bytes_saved_total',
+        'ratelimit/throttled': 'scrapy_ratelimit_throttled_total',
+        'quota/exhausted': 'scrapy_quota_exhausted_total',
+    }
+    def __init__(self, stats):
+        self.stats = stats
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+    def spider_closed(self, spider, reason):
+        stats = self.stats.get_stats(spider)
+        incr('scrapy_spider_runs_total', {'spider': spider.name, 'reason': reason})
+        for stat_name, metric_name in self.COUNTER_STATS.items():
+            incr(metric_name, {'spider': spider.name}, stats.get(stat_name, 0))
+        for stat_name, value in stats.items():
+            if isinstance(value, Number) and not isinstance(value, bool):
+                set_gauge('scrapy_last_run_stat', {'spider': spider.name, 'stat': stat_name}, value)
+class HttpCacheStatsExtension:
+    """Counts response bytes served from the HTTP cache and logs a cache summary when a spider closes."""
+    def __init__(self, stats):
+        self.stats = stats
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('HTTPCACHE_ENABLED'):
+            raise NotConfigured
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+    def response_received(self, response, request, spider):
+        if 'cached' in response.flags:
+            self.stats.inc_value('httpcache/bytes_saved', len(response.body), spider=spider)
+    def spider_closed(self, spider, reason):
+        stats = self.stats.get_stats(spider)
+        spider.logger.info(
+            f"HTTP cache: {stats.get('httpcache/hit', 0)} hits, {stats.get('httpcache/miss', 0)} misses, "
+            f"{stats.get('httpcache/revalidate', 0)} revalidated (304), "
+            f"{stats.get('httpcache/bytes_saved', 0)} bytes served from cache")
@@ -0,0 +1,31 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from scrapy.extensions.httpcache import FilesystemCacheStorage
+from scrapy.http import Headers
+class CredentialSafeCacheStorage(FilesystemCacheStorage):
+    """
+    FilesystemCacheStorage that keeps API credentials out of HTTPCACHE_DIR. Query parameters
+    named in HTTPCACHE_CREDENTIAL_PARAMS are stripped from the stored request and response
+    URLs and headers named in HTTPCACHE_CREDENTIAL_HEADERS are dropped from the stored
+    request headers. Entries are keyed on the stripped URL, so rotating a key keeps the cache.
+    """
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.credential_params = {name.lower() for name in settings.getlist('HTTPCACHE_CREDENTIAL_PARAMS')}
+        self.credential_headers = settings.getlist('HTTPCACHE_CREDENTIAL_HEADERS')
+    def strip_url(self, url: str) -> str:
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if name.lower() not in self.credential_params]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+    def _redact_request(self, request):
+        headers = Headers(request.headers)
+        for header in self.credential_headers:
+            headers.pop(header, None)
+        return request.replace(url=self.strip_url(request.url), headers=headers)
+    def _get_request_path(self, spider, request):
+        return super()._get_request_path(spider, request.replace(url=self.strip_url(request.url)))
+    def store_response(self, spider, request, response):
+        super().store_response(spider, self._redact_request(request),
+                               response.replace(url=self.strip_url(response.url)))
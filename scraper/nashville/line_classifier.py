@@ -0,0 +1,73 @@
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Iterable, List, Sequence
+DATE_PATTERNS = [
+    r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*[ \t]+\d{1,2},?[ \t]+\d{4}',
+    r'\d{1,2}/\d{1,2}/\d{2,4}',
+    r'\d{4}-\d{2}-\d{2}'
+]
+ADDRESS_KEYWORDS = ['street', 'st', 'avenue', 'ave', 'road',
+                    'rd', 'boulevard', 'blvd', 'drive', 'dr', 'nashville']
+URL_PATTERN = r'https?://[^\s]+'
+URL, DATE, ADDRESS, NAME, DESCRIPTION = 'url', 'date', 'address', 'name', 'description'
+TAG_PRIORITY = {URL: 0, DATE: 1, ADDRESS: 2}
+def _words(alternatives: Iterable[str]) -> str:
+    return r'\b(?:' + '|'.join(alternatives) + r')\b'
+# Dates take only a leading \b, as in LineClassifier.
+DATE_RE = re.compile(r'\b(?:' + '|'.join(DATE_PATTERNS) + ')', re.IGNORECASE)
+ADDRESS_RE = re.compile(_words(map(re.escape, ADDRESS_KEYWORDS)), re.IGNORECASE)
+URL_RE = re.compile(URL_PATTERN)
+class LineClassifier:
+    """
+    Tags lines of extracted text as url, date, address, name or description.
+    URL, date and address patterns are combined into one precompiled regex with named
+    groups and run over the lowercased document, so a whole document is tagged in a
+    single finditer pass. Address keywords only match whole words ("St" but not the
+    "st" in "Festival").
+    """
+    def __init__(self, address_keywords: Sequence[str] = ADDRESS_KEYWORDS, url_anywhere: bool = True,
+                 min_name_length: int = 5, max_name_length: int = 100):
+        """
+        Args:
+            address_keywords: Words that mark a line as an address
+            url_anywhere: Match URLs anywhere in the line, or only at its start
+            min_name_length: Shortest capitalized line treated as a name
+            max_name_length: Longest capitalized line treated as a name
+        """
+        url = URL_PATTERN if url_anywhere else f'^{URL_PATTERN}'
+        dates = '|'.join(DATE_PATTERNS)
+        keywords = '|'.join(re.escape(keyword.lower()) for keyword in address_keywords)
+        # One leading \b shared by the date and address branches keeps the scan cheap; only
+        # keywords need a trailing one, since ISO datetimes ("2025-03-14T19:00") run on past the date.
+        self.pattern = re.compile(
+            rf'(?P<{URL}>{url})|\b(?:(?P<{DATE}>{dates})|(?P<{ADDRESS}>{keywords})\b)', re.MULTILINE)
+        self.min_name_length = min_name_length
+        self.max_name_length = max_name_length
+    def _fallback(self, line: str) -> str:
+        if self.min_name_length <= len(line) <= self.max_name_length and line[0].isupper():
+            return NAME
+        return DESCRIPTION
+    def classify(self, line: str) -> str:
+        """Tag a single line."""
+        return self.classify_lines([line])[0]
+    def classify_lines(self, lines: Sequence[str]) -> List[str]:
+        """
+        Tag every line of a document in one regex pass over the joined text.
+        Args:
+            lines: Text lines, in document order
+        Returns:
+            One tag per line, in order
+        """
+        if not lines:
+            return []
+        # Lowercase per line (lowercasing can change length) and flatten stray newlines so offsets map back to lines.
+        lowered = [line.lower().replace('\n', ' ') for line in lines]
+        starts = [0, *accumulate(len(line) + 1 for line in lowered[:-1])]
+        best = [None] * len(lines)
+        for match in self.pattern.finditer('\n'.join(lowered)):
+            index = bisect_right(starts, match.start()) - 1
+            tag = match.lastgroup
+            if best[index] is None or TAG_PRIORITY[tag] < TAG_PRIORITY[best[index]]:
+                best[index] = tag
+        return [tag or self._fallback(line) for tag, line in zip(best, lines)]
@@ -0,0 +1,193 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+from twisted.internet.threads import deferToThread
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from scraper.nashville.crawl_state import get_state_redis
+RATE_KEY_PREFIX = 'ratelimit:'
+QUOTA_KEY_PREFIX = 'quota:'
+THROTTLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+def quota_key(api: str) -> str:
+    """Redis key of today's (UTC) quota ledger for an API."""
+    return f"{QUOTA_KEY_PREFIX}{api}:{datetime.now(timezone.utc):%Y%m%d}"
+def remaining_quotas(r, limits: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Requests left of today's quota per API name, for the APIs in `limits` with a daily_quota."""
+    metered = [limit for limit in limits.values() if limit.get('daily_quota')]
+    if not metered:
+        return {}
+    used = r.mget([quota_key(limit['name']) for limit in metered])
+    return {limit['name']: limit['daily_quota'] - int(count or 0) for limit, count in zip(metered, used)}
+TOKEN_BUCKET_SCRIPT = """
+local key = KEYS[1]
+local default_rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', key, 'tokens', 'ts', 'rate', 'blocked_until')
+local blocked_until = tonumber(data[4]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+local rate = tonumber(data[3]) or default_rate
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', key, 86400)
+return tostring(wait)
+"""
+logger = logging.getLogger(__name__)
+class ApiRateLimitMiddleware:
+    """
+    Shared per-API rate limiting for every spider that talks to a metered API.
+    Each host listed in API_RATE_LIMITS gets a Redis token bucket (so concurrent spiders and
+    workers share one budget), a daily quota ledger, Retry-After handling and AIMD tuning of
+    both the shared request rate and the local download-slot concurrency. Redis calls run in
+    the reactor thread pool so a slow Redis never stalls the crawl. If Redis is unavailable
+    the middleware fails open for REDIS_RETRY_SECONDS and only the local concurrency tuning applies.
+    """
+    MAX_WAIT_SECONDS = 300
+    RAMP_UP_EVERY = 20
+    REDIS_RETRY_SECONDS = 30
+    def __init__(self, crawler, limits: Dict[str, Dict[str, Any]]):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.limits = limits
+        self.max_concurrency = crawler.settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+        self.successes = {}
+        self._bucket_script = None
+        self._redis_warned = False
+        self._redis_down_until = 0.0
+    @classmethod
+    def from_crawler(cls, crawler):
+        limits = crawler.settings.getdict('API_RATE_LIMITS')
+        if not limits or not crawler.settings.getbool('API_RATE_LIMIT_ENABLED', True):
+            raise NotConfigured
+        return cls(crawler, limits)
+    def _limit_for(self, request) -> Optional[Dict[str, Any]]:
+        return self.limits.get(urlparse_cached(request).hostname or '')
+    def _redis(self):
+        if time.monotonic() < self._redis_down_until:
+            return None
+        r = get_state_redis()
+        if r is not None and self._bucket_script is None:
+            self._bucket_script = r.register_script(TOKEN_BUCKET_SCRIPT)
+        return r
+    def _fail_open(self, action: str, error: Exception) -> None:
+        self.stats.inc_value('ratelimit/redis_errors')
+        self._redis_down_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+        if not self._redis_warned:
+            logger.warning(f"Rate limiter could not {action} ({error}); continuing without shared limits "
+                           f"for {self.REDIS_RETRY_SECONDS}s at a time")
+            self._redis_warned = True
+    def _in_background(self, action: str, func, *args) -> None:
+        """Run a Redis update in the thread pool without waiting for it."""
+        deferToThread(func, *args).addErrback(lambda failure: self._fail_open(action, failure.value))
+    def _take_token(self, api: str, limit: Dict[str, Any]) -> float:
+        """Seconds to wait before a token is free; 0 when one was taken."""
+        return float(self._bucket_script(keys=[f"{RATE_KEY_PREFIX}{api}"],
+                                         args=[limit['rate'], limit.get('burst', limit['rate']), time.time()]))
+    def _count_request(self, r, api: str) -> int:
+        """Record one request against today's quota ledger and return the count so far."""
+        ledger_key = quota_key(api)
+        used = r.incr(ledger_key)
+        if used == 1:
+            r.expire(ledger_key, 2 * 86400)
+        return used
+    async def process_request(self, request, spider):
+        if not (limit := self._limit_for(request)):
+            return None
+        if (r := self._redis()) is None:
+            return None
+        api = limit['name']
+        waited, used = 0.0, None
+        try:
+            while True:
+                wait = await maybe_deferred_to_future(deferToThread(self._take_token, api, limit))
+                if wait <= 0 or waited >= self.MAX_WAIT_SECONDS:
+                    break
+                wait = min(wait, self.MAX_WAIT_SECONDS - waited)
+                waited += wait
+                await asyncio.sleep(wait)
+            # Only requests that got a token count against the quota.
+            if limit.get('daily_quota'):
+                used = await maybe_deferred_to_future(deferToThread(self._count_request, r, api))
+        except Exception as e:
+            self._fail_open('acquire a token', e)
+            return None
+        if waited:
+            self.stats.inc_value('ratelimit/throttled')
+            self.stats.inc_value(f'ratelimit/{api}/wait_seconds', waited)
+        if used is not None:
+            if used > limit['daily_quota']:
+                self.stats.inc_value('quota/exhausted')
+                self.stats.inc_value(f'quota/{api}/exhausted')
+                raise IgnoreRequest(f"Daily quota for {api} exhausted ({limit['daily_quota']} requests)")
+            self.stats.set_value(f'quota/{api}/used_today', used)
+        return None
+    async def process_response(self, request, response, spider):
+        if not (limit := self._limit_for(request)) or 'cached' in response.flags:
+            return response
+        api = limit['name']
+        if response.status in THROTTLE_STATUSES:
+            # Awaited so the shared bucket is paused before RetryMiddleware reschedules the request.
+            await self._back_off(request, limit, self._retry_after(response))
+            self.stats.inc_value(f'ratelimit/{api}/backoffs')
+        elif 200 <= response.status < 300:
+            self._ramp_up(request, limit)
+        return response
+    def _retry_after(self, response) -> Optional[float]:
+        if not (value := response.headers.get('Retry-After')):
+            return None
+        try:
+            return max(float(value.decode()), 0.0)
+        except ValueError:
+            return None
+    def _slot(self, request):
+        key = request.meta.get('download_slot') or urlparse_cached(request).hostname or ''
+        return self.crawler.engine.downloader.slots.get(key)
+    async def _back_off(self, request, limit: Dict[str, Any], retry_after: Optional[float]) -> None:
+        api = limit['name']
+        self.successes[api] = 0
+        if slot := self._slot(request):
+            slot.concurrency = max(1, slot.concurrency // 2)
+        if (r := self._redis()) is None:
+            return
+        try:
+            await maybe_deferred_to_future(deferToThread(self._store_back_off, r, limit, retry_after))
+        except Exception as e:
+            self._fail_open('record a back-off', e)
+    def _store_back_off(self, r, limit: Dict[str, Any], retry_after: Optional[float]) -> None:
+        api = limit['name']
+        key = f"{RATE_KEY_PREFIX}{api}"
+        current = float(r.hget(key, 'rate') or limit['rate'])
+        new_rate = max(limit.get('min_rate', limit['rate'] / 10), current / 2)
+        mapping = {'rate': new_rate}
+        if retry_after:
+            mapping['blocked_until'] = time.time() + retry_after
+        r.hset(key, mapping=mapping)
+        logger.info(f"Backing off {api}: rate {current:.2f} -> {new_rate:.2f} req/s"
+                    + (f", paused {retry_after:.0f}s" if retry_after else ''))
+    def _ramp_up(self, request, limit: Dict[str, Any]) -> None:
+        api = limit['name']
+        self.successes[api] = self.successes.get(api, 0) + 1
+        if self.successes[api] % self.RAMP_UP_EVERY:
+            return
+        if (slot := self._slot(request)) and slot.concurrency < self.max_concurrency:
+            slot.concurrency += 1
+        if (r := self._redis()) is not None:
+            self._in_background('ramp up', self._store_ramp_up, r, limit)
+    def _store_ramp_up(self, r, limit: Dict[str, Any]) -> None:
+        key = f"{RATE_KEY_PREFIX}{limit['name']}"
+        current = float(r.hget(key, 'rate') or limit['rate'])
+        if current < limit['rate']:
+            r.hset(key, 'rate', min(limit['rate'], current + limit['rate'] / 10))
@@ -0,0 +1,108 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+import pymupdf
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '40'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(os.cpu_count() or 1, 4))))
+# More ranges than workers, so ranges not yet started can be cancelled once the text cap is hit.
+PDF_RANGES_PER_WORKER = int(os.getenv('PDF_RANGES_PER_WORKER', '4'))
+PDF_MAX_CHARS_PER_PAGE = int(os.getenv('PDF_MAX_CHARS_PER_PAGE', '20000'))
+PDF_MAX_TOTAL_CHARS = int(os.getenv('PDF_MAX_TOTAL_CHARS', '5000000'))
+logger = logging.getLogger(__name__)
+_pools = {}
+_pools_lock = threading.Lock()
+def _extract_page_range(file_path: str, start: int, stop: int, max_chars_per_page: int) -> List[str]:
+    with pymupdf.open(file_path) as doc:
+        return [doc[page_number].get_text()[:max_chars_per_page] for page_number in range(start, stop)]
+def page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split pages into contiguous, nearly equal ranges.
+    Args:
+        page_count: Number of pages in the document
+        parts: Number of ranges wanted
+    Returns:
+        List of (start, stop) page index pairs
+    """
+    parts = max(1, min(parts, page_count))
+    size, remainder = divmod(page_count, parts)
+    ranges, start = [], 0
+    for index in range(parts):
+        stop = start + size + (1 if index < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return [(start, stop) for start, stop in ranges if stop > start]
+def _can_use_process_pool() -> bool:
+    # Celery prefork children are daemonic and may not start processes of their own.
+    return not multiprocessing.current_process().daemon
+def _shared_pool(workers: int) -> ProcessPoolExecutor:
+    # Long-lived and shared by every thread, so concurrent uploads on a threaded worker
+    # queue for the same `workers` processes instead of each starting a pool of their own.
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _pools[workers]
+def _discard_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False)
+def extract_pdf_pages(file_path: str, workers: Optional[int] = None,
+                      max_chars_per_page: int = PDF_MAX_CHARS_PER_PAGE,
+                      max_total_chars: int = PDF_MAX_TOTAL_CHARS) -> List[str]:
+    """
+    Extract text from a PDF page by page, spreading large documents over a process pool
+    shared by every extraction in the process, so concurrent calls never run more than
+    `workers` extra processes. Documents shorter than PDF_PARALLEL_MIN_PAGES, single-worker
+    runs and daemonic processes are read serially. Page text is capped per page and in total:
+    ranges are consumed in page order and reading stops once the total cap is reached, with
+    the remaining ranges cancelled, so huge scanned documents are not read to the end. Pages
+    past the total cap come back empty.
+    Args:
+        file_path: Path to the PDF
+        workers: Process count, defaults to PDF_WORKERS
+        max_chars_per_page: Characters kept per page
+        max_total_chars: Characters kept across the whole document
+    Returns:
+        List with one text string per page, in page order
+    """
+    workers = workers or PDF_WORKERS
+    pages, total = [], 0
+    def keep(texts) -> bool:
+        # Append page texts while they fit the total cap; False once one does not.
+        nonlocal total
+        for text in texts:
+            if total + len(text) > max_total_chars:
+                return False
+            total += len(text)
+            pages.append(text)
+        return True
+    with pymupdf.open(file_path) as doc:
+        page_count = doc.page_count
+        parallel = page_count >= PDF_PARALLEL_MIN_PAGES and workers > 1 and _can_use_process_pool()
+        if not parallel:
+            keep(doc[page_number].get_text()[:max_chars_per_page] for page_number in range(page_count))
+    if parallel:
+        pool = _shared_pool(workers)
+        futures = [pool.submit(_extract_page_range, file_path, start, stop, max_chars_per_page)
+                   for start, stop in page_ranges(page_count, workers * PDF_RANGES_PER_WORKER)]
+        try:
+            for future in futures:
+                if not keep(future.result()):
+                    break
+        except BrokenProcessPool:
+            _discard_pool(workers, pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+    if len(pages) < page_count:
+        logger.warning(f"{file_path}: text cap of {max_total_chars} characters reached at page {len(pages) + 1}/{page_count}")
+        pages.extend([''] * (page_count - len(pages)))
+    return pages
+def extract_pdf_text(file_path: str, workers: Optional[int] = None) -> str:
+    """Extract the whole document as one string, pages separated by newlines."""
+    return '\n'.join(extract_pdf_pages(file_path, workers))
@@ -0,0 +1,71 @@
+import os
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple, Mapping, Optional
+from scrapy.utils.misc import walk_modules
+from scrapy.utils.spider import iter_spider_classes
+SPIDER_PACKAGE = 'scraper.nashville.spiders'
+@lru_cache(maxsize=1)
+def get_spider_registry() -> Dict[str, Dict[str, Any]]:
+    """
+    Import the spider package once and collect the metadata declared on each spider class.
+    Returns:
+        Mapping of spider name to its metadata
+    """
+    registry = {}
+    for module in walk_modules(SPIDER_PACKAGE):
+        for spider_cls in iter_spider_classes(module):
+            registry[spider_cls.name] = {
+                'name': spider_cls.name,
+                'spider_class': spider_cls,
+                'schedulable': getattr(spider_cls, 'schedulable', True),
+                'expected_duration': getattr(spider_cls, 'expected_duration', None),
+                'quota_cost': getattr(spider_cls, 'quota_cost', 0),
+                'required_env': list(getattr(spider_cls, 'required_env', [])),
+            }
+    return registry
+def missing_env_keys(spider_name: str, environ: Optional[Mapping[str, str]] = None) -> List[str]:
+    """Return the required environment keys that are unset for a spider."""
+    environ = os.environ if environ is None else environ
+    entry = get_spider_registry()[spider_name]
+    return [key for key in entry['required_env'] if not environ.get(key)]
+def get_schedulable_spiders(environ: Optional[Mapping[str, str]] = None) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Pick the spiders a scheduled crawl should run.
+    Args:
+        environ: Environment to check required keys against (defaults to os.environ)
+    Returns:
+        Tuple of (spider names to run, mapping of skipped spider name to its missing keys)
+    """
+    to_run, skipped = [], {}
+    for name, entry in sorted(get_spider_registry().items()):
+        if not entry['schedulable']:
+            continue
+        missing = missing_env_keys(name, environ)
+        if missing:
+            skipped[name] = missing
+        else:
+            to_run.append(name)
+    return to_run, skipped
+def plan_spider_run(spider_names: List[str], quota_remaining: Optional[Mapping[str, int]] = None
+                    ) -> Tuple[List[str], Dict[str, Tuple[int, int]]]:
+    """
+    Order spiders by expected_duration, shortest first, leaving out those whose quota_cost is more
+    than their API has left today. Metered APIs are named after their spiders in API_RATE_LIMITS.
+    Args:
+        spider_names: Spiders to run
+        quota_remaining: Requests left today per API name; unlisted APIs are not limited
+    Returns:
+        Tuple of (spider names in run order, mapping of skipped spider name to (quota_cost, remaining))
+    """
+    registry = get_spider_registry()
+    quota_remaining = quota_remaining or {}
+    to_run, over_quota = [], {}
+    for name in spider_names:
+        cost, remaining = registry[name]['quota_cost'], quota_remaining.get(name)
+        if cost and remaining is not None and cost > remaining:
+            over_quota[name] = (cost, remaining)
+        else:
+            to_run.append(name)
+    # Spiders without an expected_duration run last.
+    to_run.sort(key=lambda name: registry[name]['expected_duration'] or float('inf'))
+    return to_run, over_quota
@@ -1,3 +1,4 @@
+import os
 BOT_NAME = "nashville"
 SPIDER_MODULES = ["scraper.nashville.spiders"]
 NEWSPIDER_MODULE = "scraper.nashville.spiders"
@@ -6,8 +7,37 @@ ROBOTSTXT_OBEY = False
 ITEM_PIPELINES = {
    "scraper.nashville.pipelines.PostgresPipeline": 300,
 }
-DOWNLOAD_HANDLERS = {
-    "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-    "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+DOWNLOADER_MIDDLEWARES = {
+    "scraper.nashville.middlewares.ApiRateLimitMiddleware": 950,
 }
-TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
\ No newline at end of file
+API_RATE_LIMIT_ENABLED = os.getenv("API_RATE_LIMIT_ENABLED", "1") == "1"
+API_RATE_LIMITS = {
+    "api.yelp.com": {"name": "yelp", "rate": float(os.getenv("YELP_RATE", "5")), "burst": 5,
+                     "daily_quota": int(os.getenv("YELP_DAILY_QUOTA", "5000"))},
+    "places.googleapis.com": {"name": "google_places", "rate": float(os.getenv("GOOGLE_PLACES_RATE", "10")), "burst": 10,
+                              "daily_quota": int(os.getenv("GOOGLE_PLACES_DAILY_QUOTA", "1000"))},
+    "app.ticketmaster.com": {"name": "ticketmaster", "rate": float(os.getenv("TICKETMASTER_RATE", "5")), "burst": 5,
+                             "daily_quota": int(os.getenv("TICKETMASTER_DAILY_QUOTA", "5000"))},
+    "api.seatgeek.com": {"name": "seatgeek", "rate": float(os.getenv("SEATGEEK_RATE", "10")), "burst": 10,
+                         "daily_quota": int(os.getenv("SEATGEEK_DAILY_QUOTA", "10000"))},
+    "services2.arcgis.com": {"name": "arcgis", "rate": float(os.getenv("ARCGIS_RATE", "8")), "burst": 8},
+}
+TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
+EXTENSIONS = {
+    "scraper.nashville.extensions.MetricsStatsExtension": 500,
+    "scraper.nashville.extensions.HttpCacheStatsExtension": 510,
+}
+HTTPCACHE_MODE = os.getenv("HTTPCACHE_MODE", "rfc2616")
+HTTPCACHE_ENABLED = HTTPCACHE_MODE != "off"
+HTTPCACHE_DIR = os.getenv("HTTPCACHE_DIR", "httpcache")
+HTTPCACHE_STORAGE = "scraper.nashville.httpcache.CredentialSafeCacheStorage"
+HTTPCACHE_GZIP = True
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+# Stripped from cached request URLs and headers (see httpcache.py), so API keys are not written to HTTPCACHE_DIR.
+HTTPCACHE_CREDENTIAL_PARAMS = ["apikey", "api_key", "key", "client_id", "client_secret", "access_token", "token"]
+HTTPCACHE_CREDENTIAL_HEADERS = ["Authorization", "X-Goog-Api-Key"]
+if HTTPCACHE_MODE in ("record", "offline"):
+    HTTPCACHE_POLICY = "scrapy.extensions.httpcache.DummyPolicy"
+    HTTPCACHE_IGNORE_MISSING = HTTPCACHE_MODE == "offline"
+else:
+    HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
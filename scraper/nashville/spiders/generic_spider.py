@@ -1,25 +1,81 @@
 import scrapy
 import json
+import os
+import time
+import resource
+import hashlib
+from urllib.parse import urlparse
 from scrapy_playwright.page import PageMethod
 from scraper.nashville.items import BusinessItem
+from scraper.nashville.crawl_state import load_state_many, save_state_many
+SITES_CONFIG_PATH = os.getenv('SITES_CONFIG_PATH', '/app/sites.json')
+BLOCKED_RESOURCE_TYPES = frozenset(['image', 'media', 'font'])
+TRACKER_HOSTS = ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'facebook.net',
+                 'hotjar.com', 'segment.io', 'scorecardresearch.com', 'quantserve.com', 'adsystem.com')
+def _site_domain(url):
+    host = urlparse(url).hostname or ''
+    return '.'.join(host.split('.')[-2:])
+def should_abort_request(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request.url).hostname or ''
+    if any(host == tracker or host.endswith(f'.{tracker}') for tracker in TRACKER_HOSTS):
+        return True
+    if request.resource_type == 'script':
+        try:
+            page_url = request.frame.url
+        except Exception:
+            return False
+        return bool(page_url.startswith('http')) and _site_domain(request.url) != _site_domain(page_url)
+    return False
+def load_sites_config(path=SITES_CONFIG_PATH):
+    with open(path, 'r') as f:
+        return json.load(f)
 class GenericSpider(scrapy.Spider):
     name = 'generic'
+    schedulable = True
+    expected_duration = 600
+    quota_cost = 0
+    required_env = []
+    DEFAULT_SITE_CONCURRENCY = int(os.getenv('GENERIC_SITE_CONCURRENCY', '4'))
+    DEFAULT_DETAIL_MAX_AGE_HOURS = float(os.getenv('GENERIC_DETAIL_MAX_AGE_HOURS', '24'))
+    custom_settings = {
+        'DOWNLOAD_HANDLERS': {
+            'http': 'scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler',
+            'https': 'scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler',
+        },
+        'PLAYWRIGHT_ABORT_REQUEST': should_abort_request,
+        'PLAYWRIGHT_MAX_CONTEXTS': int(os.getenv('PLAYWRIGHT_MAX_CONTEXTS', '4')),
+        'PLAYWRIGHT_MAX_PAGES_PER_CONTEXT': int(os.getenv('PLAYWRIGHT_MAX_PAGES_PER_CONTEXT', '4')),
+    }
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        try:
+            sites_config = load_sites_config()
+        except Exception:
+            return
+        slots = {source: {'concurrency': config.get('max_concurrency', cls.DEFAULT_SITE_CONCURRENCY)}
+                 for source, config in sites_config.items()}
+        settings.set('DOWNLOAD_SLOTS', slots, priority='spider')
     async def start(self):
-        config_path = '/app/sites.json'        
+        self.started_at = time.monotonic()
+        self.freshness_updates = {}
         try:
-            with open(config_path, 'r') as f:
-                sites_config = json.load(f)
+            sites_config = load_sites_config()
         except FileNotFoundError:
-            self.logger.error(f"CRITICAL: sites.json file not found at {config_path}")
+            self.logger.error(f"CRITICAL: sites.json file not found at {SITES_CONFIG_PATH}")
             return
         except Exception as e:
             self.logger.error(f"CRITICAL: Failed to read or parse sites.json: {e}")
             return
         for source, config in sites_config.items():
-            meta = {'config': config, 'source': source}
+            meta = {'config': config, 'source': source, 'download_slot': source,
+                    'dont_cache': config.get('dont_cache', False)}
             wait_selector = config.get('item_container_selector') or config.get('item_anchor_selector')
             if config.get('uses_playwright', False):
                 meta['playwright'] = True
+                meta['playwright_context'] = source
                 methods = []
                 if wait_selector:
                     if wait_selector.startswith('xpath:'):
@@ -49,6 +105,7 @@ class GenericSpider(scrapy.Spider):
                 parent = anchor.xpath(f'ancestor::{parent_tag}[1]')
                 if parent:
                     item_elements.append(parent)
+        detail_items = []
         for item_element in item_elements:
             item = BusinessItem()
             item['source'] = source
@@ -61,23 +118,42 @@ class GenericSpider(scrapy.Spider):
                     item[field] = data.strip() if data else None
             if config.get('detail_page_fields'):
                 if item.get('url'):
-                    absolute_url = response.urljoin(item['url'])
-                    item['url'] = absolute_url
-                    yield response.follow(
-                        absolute_url,
-                        callback=self.parse_details,
-                        meta={'item': dict(item), 'config': config}
-                    )
+                    item['url'] = response.urljoin(item['url'])
+                    detail_items.append(item)
             else:
                 if item.get('url'):
                     item['url'] = response.urljoin(item['url'])
                 yield item                
+        yield from self._follow_detail_pages(response, detail_items, config, source)
+    def _follow_detail_pages(self, response, items, config, source):
+        """Follow detail links, skipping URLs fetched recently whose listing entry has not changed."""
+        max_age = config.get('detail_max_age_hours', self.DEFAULT_DETAIL_MAX_AGE_HOURS) * 3600
+        known = load_state_many(f'freshness:{source}', [item['url'] for item in items]) if max_age > 0 else {}
+        now = time.time()
+        for item in items:
+            fingerprint = self._listing_fingerprint(item)
+            entry = known.get(item['url'])
+            if entry and entry.get('fingerprint') == fingerprint and now - entry.get('fetched_at', 0) < max_age:
+                self.crawler.stats.inc_value('generic/detail_fetches_avoided')
+                self.crawler.stats.inc_value(f'generic/detail_fetches_avoided/{source}')
+                continue
+            self.crawler.stats.inc_value('generic/detail_fetches')
+            yield response.follow(
+                item['url'],
+                callback=self.parse_details,
+                meta={'item': dict(item), 'config': config, 'download_slot': source, 'fingerprint': fingerprint,
+                      'dont_cache': config.get('dont_cache', False)}
+            )
+    def _listing_fingerprint(self, item):
+        return hashlib.md5(json.dumps(dict(item), sort_keys=True, default=str).encode()).hexdigest()
     def parse_details(self, response):
         item = BusinessItem(response.meta['item'])
         config = response.meta['config']
         for field, css_selector in config.get('detail_page_fields', {}).items():
             data = self._extract_data(response, css_selector)
             item[field] = data.strip() if data else None
+        self.freshness_updates.setdefault(item['source'], {})[item['url']] = {
+            'fetched_at': time.time(), 'fingerprint': response.meta['fingerprint']}
         yield item        
     def _get_elements(self, element, selector_str):
         if selector_str.startswith('xpath:'):
@@ -92,3 +168,19 @@ class GenericSpider(scrapy.Spider):
             return ' '.join(part.strip() for part in raw_data if part.strip())
         else:
             return method(clean_selector).get()
+    def closed(self, reason):
+        if reason == 'finished':
+            for source, updates in getattr(self, 'freshness_updates', {}).items():
+                save_state_many(f'freshness:{source}', updates)
+        avoided = self.crawler.stats.get_value('generic/detail_fetches_avoided', 0)
+        fetched = self.crawler.stats.get_value('generic/detail_fetches', 0)
+        self.logger.info(f"Detail pages: {fetched} fetched, {avoided} avoided by the freshness index")
+        elapsed_minutes = (time.monotonic() - getattr(self, 'started_at', time.monotonic())) / 60
+        pages = self.crawler.stats.get_value('response_received_count', 0)
+        pages_per_minute = pages / elapsed_minutes if elapsed_minutes else 0.0
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.crawler.stats.set_value('generic/pages_per_minute', round(pages_per_minute, 1))
+        self.crawler.stats.set_value('generic/max_rss_mb', round(max_rss_mb, 1))
+        self.logger.info(
+            f"Generic crawl finished ({reason}): {pages} pages, {pages_per_minute:.1f} pages/min, "
+            f"peak RSS {max_rss_mb:.0f} MB (crawler process only, browser processes excluded)")
@@ -1,16 +1,26 @@
 import scrapy
 import os
 import json
+import math
 from dotenv import load_dotenv
 from scraper.nashville.items import BusinessItem
 load_dotenv()
+METERS_PER_DEGREE_LAT = 111320.0
 class GooglePlacesSpider(scrapy.Spider):
     name = 'google_places'
+    schedulable = True
+    expected_duration = 30
+    quota_cost = int(os.getenv('GOOGLE_PLACES_REQUEST_BUDGET', '300'))
+    required_env = ['GOOGLE_API_KEY']
     allowed_domains = []
     base_url = 'https://places.googleapis.com/v1/places:searchNearby'
     NASHVILLE_LAT = 36.1627
     NASHVILLE_LNG = -86.7816
     RADIUS = 15000
+    MAX_RESULT_COUNT = 20
+    MIN_CELL_RADIUS = float(os.getenv('GOOGLE_PLACES_MIN_CELL_RADIUS', '250'))
+    REQUEST_BUDGET = int(os.getenv('GOOGLE_PLACES_REQUEST_BUDGET', '300'))
+    FIELD_MASK = 'places.displayName,places.formattedAddress,places.location,places.rating,places.userRatingCount,places.id,places.types'
     TYPES_TO_SEARCH = [
         'restaurant',
         'lodging',
@@ -19,65 +29,106 @@ class GooglePlacesSpider(scrapy.Spider):
         'museum',
         'bar'
     ]
+    custom_settings = {
+        'CONCURRENT_REQUESTS_PER_DOMAIN': int(os.getenv('GOOGLE_PLACES_CONCURRENT', '4')),
+    }
+    def __init__(self, mode=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mode = mode or os.getenv('GOOGLE_PLACES_MODE', 'tiled')
+        self.seen_place_ids = set()
+        self.requests_issued = 0
+        self.cells_split = 0
     def start_requests(self):
         self.api_key = os.getenv('GOOGLE_API_KEY')
         if not self.api_key:
             self.logger.error(
                 "GOOGLE_API_KEY not found in environment variables")
             return
+        self.logger.info(f"Searching {len(self.TYPES_TO_SEARCH)} types in {self.mode} mode (budget {self.REQUEST_BUDGET} requests)")
         for place_type in self.TYPES_TO_SEARCH:
-            body = {
-                "includedTypes": [place_type],
-                "maxResultCount": 20,
-                "locationRestriction": {
-                    "circle": {
-                        "center": {
-                            "latitude": self.NASHVILLE_LAT,
-                            "longitude": self.NASHVILLE_LNG
-                        },
-                        "radius": self.RADIUS
-                    }
+            if request := self._build_request(place_type, self.NASHVILLE_LAT, self.NASHVILLE_LNG, self.RADIUS, self.RADIUS, 0):
+                yield request
+    def _build_request(self, place_type, lat, lng, radius, half_side, depth):
+        if self.requests_issued >= self.REQUEST_BUDGET:
+            self.crawler.stats.inc_value('google_places/cells_over_budget')
+            return None
+        self.requests_issued += 1
+        body = {
+            "includedTypes": [place_type],
+            "maxResultCount": self.MAX_RESULT_COUNT,
+            "locationRestriction": {
+                "circle": {
+                    "center": {
+                        "latitude": lat,
+                        "longitude": lng
+                    },
+                    "radius": radius
                 }
             }
-            yield scrapy.Request(
-                url=self.base_url,
-                method='POST',
-                headers={
-
-                    'Content-Type': 'application/json',
-
-                    'X-Goog-Api-Key': self.api_key,
-
-                    'X-Goog-FieldMask': 'places.displayName,places.formattedAddress,places.location,places.rating,places.userRatingCount,places.id,places.types'
-                },
-                body=json.dumps(body),
-                callback=self.parse,
-                meta={'place_type': place_type},
-                dont_filter=True
-            )
+        }
+        return scrapy.Request(
+            url=self.base_url,
+            method='POST',
+            headers={
+                'Content-Type': 'application/json',
+                'X-Goog-Api-Key': self.api_key,
+                'X-Goog-FieldMask': self.FIELD_MASK
+            },
+            body=json.dumps(body),
+            callback=self.parse,
+            errback=self.handle_error,
+            priority=-depth,
+            meta={'place_type': place_type, 'cell': (lat, lng, half_side), 'depth': depth},
+            dont_filter=True
+        )
+    def _split_cell(self, place_type, lat, lng, half_side, depth):
+        """Split a square cell into four quadrants, each searched with its circumscribing circle."""
+        child_half_side = half_side / 2
+        child_radius = child_half_side * math.sqrt(2)
+        lat_step = child_half_side / METERS_PER_DEGREE_LAT
+        lng_step = child_half_side / (METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        for lat_sign in (-1, 1):
+            for lng_sign in (-1, 1):
+                child_lat, child_lng = lat + lat_sign * lat_step, lng + lng_sign * lng_step
+                if self._distance_from_center(child_lat, child_lng) - child_radius > self.RADIUS:
+                    continue
+                if request := self._build_request(place_type, child_lat, child_lng, child_radius, child_half_side, depth + 1):
+                    yield request
+    def _distance_from_center(self, lat, lng):
+        lat_m = (lat - self.NASHVILLE_LAT) * METERS_PER_DEGREE_LAT
+        lng_m = (lng - self.NASHVILLE_LNG) * METERS_PER_DEGREE_LAT * math.cos(math.radians(self.NASHVILLE_LAT))
+        return math.hypot(lat_m, lng_m)
     def parse(self, response):
-        data = json.loads(response.text)
         place_type = response.meta['place_type']
         if response.status != 200:
             self.logger.error(
                 f"API error for '{place_type}': Status {response.status}")
             return
+        data = json.loads(response.text)
         places = data.get('places', [])
         if not places:
             self.logger.info(f"No results found for type: {place_type}")
             return
+        new_places = 0
         for place in places:
+            place_id = place.get('id', '').replace(
+                'places/', '')
+            if place_id in self.seen_place_ids:
+                continue
+            location = place.get('location', {})
+            if location.get('latitude') is not None and location.get('longitude') is not None \
+                    and self._distance_from_center(location['latitude'], location['longitude']) > self.RADIUS:
+                continue
+            self.seen_place_ids.add(place_id)
+            new_places += 1
             item = BusinessItem()
             item['source'] = 'google_places'
             display_name = place.get('displayName', {})
             item['name'] = display_name.get('text', 'Unknown')
             item['venue_address'] = place.get('formattedAddress', '')
             item['category'] = place_type
-            location = place.get('location', {})
             item['latitude'] = location.get('latitude')
             item['longitude'] = location.get('longitude')
-            place_id = place.get('id', '').replace(
-                'places/', '')
             if item['name'] and item['latitude'] and item['longitude']:
                 item['url'] = f"https://www.google.com/maps/search/?api=1&query={item['latitude']},{item['longitude']}&query_place_id={place_id}"
             rating = place.get('rating', 'N/A')
@@ -86,4 +137,18 @@ class GooglePlacesSpider(scrapy.Spider):
             item['venue_city'] = 'Nashville'
             yield item
         self.logger.info(
-            f"Scraped {len(places)} places for type: {place_type}")
\ No newline at end of file
+            f"Scraped {new_places} new of {len(places)} places for type: {place_type} (depth {response.meta['depth']})")
+        lat, lng, half_side = response.meta['cell']
+        if self.mode == 'tiled' and len(places) >= self.MAX_RESULT_COUNT and half_side / 2 * math.sqrt(2) >= self.MIN_CELL_RADIUS:
+            self.cells_split += 1
+            yield from self._split_cell(place_type, lat, lng, half_side, response.meta['depth'])
+    def handle_error(self, failure):
+        self.logger.error(f"Google Places request failed: {failure.value}")
+    def closed(self, reason):
+        over_budget = self.crawler.stats.get_value('google_places/cells_over_budget', 0)
+        self.crawler.stats.set_value('google_places/requests_issued', self.requests_issued)
+        self.logger.info(
+            f"Google Places crawl finished ({reason}): {self.requests_issued}/{self.REQUEST_BUDGET} requests, "
+            f"{self.cells_split} cells split, {len(self.seen_place_ids)} unique places")
+        if over_budget:
+            self.logger.warning(f"Request budget exhausted: {over_budget} full cells were not subdivided further")
@@ -1,21 +1,28 @@
 import scrapy
 from scrapy.http import FormRequest
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
+import numpy as np
 from pyproj import Transformer
 from scraper.nashville.items import BusinessItem
+from scraper.nashville.crawl_state import load_state, save_state
 import os
 class NashvilleArcGISSpider(scrapy.Spider):
     name = 'nashville_arcgis'
+    schedulable = True
+    expected_duration = 120
+    quota_cost = 0
+    required_env = []
     allowed_domains = ['services2.arcgis.com']
     custom_settings = {
         'CONCURRENT_REQUESTS': int(os.getenv('ARCGIS_CONCURRENT', '8')),
-        'DOWNLOAD_DELAY': float(os.getenv('ARCGIS_DELAY', '0.25')),
+        'DOWNLOAD_DELAY': float(os.getenv('ARCGIS_DELAY', '0')),
         'RETRY_TIMES': 3,
         'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
     }
     SOURCE_CRS = "EPSG:2274"
     TARGET_CRS = "EPSG:4326"
     RECORDS_PER_REQUEST = 1000
+    OUT_SR = os.getenv('ARCGIS_OUT_SR', '')
     VALID_LAT_RANGE = (35.0, 37.0)
     VALID_LNG_RANGE = (-88.0, -85.0)
     INVALID_STRINGS = frozenset(
@@ -36,10 +43,13 @@ class NashvilleArcGISSpider(scrapy.Spider):
         {'name': 'Cemetery Survey', 'url': 'https://services2.arcgis.com/HdTo6HJqh92wn4D8/arcgis/rest/services/Davidson_County_Cemetery_Survey_Table_view/FeatureServer/0', 'category': 'historic_site',
             'name_field': 'Cemetery_Name', 'address_field': 'Street', 'extra_fields': ['Graveyard_Type', 'Known_Burials', 'Map_ID'], 'where': "Cemetery_Name IS NOT NULL", 'enabled': False},
     ]
-    def __init__(self, *args, **kwargs):
+    def __init__(self, mode=None, full=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.mode = mode or os.getenv('ARCGIS_MODE', 'chunked')
+        self.force_full = str(full or '').lower() in ('1', 'true', 'yes')
+        self.dataset_progress = {}
         self.stats_counter = {'total': 0, 'yielded': 0,
-                              'no_name': 0, 'no_coords': 0, 'out_of_range': 0}
+                              'no_name': 0, 'no_coords': 0, 'out_of_range': 0, 'datasets_skipped': 0}
         try:
             self.transformer = Transformer.from_crs(
                 self.SOURCE_CRS, self.TARGET_CRS, always_xy=True)
@@ -54,8 +64,17 @@ class NashvilleArcGISSpider(scrapy.Spider):
                 self.logger.info(f"Skipping disabled: {dataset['name']}")
                 continue
             self.logger.info(
-                f"Starting: {dataset['name']} ({dataset['category']})")
-            yield self._create_request(dataset, 0)
+                f"Starting: {dataset['name']} ({dataset['category']}) in {self.mode} mode")
+            if self.mode == 'chunked':
+                yield scrapy.Request(
+                    url=f"{dataset['url']}?f=json",
+                    callback=self.parse_layer_info,
+                    meta={'dataset': dataset},
+                    errback=self.handle_error,
+                    dont_filter=True
+                )
+            else:
+                yield self._create_request(dataset, 0)
     def _create_request(self, dataset: Dict[str, Any], offset: int):
         out_fields = ','.join([dataset['name_field'], dataset['address_field']] + dataset['extra_fields'])
         form_data = {
@@ -66,6 +85,8 @@ class NashvilleArcGISSpider(scrapy.Spider):
             'resultOffset': str(offset), 
             'resultRecordCount': str(self.RECORDS_PER_REQUEST)
         }
+        if self.OUT_SR:
+            form_data['outSR'] = self.OUT_SR
         return FormRequest(
             url=f"{dataset['url']}/query", 
             formdata=form_data, 
@@ -74,44 +95,116 @@ class NashvilleArcGISSpider(scrapy.Spider):
             errback=self.handle_error, 
             dont_filter=True
         )
+    def parse_layer_info(self, response):
+        dataset = response.meta['dataset']
+        try:
+            info = response.json()
+        except ValueError as e:
+            self.logger.error(f"Layer info parse error for {dataset['name']}: {e}")
+            return
+        last_edit_date = (info.get('editingInfo') or {}).get('lastEditDate')
+        previous = load_state('arcgis', dataset['name'])
+        if last_edit_date and not self.force_full and previous.get('last_edit_date') == last_edit_date:
+            self.stats_counter['datasets_skipped'] += 1
+            self.logger.info(f"Skipping {dataset['name']}: unchanged since last run (lastEditDate {last_edit_date})")
+            return
+        max_records = min(info.get('maxRecordCount') or self.RECORDS_PER_REQUEST, self.RECORDS_PER_REQUEST)
+        yield FormRequest(
+            url=f"{dataset['url']}/query",
+            formdata={'where': dataset.get('where', '1=1'), 'returnIdsOnly': 'true', 'f': 'json'},
+            callback=self.parse_object_ids,
+            meta={'dataset': dataset, 'last_edit_date': last_edit_date, 'max_records': max_records},
+            errback=self.handle_error,
+            dont_filter=True
+        )
+    def parse_object_ids(self, response):
+        dataset = response.meta['dataset']
+        try:
+            data = response.json()
+        except ValueError as e:
+            self.logger.error(f"Object id parse error for {dataset['name']}: {e}")
+            return
+        if 'error' in data:
+            self.logger.error(f"API error for {dataset['name']}: {data['error']}")
+            return
+        object_ids = sorted(data.get('objectIds') or [])
+        id_field = data.get('objectIdFieldName', 'OBJECTID')
+        chunk_size = response.meta['max_records']
+        chunks = [object_ids[i:i + chunk_size] for i in range(0, len(object_ids), chunk_size)]
+        self.dataset_progress[dataset['name']] = {
+            'pending': len(chunks), 'failed': False, 'last_edit_date': response.meta['last_edit_date']}
+        self.logger.info(
+            f"{dataset['name']}: {len(object_ids)} features ({id_field}) in {len(chunks)} chunks")
+        if not chunks:
+            self._complete_chunk(dataset)
+        out_fields = ','.join([dataset['name_field'], dataset['address_field']] + dataset['extra_fields'])
+        for index, chunk in enumerate(chunks):
+            form_data = {
+                'objectIds': ','.join(str(object_id) for object_id in chunk),
+                'outFields': out_fields,
+                'returnGeometry': 'true',
+                'f': 'json'
+            }
+            if self.OUT_SR:
+                form_data['outSR'] = self.OUT_SR
+            yield FormRequest(
+                url=f"{dataset['url']}/query",
+                formdata=form_data,
+                callback=self.parse,
+                meta={'dataset': dataset, 'offset': index * chunk_size, 'chunked': True},
+                errback=self.handle_error,
+                dont_filter=True
+            )
+    def _complete_chunk(self, dataset: Dict[str, Any], failed: bool = False):
+        if not (progress := self.dataset_progress.get(dataset['name'])):
+            return
+        progress['pending'] -= 1
+        progress['failed'] = progress['failed'] or failed
     def parse(self, response):
         dataset, offset = response.meta['dataset'], response.meta['offset']
+        chunked = response.meta.get('chunked', False)
         try:
             data = response.json()
         except ValueError as e:
             self.logger.error(f"JSON parse error for {dataset['name']}: {e}")
+            if chunked:
+                self._complete_chunk(dataset, failed=True)
             return
         if 'error' in data:
             self.logger.error(
                 f"API error for {dataset['name']}: {data['error']}")
+            if chunked:
+                self._complete_chunk(dataset, failed=True)
             return
+        if chunked:
+            self._complete_chunk(dataset)
         if not (features := data.get('features', [])):
             self.logger.info(f"Completed {dataset['name']} at offset {offset}")
             return
         self.logger.info(
             f"Processing {len(features)} features from {dataset['name']} (offset: {offset})")
         items_yielded = 0
-        for feature in features:
+        lngs, lats = self._reproject(*self._collect_coords(features))
+        for feature, lng, lat in zip(features, lngs.tolist(), lats.tolist()):
             self.stats_counter['total'] += 1
-            if item := self._parse_feature(feature, dataset):
+            if item := self._parse_feature(feature, dataset, lng, lat):
                 items_yielded += 1
                 self.stats_counter['yielded'] += 1
                 yield item
         self.logger.info(
             f"Yielded {items_yielded}/{len(features)} from {dataset['name']}")
-        if len(features) >= self.RECORDS_PER_REQUEST:
+        if not chunked and len(features) >= self.RECORDS_PER_REQUEST:
             yield self._create_request(dataset, offset + self.RECORDS_PER_REQUEST)
-    def _parse_feature(self, feature: Dict[str, Any], dataset: Dict[str, Any]) -> Optional[BusinessItem]:
+    def _parse_feature(self, feature: Dict[str, Any], dataset: Dict[str, Any], lng: float, lat: float) -> Optional[BusinessItem]:
         if 'attributes' not in feature or 'geometry' not in feature:
             self.logger.warning(
                 f"Missing required keys in feature: {feature.keys()}")
             return None
-        attrs, geom = feature['attributes'], feature['geometry']
+        attrs = feature['attributes']
         if not (name := self._get_valid_name(attrs.get(dataset['name_field']))):
             self.stats_counter['no_name'] += 1
             return None
-        lng, lat = self._extract_coords(geom)
-        if not (lat and lng):
+        if np.isnan(lat) or np.isnan(lng):
             self.stats_counter['no_coords'] += 1
             self.logger.warning(f"Skipping {name} - no valid coordinates")
             return None
@@ -136,35 +229,54 @@ class NashvilleArcGISSpider(scrapy.Spider):
             return None
         address = str(address).strip()
         return address if address.lower() not in self.INVALID_STRINGS else None
-    def _extract_coords(self, geom: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
-        try:
-            if 'x' in geom and 'y' in geom:
-                return self._transform_coords(float(geom['x']), float(geom['y']))
-            if rings := geom.get('rings'):
-                if ring := rings[0]:
-                    x_coords = [float(p[0]) for p in ring if len(p) >= 2]
-                    y_coords = [float(p[1]) for p in ring if len(p) >= 2]
-                    if x_coords and y_coords:
-                        return self._transform_coords(sum(x_coords) / len(x_coords), sum(y_coords) / len(y_coords))
-            if paths := geom.get('paths'):
-                if path := paths[0]:
-                    mid_idx = len(path) // 2
-                    if mid_idx < len(path) and len(path[mid_idx]) >= 2:
-                        return self._transform_coords(float(path[mid_idx][0]), float(path[mid_idx][1]))
-        except (ValueError, TypeError, IndexError) as e:
-            self.logger.debug(f"Coordinate extraction failed: {e}")
-        return None, None
-
-    def _transform_coords(self, x: float, y: float) -> Tuple[Optional[float], Optional[float]]:
-        try:
-            lng, lat = self.transformer.transform(x, y)
-            if self.VALID_LAT_RANGE[0] <= lat <= self.VALID_LAT_RANGE[1] and self.VALID_LNG_RANGE[0] <= lng <= self.VALID_LNG_RANGE[1]:
-                return lng, lat
-            self.stats_counter['out_of_range'] += 1
-            self.logger.debug(f"Coordinates out of range: {lat}, {lng}")
-        except Exception as e:
-            self.logger.debug(f"Transform failed: {e}")
-        return None, None
+    def _collect_coords(self, features: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.full(len(features), np.nan)
+        y = np.full(len(features), np.nan)
+        ring_points, ring_lengths, ring_owners = [], [], []
+        for i, feature in enumerate(features):
+            geom = feature.get('geometry') or {}
+            try:
+                if 'x' in geom and 'y' in geom:
+                    x[i], y[i] = float(geom['x']), float(geom['y'])
+                elif (rings := geom.get('rings')) and (ring := [p[:2] for p in rings[0] if len(p) >= 2]):
+                    ring_points.extend(ring)
+                    ring_lengths.append(len(ring))
+                    ring_owners.append(i)
+                elif (paths := geom.get('paths')) and (path := paths[0]) and len(mid := path[len(path) // 2]) >= 2:
+                    x[i], y[i] = float(mid[0]), float(mid[1])
+            except (ValueError, TypeError, IndexError) as e:
+                self.logger.debug(f"Coordinate extraction failed: {e}")
+        if ring_points:
+            try:
+                points = np.asarray(ring_points, dtype=float)
+                lengths = np.asarray(ring_lengths)
+                starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+                x[ring_owners] = np.add.reduceat(points[:, 0], starts) / lengths
+                y[ring_owners] = np.add.reduceat(points[:, 1], starts) / lengths
+            except (ValueError, TypeError) as e:
+                self.logger.debug(f"Ring centroid calculation failed: {e}")
+        return x, y
+    def _reproject(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        has_coords = np.isfinite(x) & np.isfinite(y)
+        lng, lat = np.full_like(x, np.nan), np.full_like(y, np.nan)
+        if not has_coords.any():
+            return lng, lat
+        if self.OUT_SR == '4326':
+            lng[has_coords], lat[has_coords] = x[has_coords], y[has_coords]
+        else:
+            try:
+                lng[has_coords], lat[has_coords] = self.transformer.transform(x[has_coords], y[has_coords])
+            except Exception as e:
+                self.logger.debug(f"Transform failed: {e}")
+                return np.full_like(x, np.nan), np.full_like(y, np.nan)
+        in_range = ((lat >= self.VALID_LAT_RANGE[0]) & (lat <= self.VALID_LAT_RANGE[1])
+                    & (lng >= self.VALID_LNG_RANGE[0]) & (lng <= self.VALID_LNG_RANGE[1]))
+        if out_of_range := int((has_coords & ~in_range).sum()):
+            self.stats_counter['out_of_range'] += out_of_range
+            self.logger.debug(f"{out_of_range} coordinates out of range")
+        lng[~in_range] = np.nan
+        lat[~in_range] = np.nan
+        return lng, lat
     def _build_description(self, attrs: Dict[str, Any], dataset: Dict[str, Any]) -> str:
         parts = [dataset['name']]
         for field in dataset['extra_fields']:
@@ -177,8 +289,14 @@ class NashvilleArcGISSpider(scrapy.Spider):
         dataset = failure.request.meta.get('dataset', {})
         self.logger.error(
             f"Request failed for {dataset.get('name', 'Unknown')}: {failure.value}")
+        if failure.request.meta.get('chunked'):
+            self._complete_chunk(dataset, failed=True)
     def closed(self, reason):
         self.logger.info(f"Spider closed: {reason}")
+        if reason == 'finished':
+            for name, progress in self.dataset_progress.items():
+                if progress['pending'] <= 0 and not progress['failed'] and progress['last_edit_date']:
+                    save_state('arcgis', name, {'last_edit_date': progress['last_edit_date']})
         self.logger.info(f"Stats: {self.stats_counter}")
         if self.stats_counter['total'] > 0:
             yield_rate = (
@@ -1,20 +1,21 @@
 import os
-import re
 import hashlib
 from typing import Dict, Any, List
-import pymupdf
 import scrapy
 from scraper.nashville.items import BusinessItem
+from scraper.nashville.pdf_text import extract_pdf_text
+from scraper.nashville import line_classifier
+from scraper.nashville.line_classifier import LineClassifier
 class PDFSpider(scrapy.Spider):
     name = 'pdf'
-    DATE_PATTERNS = [
-        r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s+\d{1,2},?\s+\d{4}',
-        r'\d{1,2}/\d{1,2}/\d{2,4}',
-        r'\d{4}-\d{2}-\d{2}'
-    ]
-    ADDRESS_KEYWORDS = ['street', 'st', 'avenue', 'ave', 'road',
-                        'rd', 'boulevard', 'blvd', 'drive', 'dr', 'nashville']
-    URL_PATTERN = r'https?://[^\s]+'
+    schedulable = False
+    expected_duration = 10
+    quota_cost = 0
+    required_env = []
+    DATE_PATTERNS = line_classifier.DATE_PATTERNS
+    ADDRESS_KEYWORDS = line_classifier.ADDRESS_KEYWORDS
+    URL_PATTERN = line_classifier.URL_PATTERN
+    LINE_CLASSIFIER = LineClassifier(ADDRESS_KEYWORDS, max_name_length=100)
     def __init__(self, pdf_path=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not pdf_path:
@@ -40,10 +41,7 @@ class PDFSpider(scrapy.Spider):
                 yield self._create_item(item_data)
     def _extract_pdf_text(self) -> str:
         try:
-            doc = pymupdf.open(self.pdf_path)
-            text = '\n'.join(page.get_text() for page in doc)
-            doc.close()
-            return text
+            return extract_pdf_text(self.pdf_path)
         except Exception as e:
             self.logger.error(f"PDF extraction failed: {e}")
             return ""
@@ -52,7 +50,7 @@ class PDFSpider(scrapy.Spider):
                  for line in text.split('\n') if len(line.strip()) > 3]
         items = []
         current = {}
-        for line in lines:
+        for line, tag in zip(lines, self.LINE_CLASSIFIER.classify_lines(lines)):
             if self._is_structured_label(line):
                 label, value = self._parse_label_value(line)
                 if label in ['venue', 'location', 'place']:
@@ -72,7 +70,7 @@ class PDFSpider(scrapy.Spider):
                 else:
                     current.setdefault('description', []).append(line)
             else:
-                self._classify_and_add_line(line, current)
+                self._classify_and_add_line(line, current, tag)
         if current.get('name'):
             items.append(current)
         return self._clean_items(items)
@@ -83,14 +81,14 @@ class PDFSpider(scrapy.Spider):
         label = parts[0].strip().lower()
         value = parts[1].strip() if len(parts) > 1 else ''
         return label, value
-    def _classify_and_add_line(self, line: str, current: Dict):
-        if self._matches_pattern(line, self.URL_PATTERN):
+    def _classify_and_add_line(self, line: str, current: Dict, tag: str):
+        if tag == line_classifier.URL:
             current['url'] = line
-        elif self._is_date(line):
+        elif tag == line_classifier.DATE:
             current['event_date'] = line
-        elif self._is_address(line):
+        elif tag == line_classifier.ADDRESS:
             current['venue_address'] = line
-        elif self._looks_like_name(line):
+        elif tag == line_classifier.NAME:
             if current.get('name'):
                 current.setdefault('description', []).append(line)
             else:
@@ -98,16 +96,6 @@ class PDFSpider(scrapy.Spider):
                 current['venue_name'] = line
         else:
             current.setdefault('description', []).append(line)
-    def _is_date(self, text: str) -> bool:
-        return any(re.search(pattern, text.lower()) for pattern in self.DATE_PATTERNS)
-    def _is_address(self, text: str) -> bool:
-        return any(kw in text.lower() for kw in self.ADDRESS_KEYWORDS)
-    def _matches_pattern(self, text: str, pattern: str) -> bool:
-        return bool(re.search(pattern, text))
-    def _looks_like_name(self, text: str) -> bool:
-        if not (5 <= len(text) <= 100):
-            return False
-        return text[0].isupper()
     def _clean_items(self, items: List[Dict]) -> List[Dict]:
         cleaned = []
         for item in items:
@@ -2,10 +2,26 @@ import scrapy
 import json
 import os
 from urllib.parse import urlencode
+from datetime import datetime, timezone, timedelta
 from scraper.nashville.items import BusinessItem
+from scraper.nashville.date_windows import iter_date_windows_between, split_window, split_tail
+from scraper.nashville.crawl_state import plan_window_crawl, finish_window_crawl, record_event
 
 class SeatgeekSpider(scrapy.Spider):
     name = 'seatgeek'
+    schedulable = True
+    expected_duration = 60
+    quota_cost = 60
+    required_env = ['SEATGEEK_CLIENT_ID']
+    PER_PAGE = int(os.getenv('SEATGEEK_PER_PAGE', '100'))
+    MAX_PAGES_PER_WINDOW = 20
+    WINDOW_DAYS = int(os.getenv('SEATGEEK_WINDOW_DAYS', '7'))
+    HORIZON_DAYS = int(os.getenv('SEATGEEK_HORIZON_DAYS', '180'))
+    MIN_WINDOW = timedelta(hours=6)
+    DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+    custom_settings = {
+        'CONCURRENT_REQUESTS_PER_DOMAIN': int(os.getenv('SEATGEEK_CONCURRENT', '4')),
+    }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -13,22 +29,37 @@ class SeatgeekSpider(scrapy.Spider):
         if not self.client_id:
             raise ValueError("SEATGEEK_CLIENT_ID not found in environment variables")
         self.base_url = 'https://api.seatgeek.com/2/events'
+        self.seen_event_ids = set()
 
     def start_requests(self):
+        now_utc = datetime.now(timezone.utc).replace(microsecond=0)
+        force_full = str(getattr(self, 'full', '')).lower() in ('1', 'true', 'yes')
+        self.crawl_plan = plan_window_crawl(self.name, now_utc, self.HORIZON_DAYS, force_full)
+        self.logger.info(f"Starting {self.crawl_plan['mode']} crawl over {self.crawl_plan['ranges']}")
+        for range_start, range_end in self.crawl_plan['ranges']:
+            for window_start, window_end in iter_date_windows_between(range_start, range_end, self.WINDOW_DAYS):
+                yield self._build_request(window_start, window_end, 1)
+        # Open-ended tail so events announced beyond the horizon are not dropped.
+        yield self._build_request(self.crawl_plan['horizon_end'], None, 1)
+
+    def _build_request(self, window_start, window_end, page):
         params = {
             'client_id': self.client_id,
             'venue.city': 'Nashville',
             'venue.state': 'TN',
-            'per_page': 50,
-            'page': 1
+            'datetime_utc.gte': window_start.strftime(self.DATETIME_FORMAT),
+            'sort': 'datetime_utc.asc',
+            'per_page': self.PER_PAGE,
+            'page': page
         }
-        url = f"{self.base_url}?{urlencode(params)}"
-        self.logger.info(f"Fetching events from: {url}")
-        yield scrapy.Request(
-            url=url,
+        if window_end is not None:
+            params['datetime_utc.lt'] = window_end.strftime(self.DATETIME_FORMAT)
+        return scrapy.Request(
+            url=f"{self.base_url}?{urlencode(params)}",
             callback=self.parse,
             errback=self.handle_error,
-            meta={'page': 1, 'params': params}
+            dont_filter=True,
+            meta={'window': (window_start, window_end), 'page': page}
         )
 
     def parse(self, response):
@@ -42,28 +73,33 @@ class SeatgeekSpider(scrapy.Spider):
             self.logger.warning("No events found in response")
             return
 
-        events = data.get('events', [])
-        for event in events:
-            yield self.parse_event(event)
+        for event in data.get('events', []):
+            if event.get('id') in self.seen_event_ids:
+                continue
+            self.seen_event_ids.add(event.get('id'))
+            item = self.parse_event(event)
+            record_event(self.crawl_plan, event.get('id'), item, response.meta['window'][0])
+            yield item
 
+        if response.meta['page'] != 1:
+            return
+        window_start, window_end = response.meta['window']
         meta = data.get('meta', {})
         total = meta.get('total', 0)
-        per_page = meta.get('per_page', 50)
-        current_page = response.meta['page']
+        per_page = meta.get('per_page', self.PER_PAGE)
         total_pages = (total + per_page - 1) // per_page
-
-        if current_page < total_pages and current_page < 10: # Limit to first 10 pages
-            next_page = current_page + 1
-            params = response.meta['params']
-            params['page'] = next_page
-            next_url = f"{self.base_url}?{urlencode(params)}"
-            self.logger.info(f"Fetching page {next_page} of {total_pages}")
-            yield scrapy.Request(
-                url=next_url,
-                callback=self.parse,
-                errback=self.handle_error,
-                meta={'page': next_page, 'params': params}
-            )
+        if total_pages > self.MAX_PAGES_PER_WINDOW and (window_end is None or window_end - window_start > self.MIN_WINDOW):
+            self.logger.info(f"{total} events between {window_start} and {window_end or 'open end'}, splitting window")
+            halves = (split_window(window_start, window_end) if window_end
+                      else split_tail(window_start, timedelta(days=self.HORIZON_DAYS)))
+            for half_start, half_end in halves:
+                yield self._build_request(half_start, half_end, 1)
+            return
+        if total_pages > 1:
+            window_label = f"{window_end:%Y-%m-%d}" if window_end else 'open end'
+            self.logger.info(f"Fetching pages 2-{total_pages} for {window_start:%Y-%m-%d} to {window_label}")
+        for page in range(2, min(total_pages, self.MAX_PAGES_PER_WINDOW) + 1):
+            yield self._build_request(window_start, window_end, page)
 
     def parse_event(self, event):
         item = BusinessItem()
@@ -87,4 +123,8 @@ class SeatgeekSpider(scrapy.Spider):
         return item
 
     def handle_error(self, failure):
-        self.logger.error(f"Request failed: {failure.value}")
\ No newline at end of file
+        self.logger.error(f"Request failed: {failure.value}")
+
+    def closed(self, reason):
+        if getattr(self, 'crawl_plan', None):
+            finish_window_crawl(self, self.crawl_plan, reason)
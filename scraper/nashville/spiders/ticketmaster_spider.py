@@ -2,27 +2,59 @@ import scrapy
 import os
 from urllib.parse import urlencode
 from scraper.nashville.items import BusinessItem
-from datetime import datetime, timezone
+from scraper.nashville.date_windows import iter_date_windows_between, split_window, split_tail, format_api_datetime
+from scraper.nashville.crawl_state import plan_window_crawl, finish_window_crawl, record_event
+from datetime import datetime, timezone, timedelta
 
 class TicketmasterSpider(scrapy.Spider):
     name = 'ticketmaster'
+    schedulable = True
+    expected_duration = 60
+    quota_cost = 150
+    required_env = ['TICKETMASTER_API_KEY']
     base_url = 'https://app.ticketmaster.com/discovery/v2/events.json'
+    PAGE_SIZE = 200
+    DEEP_PAGING_LIMIT = 1000
+    WINDOW_DAYS = int(os.getenv('TICKETMASTER_WINDOW_DAYS', '7'))
+    HORIZON_DAYS = int(os.getenv('TICKETMASTER_HORIZON_DAYS', '180'))
+    MIN_WINDOW = timedelta(hours=6)
+    custom_settings = {
+        'CONCURRENT_REQUESTS_PER_DOMAIN': int(os.getenv('TICKETMASTER_CONCURRENT', '4')),
+        'DOWNLOAD_DELAY': float(os.getenv('TICKETMASTER_DELAY', '0')),
+    }
     def start_requests(self):
-        api_key = os.getenv('TICKETMASTER_API_KEY')
-        if not api_key:
+        self.api_key = os.getenv('TICKETMASTER_API_KEY')
+        if not self.api_key:
             self.logger.error("TICKETMASTER_API_KEY not found in environment variables.")
             return
-        now_utc = datetime.now(timezone.utc)
-        start_datetime = now_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.seen_event_ids = set()
+        now_utc = datetime.now(timezone.utc).replace(microsecond=0)
+        force_full = str(getattr(self, 'full', '')).lower() in ('1', 'true', 'yes')
+        self.crawl_plan = plan_window_crawl(self.name, now_utc, self.HORIZON_DAYS, force_full)
+        self.logger.info(f"Starting {self.crawl_plan['mode']} crawl over {self.crawl_plan['ranges']}")
+        for range_start, range_end in self.crawl_plan['ranges']:
+            for window_start, window_end in iter_date_windows_between(range_start, range_end, self.WINDOW_DAYS):
+                yield self._build_request(window_start, window_end, 0)
+        # Open-ended tail so events announced beyond the horizon are not dropped.
+        yield self._build_request(self.crawl_plan['horizon_end'], None, 0)
+    def _build_request(self, window_start, window_end, page):
         params = {
-            'apikey': api_key,
+            'apikey': self.api_key,
             'dmaId': '343',
-            'size': 200,
+            'size': self.PAGE_SIZE,
             'sort': 'date,asc',
-            'startDateTime': start_datetime
+            'startDateTime': format_api_datetime(window_start),
+            'page': page
         }
-        url = f"{self.base_url}?{urlencode(params)}"
-        yield scrapy.Request(url=url, callback=self.parse, errback=self.handle_error, meta={'params': params})
+        if window_end is not None:
+            params['endDateTime'] = format_api_datetime(window_end)
+        return scrapy.Request(
+            url=f"{self.base_url}?{urlencode(params)}",
+            callback=self.parse,
+            errback=self.handle_error,
+            dont_filter=True,
+            meta={'window': (window_start, window_end), 'page': page}
+        )
     def parse(self, response):
         if response.status != 200:
             self.logger.error(f"Ticketmaster API request failed with status {response.status}")
@@ -30,23 +62,30 @@ class TicketmasterSpider(scrapy.Spider):
         data = response.json()
         if '_embedded' in data and 'events' in data['_embedded']:
             for event in data['_embedded']['events']:
+                if event.get('id') in self.seen_event_ids:
+                    continue
+                self.seen_event_ids.add(event.get('id'))
                 item = self.parse_event(event)
                 if item:
+                    record_event(self.crawl_plan, event.get('id'), item, response.meta['window'][0])
                     yield item
+        if response.meta['page'] != 0:
+            return
+        window_start, window_end = response.meta['window']
         page_info = data.get('page', {})
-        current_page = page_info.get('number', 0)
         total_pages = page_info.get('totalPages', 0)
-        if current_page < total_pages - 1 and current_page < 5:
-            next_page = current_page + 1
-            params = response.meta['params']
-            params['page'] = next_page
-            next_url = f"{self.base_url}?{urlencode(params)}"
-            yield scrapy.Request(
-                url=next_url,
-                callback=self.parse,
-                errback=self.handle_error,
-                meta={'params': params}
-            )
+        total_elements = page_info.get('totalElements', 0)
+        if total_elements > self.DEEP_PAGING_LIMIT and (window_end is None or window_end - window_start > self.MIN_WINDOW):
+            self.logger.info(
+                f"{total_elements} events between {window_start} and {window_end or 'open end'}, splitting window")
+            halves = (split_window(window_start, window_end) if window_end
+                      else split_tail(window_start, timedelta(days=self.HORIZON_DAYS)))
+            for half_start, half_end in halves:
+                yield self._build_request(half_start, half_end, 0)
+            return
+        reachable_pages = min(total_pages, self.DEEP_PAGING_LIMIT // self.PAGE_SIZE)
+        for page in range(1, reachable_pages):
+            yield self._build_request(window_start, window_end, page)
     def parse_event(self, event):
         url = event.get('url')
         if not url or not url.startswith('http'):
@@ -81,4 +120,7 @@ class TicketmasterSpider(scrapy.Spider):
             self.logger.debug(f"Skipping event in another city: {item['name']} in {item.get('venue_city')}")
             return None
     def handle_error(self, failure):
-        self.logger.error(f"Ticketmaster request failed: {failure.value}")
\ No newline at end of file
+        self.logger.error(f"Ticketmaster request failed: {failure.value}")
+    def closed(self, reason):
+        if getattr(self, 'crawl_plan', None):
+            finish_window_crawl(self, self.crawl_plan, reason)
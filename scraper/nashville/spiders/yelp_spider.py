@@ -1,18 +1,29 @@
 import os
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 import scrapy
-import requests
 from scraper.nashville.items import BusinessItem
 
 load_dotenv()
 
 class YelpSpider(scrapy.Spider):
     name = 'yelp'
+    schedulable = True
+    expected_duration = 60
+    quota_cost = 120
+    required_env = ['YELP_API_KEY']
     CATEGORIES = ['musicvenues', 'venues', 'bars',
                   'nightlife', 'restaurants', 'arts']
+    PAGE_LIMIT = 50
+    MAX_RESULTS_PER_QUERY = 1000
+    # 429s are retried by RetryMiddleware. ApiRateLimitMiddleware sits closer to the downloader and
+    # waits until the shared Yelp bucket is paused for Retry-After (and its rate halved) before
+    # passing the response on, so the retry queues behind the pause. If Redis is unreachable the
+    # pause is skipped and only the slot concurrency is halved.
     custom_settings = {
-        'DOWNLOADER_MIDDLEWARES': {},
-        'DEFAULT_REQUEST_HEADERS': None
+        'CONCURRENT_REQUESTS_PER_DOMAIN': int(os.getenv('YELP_CONCURRENT', '4')),
+        'RETRY_HTTP_CODES': [429, 500, 502, 503, 504, 522, 524, 408],
+        'RETRY_TIMES': 5,
     }
 
     def __init__(self, *args, **kwargs):
@@ -27,39 +38,53 @@ class YelpSpider(scrapy.Spider):
             'Accept-Language': 'en_US',
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36'
         }
+        self.seen_business_ids = set()
 
     def start_requests(self):
+        self.logger.info(f"Starting venue search for categories: {self.CATEGORIES}")
+        for category in self.CATEGORIES:
+            yield self._build_request(category, 0)
+
+    def _build_request(self, category, offset):
         params = {
             'location': 'Nashville, TN',
-            'limit': 50,
-            'categories': ','.join(self.CATEGORIES),
+            'limit': self.PAGE_LIMIT,
+            'categories': category,
             'sort_by': 'rating',
             'radius': 40000,
-            'offset': 0
+            'offset': offset
         }
-        self.logger.info(f"Starting venue search with parameters: {params}")
-        while True:
-            response = requests.get(self.base_url, headers=self.headers, params=params)
-            if response.status_code != 200:
-                self.logger.error(f"Request failed with status {response.status_code}")
-                break
-            try:
-                data = response.json()
-                businesses = data.get('businesses', [])
-                self.logger.info(f"Found {len(businesses)} venues (offset: {params['offset']})")
-                for business in businesses:
-                    yield self.parse_business(business)
-                
-                total = data.get('total', 0)
-                next_offset = params['offset'] + params['limit']
-                
-                if next_offset >= min(total, 1000):
-                    break
-                params['offset'] = next_offset
-                self.logger.info(f"Fetching next page with offset {next_offset}/{min(total, 1000)}")
-            except Exception as e:
-                self.logger.error(f"Failed to process response: {e}")
-                break
+        return scrapy.Request(
+            url=f"{self.base_url}?{urlencode(params)}",
+            headers=self.headers,
+            callback=self.parse,
+            errback=self.handle_error,
+            dont_filter=True,
+            meta={'category': category, 'offset': offset}
+        )
+
+    def parse(self, response):
+        category = response.meta['category']
+        offset = response.meta['offset']
+        try:
+            data = response.json()
+        except ValueError as e:
+            self.logger.error(f"Failed to process response for {category} offset {offset}: {e}")
+            return
+        businesses = data.get('businesses', [])
+        self.logger.info(f"Found {len(businesses)} venues for {category} (offset: {offset})")
+        for business in businesses:
+            business_id = business.get('id')
+            if business_id in self.seen_business_ids:
+                continue
+            self.seen_business_ids.add(business_id)
+            yield self.parse_business(business)
+        if offset == 0:
+            total = min(data.get('total', 0), self.MAX_RESULTS_PER_QUERY)
+            if data.get('total', 0) > self.MAX_RESULTS_PER_QUERY:
+                self.logger.warning(f"{category} has {data['total']} results, only the first {self.MAX_RESULTS_PER_QUERY} are reachable")
+            for next_offset in range(self.PAGE_LIMIT, total, self.PAGE_LIMIT):
+                yield self._build_request(category, next_offset)
 
     def parse_business(self, business):
         item = BusinessItem()
@@ -77,16 +102,19 @@ class YelpSpider(scrapy.Spider):
             desc_parts.append(f"Categories: {', '.join(cat['title'] for cat in business['categories'])}")
         if business.get('display_phone'):
             desc_parts.append(f"Phone: {business['display_phone']}")
-        
+
         location = business.get('location', {})
         if location.get('display_address'):
             item['venue_address'] = ', '.join(location['display_address'])
-        
+
         item['neighborhood'] = location.get('city')
         item['description'] = ' | '.join(desc_parts)
         return item
 
     def handle_error(self, failure):
-        response = failure.value.response
+        response = getattr(failure.value, 'response', None)
+        if response is None:
+            self.logger.error(f"Request failed: {failure.value}")
+            return
         self.logger.error(f"HttpError on {response.url}, Status: {response.status}")
-        self.logger.error(f"Response Body: {response.text}")
\ No newline at end of file
+        self.logger.error(f"Response Body: {response.text}")
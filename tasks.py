@@ -3,14 +3,76 @@ import os
 import sys
 import subprocess
 import psycopg2
+from psycopg2.extras import execute_values
 from celery import Celery, chain
 from celery.schedules import crontab
-import pymupdf
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_failure, worker_process_init
+from kombu import Queue
+import time
 import json
 import redis
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scraper.nashville.document_extractor import iter_document_item_batches
+from scraper.nashville.pdf_text import extract_pdf_pages
+from scraper.nashville.registry import get_spider_registry, get_schedulable_spiders, plan_spider_run
+from scraper.nashville.middlewares import remaining_quotas
+from scraper.nashville.settings import API_RATE_LIMITS
+from uploads import set_upload_status
+from metrics import QUEUES, PRIORITY_STEPS, PRIORITY_SEP, record_queue_wait, incr, observe
+INTERACTIVE_PRIORITY = 0
+SCHEDULED_PRIORITY = 9
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
+def upload_rows_pattern(content_hash):
+    """LIKE pattern matching the raw_data rows of one upload, tagged with its upload_hash."""
+    return f'%"upload_hash": "{content_hash}"%'
+def insert_upload_batches(source_spider, batches, content_hash=None, on_batch=None):
+    """
+    Insert every batch of an upload in one transaction, so a failure part way through leaves
+    no rows behind. Rows left by an earlier attempt at the same upload are replaced, so a
+    retry never duplicates them.
+    Args:
+        source_spider: source_spider value for the rows
+        batches: Iterable of item lists
+        content_hash: Upload hash stored on every row as upload_hash
+        on_batch: Optional callable taking (batch, rows inserted so far) after each batch
+    Returns:
+        Number of rows inserted
+    """
+    conn = get_db_connection()
+    inserted = 0
+    try:
+        with conn.cursor() as cursor:
+            if content_hash:
+                cursor.execute("DELETE FROM raw_data WHERE raw_json LIKE %s", (upload_rows_pattern(content_hash),))
+            for batch in batches:
+                if content_hash:
+                    batch = [dict(item, upload_hash=content_hash) for item in batch]
+                execute_values(
+                    cursor,
+                    "INSERT INTO raw_data (source_spider, raw_json) VALUES %s",
+                    [(source_spider, json.dumps(item)) for item in batch],
+                    page_size=500
+                )
+                inserted += len(batch)
+                if on_batch:
+                    on_batch(batch, inserted)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return inserted
+def count_upload_rows(content_hash):
+    """Raw rows of an upload still waiting in raw_data (the transform deletes the rows it loads)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM raw_data WHERE raw_json LIKE %s", (upload_rows_pattern(content_hash),))
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
 def get_redis_connection():
     try:
         r = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
@@ -22,7 +84,55 @@ def get_redis_connection():
         return None
 celery_app = Celery('tasks', broker='redis://redis:6379/0',
                     backend='redis://redis:6379/0')
-@celery_app.task
+celery_app.conf.task_queues = [Queue(name) for name in QUEUES]
+celery_app.conf.task_default_queue = 'celery'
+celery_app.conf.task_routes = {
+    'tasks.process_document_task': {'queue': 'ingest'},
+    'tasks.run_all_spiders_task': {'queue': 'crawl'},
+    'tasks.scrape_and_transform_chain': {'queue': 'crawl'},
+    'tasks.transform_data_task': {'queue': 'transform'},
+}
+celery_app.conf.broker_transport_options = {
+    'priority_steps': PRIORITY_STEPS,
+    'sep': PRIORITY_SEP,
+    'queue_order_strategy': 'priority',
+}
+celery_app.conf.task_default_priority = SCHEDULED_PRIORITY
+celery_app.conf.worker_prefetch_multiplier = 1
+_task_start_times = {}
+@worker_process_init.connect
+def load_spider_registry(**kwargs):
+    try:
+        print(f"Loaded spider registry: {sorted(get_spider_registry())}")
+    except Exception as e:
+        print(f"Error loading spider registry: {e}", file=sys.stderr)
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+@task_prerun.connect
+def measure_task_start(task_id=None, task=None, **kwargs):
+    if task_id:
+        _task_start_times[task_id] = time.monotonic()
+    request = getattr(task, 'request', None)
+    if request is None:
+        return
+    published_at = getattr(request, 'published_at', None) or (getattr(request, 'headers', None) or {}).get('published_at')
+    queue = (getattr(request, 'delivery_info', None) or {}).get('routing_key') or 'celery'
+    if published_at:
+        record_queue_wait(queue, time.time() - float(published_at))
+@task_postrun.connect
+def measure_task_run(task_id=None, task=None, state=None, **kwargs):
+    started = _task_start_times.pop(task_id, None)
+    task_name = getattr(task, 'name', 'unknown')
+    incr('etl_tasks_total', {'task': task_name, 'state': state or 'UNKNOWN'})
+    if started is not None:
+        observe('etl_task_duration_seconds', {'task': task_name}, time.monotonic() - started)
+@task_failure.connect
+def count_task_failure(sender=None, exception=None, **kwargs):
+    incr('etl_task_errors_total', {'task': getattr(sender, 'name', 'unknown'),
+                                   'exception': type(exception).__name__})
+@celery_app.task(queue='crawl')
 def run_all_spiders_task():
     print("Scrape and Cleanup")
     
@@ -37,20 +147,24 @@ def run_all_spiders_task():
     env = os.environ.copy()
     env['PYTHONPATH'] = f'/app:{os.environ.get("PYTHONPATH", "")}'
     try:
-        result = subprocess.run([scrapy_executable, "list"], cwd=project_dir,
-                                capture_output=True, text=True, check=True, env=env)
-        spider_names = result.stdout.strip().split('\n')
-        print(f"Found spiders: {spider_names}")
-    except subprocess.CalledProcessError as e:
-        print("Could not find spiders.")
-        print(f"STDERR: {e.stderr}")
-        raise e
+        spiders_to_run, skipped_spiders = get_schedulable_spiders()
     except Exception as e:
         print(
-            f"An unexpected error occurred while trying to list spiders: {e}")
-        raise e        
-    EXCLUDE_SPIDERS = ['document', 'pdf', 'transform_data']     
-    spiders_to_run = [name for name in spider_names if name and name not in EXCLUDE_SPIDERS]     
+            f"An unexpected error occurred while loading the spider registry: {e}")
+        raise e
+    for spider_name, missing_keys in skipped_spiders.items():
+        print(f"Skipping spider '{spider_name}': missing {', '.join(missing_keys)}")
+        incr('scrapy_spider_runs_total', {'spider': spider_name, 'reason': 'skipped_missing_env'})
+    quota_remaining = {}
+    if redis_client:
+        try:
+            quota_remaining = remaining_quotas(redis_client, API_RATE_LIMITS)
+        except Exception as e:
+            print(f"Error reading API quotas in run_all_spiders_task: {e}", file=sys.stderr)
+    spiders_to_run, over_quota = plan_spider_run(spiders_to_run, quota_remaining)
+    for spider_name, (quota_cost, remaining) in over_quota.items():
+        print(f"Skipping spider '{spider_name}': needs {quota_cost} requests, {remaining} left of today's quota")
+        incr('scrapy_spider_runs_total', {'spider': spider_name, 'reason': 'skipped_quota'})
     print(f"Spiders explicitly scheduled to run: {spiders_to_run}")
     for spider_name in spiders_to_run:
         print(f"running spider: {spider_name}")
@@ -58,14 +172,22 @@ def run_all_spiders_task():
             subprocess.run([scrapy_executable, "crawl", spider_name],
                            cwd=project_dir, check=True, env=env)
         except Exception as e:
-            print(f"--- Spider '{spider_name}' failed with an error: {e} ---")             
+            print(f"--- Spider '{spider_name}' failed with an error: {e} ---")
+            incr('scrapy_spider_runs_total', {'spider': spider_name, 'reason': 'process_error'})             
     print(" scraping commands issued.")
     return "All spiders have finished."
 @celery_app.task(queue='transform')
-def transform_data_task(previous_task_result):
+def transform_data_task(previous_task_result, content_hash=None, items=None):
     print(f"Transformation task starting")
-    run_transformations()
+    mark_upload(content_hash, 'processing', stage='transform')
+    try:
+        run_transformations()
+    except Exception as e:
+        mark_upload(content_hash, 'failed', message=str(e))
+        raise
     print("all done transforming.")    
+    if content_hash:
+        finish_upload(content_hash, items)
     redis_client = get_redis_connection()
     if redis_client:
         try:
@@ -76,18 +198,37 @@ def transform_data_task(previous_task_result):
     return "Transformation complete."
 @celery_app.task(name='tasks.scrape_and_transform_chain')
 def scrape_and_transform_chain():
-    workflow = chain(run_all_spiders_task.s(),
-                     transform_data_task.s().set(queue='transform'))
+    workflow = chain(run_all_spiders_task.s().set(queue='crawl', priority=SCHEDULED_PRIORITY),
+                     transform_data_task.s().set(queue='transform', priority=SCHEDULED_PRIORITY))
     workflow.apply_async()
 celery_app.conf.beat_schedule = {'run-full-etl-every-3-hours':
                                  {'task': 'tasks.scrape_and_transform_chain', 'schedule':
                                   crontab(minute=0, hour='*/3'), 'args': ()}}
 celery_app.conf.timezone = 'UTC'
-@celery_app.task
-def process_document_task(filepath, file_extension):
+def mark_upload(content_hash, status, **fields):
+    if not content_hash:
+        return
+    set_upload_status(get_redis_connection(), content_hash, status, **fields)
+def finish_upload(content_hash, items):
+    """
+    Settle an upload after its transform ran: failed if none of its `items` raw rows were
+    transformed, complete otherwise, recording how many rows were left in raw_data.
+    """
+    try:
+        remaining = count_upload_rows(content_hash)
+    except Exception as e:
+        mark_upload(content_hash, 'failed', message=f"Could not check transformed rows: {e}")
+        return
+    if items and remaining >= items:
+        mark_upload(content_hash, 'failed', message=f"None of {items} raw rows were transformed")
+    else:
+        mark_upload(content_hash, 'complete', stage='done', untransformed=remaining)
+@celery_app.task(priority=INTERACTIVE_PRIORITY)
+def process_document_task(filepath, file_extension, content_hash=None, original_filename=None):
     print(f" processing task received")
     print(f"Filepath: {filepath}")
     print(f"File type: {file_extension}")
+    mark_upload(content_hash, 'processing', stage='ingest')
     raw_data_payload = {
         "source_spider": f"manual_upload_{file_extension}",
         "raw_json": None
@@ -95,74 +236,55 @@ def process_document_task(filepath, file_extension):
     if file_extension == 'pdf':
         print("Processing PDF...")
         try:
-            doc = pymupdf.open(filepath)
-            full_text = ""
-            for page in doc:
-                full_text += page.get_text()
-            doc.close()
-
+            pages = extract_pdf_pages(filepath)
             raw_data_payload["raw_json"] = {
-                "text": full_text,
-                "original_filepath": filepath
+                "pages": pages,
+                "original_filepath": filepath,
+                "original_filename": original_filename or os.path.basename(filepath),
+                "upload_hash": content_hash
             }
-            print(f"Extracted {len(full_text)} characters from PDF.")
+            print(f"Extracted {sum(map(len, pages))} characters from {len(pages)} PDF pages.")
         except Exception as e:
             print(f"Error processing PDF {filepath}: {e}")
+            mark_upload(content_hash, 'failed', message=str(e))
             return f"PDF processing failed for {filepath}"
     elif file_extension in ['csv', 'json', 'xlsx', 'xls', 'docx']:
-        print(f"Processing {file_extension} document with document spider...")
+        print(f"Processing {file_extension} document in-process...")
         try:
-            project_dir = '/app/scraper'
-            scrapy_executable = "scrapy"
-            env = os.environ.copy()
-            env['PYTHONPATH'] = '/app'
-            result = subprocess.run(
-                [scrapy_executable, "crawl", "document",
-                 "-a", f"file_path={filepath}"],
-                cwd=project_dir,
-                capture_output=True,
-                text=True,
-                env=env
-            )
-            if result.returncode == 0:
-                print(f"Document spider successfully processed {filepath}")
-                print(f"Spider output: {result.stdout}")
-                print(
-                    f"Now doing transformation task for {filepath} ")
-                transform_data_task.apply_async(
-                    args=[f"document_{file_extension}"], queue='transform')
-            else:
-                print(f"Document spider failed for {filepath}")
-                print(f"Error: {result.stderr}")
-                return f"Document processing failed for {filepath}"
+            def on_batch(batch, inserted):
+                mark_upload(content_hash, 'processing', items=inserted)
+                print(f"Inserted {len(batch)} document items for {filepath} ({inserted} so far, uncommitted)")
+            inserted = insert_upload_batches('document', iter_document_item_batches(filepath), content_hash, on_batch)
+            incr('etl_items_out_total', {'stage': 'ingest', 'source': file_extension}, inserted)
+            if not inserted:
+                print(f"No valid items extracted from {filepath}")
+            print(
+                f"Now doing transformation task for {filepath} ")
+            transform_data_task.apply_async(
+                args=[f"document_{file_extension}"], kwargs={'content_hash': content_hash, 'items': inserted},
+                queue='transform', priority=INTERACTIVE_PRIORITY)
         except Exception as e:
             print(f"ERROR processing document {filepath}: {e}")
+            mark_upload(content_hash, 'failed', message=str(e))
             return f"Document processing failed for {filepath}"
     else:
         print(f"Unsupported file type: {file_extension}")
+        mark_upload(content_hash, 'failed', message=f"Unsupported file type: {file_extension}")
         return f"Unsupported file type: {file_extension}"
     if raw_data_payload["raw_json"]:
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            insert_query = """
-            INSERT INTO raw_data (source_spider, raw_json)
-            VALUES (%s, %s)
-            """
-            cursor.execute(insert_query, (
-                raw_data_payload["source_spider"],
-                json.dumps(raw_data_payload["raw_json"])
-            ))
-            conn.commit()
-            cursor.close()
-            conn.close()
+            insert_upload_batches(raw_data_payload["source_spider"], [[raw_data_payload["raw_json"]]], content_hash)
             print(
                 f" inserted raw data for {filepath} into database.")
+            mark_upload(content_hash, 'processing', items=1)
+            incr('etl_items_out_total', {'stage': 'ingest', 'source': file_extension})
             print(
                 f"running transformation task for {filepath}")
             transform_data_task.apply_async(
-                args=[raw_data_payload["source_spider"]], queue='transform')
+                args=[raw_data_payload["source_spider"]], kwargs={'content_hash': content_hash, 'items': 1},
+                queue='transform', priority=INTERACTIVE_PRIORITY)
         except Exception as e:
             print(f"insertion failed for {filepath}: {e}")
+            mark_upload(content_hash, 'failed', message=str(e))
             return f"insertion failed for {filepath}"
     return f"processing finished for {filepath}"
\ No newline at end of file
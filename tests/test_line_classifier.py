@@ -0,0 +1,61 @@
+import json
+import textwrap
+from collections import Counter
+from pathlib import Path
+import pytest
+from scraper.nashville.line_classifier import ADDRESS_KEYWORDS, DATE_RE, LineClassifier
+FIXTURE = Path(__file__).resolve().parent.parent / 'nashville_com_output.json'
+# Same settings as PDFSpider.LINE_CLASSIFIER
+classifier = LineClassifier(ADDRESS_KEYWORDS, max_name_length=100)
+def load_fixture():
+    with open(FIXTURE) as f:
+        return json.load(f)
+def fixture_description_lines():
+    """Description text of the fixture wrapped like PDF lines, as in benchmarks.load_fixture_lines."""
+    return [line for record in load_fixture() for paragraph in (record.get('description') or '').split('\n')
+            for line in textwrap.wrap(paragraph.strip(), 70) if len(line) > 3]
+@pytest.mark.parametrize('line, tag', [
+    ('https://www.nashville.com/event/harvest-nights/', 'url'),
+    ('Tickets at https://example.com/2025-03-14', 'url'),
+    ('Oct 2, 2025, 5:00pm to 9:00pm', 'date'),
+    ('10/31/2025', 'date'),
+    ('2025-12-31 Midnight countdown', 'date'),
+    ('2025-03-14T19:00', 'date'),
+    ('Doors 2025-03-14T19:00:00-05:00', 'date'),
+    ('starts 2025-03-14t19:00z', 'date'),
+    ('1402 Clinton St', 'address'),
+    ('200 Broadway Ave.', 'address'),
+    ('Music City Center, Nashville, TN', 'address'),
+    ('Festival of Lights', 'name'),
+    ('Strawberry Festival', 'name'),
+    ('Best streets to stroll', 'name'),
+    ('free admission for kids', 'description'),
+    ('Hi', 'description'),
+])
+def test_classify(line, tag):
+    assert classifier.classify(line) == tag
+@pytest.mark.parametrize('text', ['2025-03-14T19:00', 'Mar 14, 2025', '3/14/25 at 7pm', 'on 2025-03-14.'])
+def test_date_re_matches_iso_datetimes_and_dates(text):
+    assert DATE_RE.search(text)
+def test_fixture_urls_and_addresses():
+    records = load_fixture()
+    assert classifier.classify_lines([r['url'].strip() for r in records]) == ['url'] * len(records)
+    addresses = [r['venue_address'].strip() for r in records]
+    # '501 Broadway' and '3777 Nolensville Pk' carry no address keyword.
+    assert [address for address, tag in zip(addresses, classifier.classify_lines(addresses))
+            if tag != 'address'] == ['501 Broadway', '3777 Nolensville Pk']
+def test_fixture_description_lines():
+    lines = fixture_description_lines()
+    tags = classifier.classify_lines(lines)
+    assert Counter(tags) == {'name': 28, 'description': 24, 'date': 6, 'address': 4}
+    assert [line for line, tag in zip(lines, tags) if tag == 'date'] == [
+        'Oct 2, 2025, 5:00pm to 9:00pm Timezone: CDT',
+        'Oct 9, 2025, 5:00pm to 9:00pm Timezone: CDT',
+        'Oct 16, 2025, 5:00pm to 9:00pm Timezone: CDT',
+        'Oct 23, 2025, 5:00pm to 9:00pm Timezone: CDT',
+        'Oct 30, 2025, 5:00pm to 9:00pm Timezone: CDT',
+        'This event runs from Sep 18, 2025 to Oct 30, 2025 and happens every:',
+    ]
+def test_classify_lines_matches_classify():
+    lines = fixture_description_lines() + ['multi\nline 2025-01-01', 'İstanbul Ave', '']
+    assert classifier.classify_lines(lines) == [classifier.classify(line) for line in lines]
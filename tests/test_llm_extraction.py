@@ -0,0 +1,105 @@
+import re
+import pytest
+from llm_client import LLMClient
+from llm_extraction import FakeModel, chunk_pages, extract_events, merge_events
+SCHEMA = {"type": "ARRAY"}
+def build_prompt(chunk, chunk_count):
+    return chunk['text']
+def listing(name, date):
+    return f"EVENT {name} | {date}"
+def events_in(prompt):
+    """FakeModel responder answering with every listing line in the prompt."""
+    return [{'name': name, 'event_date': date} for name, date in re.findall(r'EVENT (.+?) \| (.+)', prompt)]
+def test_chunk_pages_keeps_pages_whole_and_numbered():
+    pages = ['page one\n' * 5, '', '   ', 'page four\n' * 5, 'page five\n' * 5]
+    chunks = chunk_pages(pages, max_chars=60, overlap_chars=0)
+    assert [(c['first_page'], c['last_page']) for c in chunks] == [(1, 1), (4, 4), (5, 5)]
+    assert [c['text'] for c in chunks] == [pages[0], pages[3], pages[4]]
+def test_chunk_pages_groups_small_pages_up_to_max_chars():
+    pages = ['a' * 30, 'b' * 30, 'c' * 30, 'd' * 30]
+    chunks = chunk_pages(pages, max_chars=70, overlap_chars=0)
+    assert [(c['first_page'], c['last_page']) for c in chunks] == [(1, 2), (3, 4)]
+    assert chunks[0]['text'] == 'a' * 30 + '\n' + 'b' * 30
+def test_chunk_pages_overlap_repeats_previous_tail():
+    pages = ['\n'.join(f'p{page} line {n}' for n in range(10)) for page in range(1, 5)]
+    chunks = chunk_pages(pages, max_chars=len(pages[0]) + 10, overlap_chars=25)
+    assert len(chunks) == 4
+    for previous, chunk in zip(chunks, chunks[1:]):
+        tail = chunk['text'].split('\n')[:2]
+        # The overlap starts at a line boundary of the previous chunk's last page.
+        assert previous['text'].endswith('\n'.join(tail))
+        assert chunk['first_page'] == previous['last_page']
+def test_chunk_pages_splits_oversized_page_at_lines():
+    page = '\n'.join(f'line {n:03d}' for n in range(100))
+    chunks = chunk_pages([page], max_chars=200, overlap_chars=0)
+    assert len(chunks) > 1
+    assert all(len(c['text']) <= 200 for c in chunks)
+    assert all((c['first_page'], c['last_page']) == (1, 1) for c in chunks)
+    assert ''.join(c['text'] for c in chunks) == page
+def test_chunk_pages_hard_cuts_single_long_line():
+    chunks = chunk_pages(['x' * 250], max_chars=100, overlap_chars=0)
+    assert [len(c['text']) for c in chunks] == [100, 100, 50]
+def test_merge_events_dedups_by_normalized_name_and_date():
+    merged = merge_events([
+        [{'name': 'Harvest Nights', 'event_date': 'Oct 2, 2025', 'url': None},
+         {'name': 'Bootanical Bash', 'event_date': 'Oct 30, 2025'}],
+        [{'name': 'harvest  nights!', 'event_date': 'oct 2 2025', 'url': 'https://example.com', 'venue_name': ''},
+         {'name': 'Harvest Nights', 'event_date': 'Oct 9, 2025'}],
+    ])
+    assert merged == [
+        {'name': 'Harvest Nights', 'event_date': 'Oct 2, 2025', 'url': 'https://example.com'},
+        {'name': 'Bootanical Bash', 'event_date': 'Oct 30, 2025'},
+        {'name': 'Harvest Nights', 'event_date': 'Oct 9, 2025'},
+    ]
+def test_merge_events_keeps_first_value_and_nameless_events():
+    merged = merge_events([
+        [{'name': 'Gala', 'event_date': None, 'description': 'first'}, {'description': 'no name'}, 'junk'],
+        None,
+        [{'name': 'Gala', 'description': 'second'}, {'description': 'no name'}],
+    ])
+    assert merged == [{'name': 'Gala', 'event_date': None, 'description': 'first'},
+                      {'description': 'no name'}, {'description': 'no name'}]
+def test_extract_events_merges_event_straddling_chunks():
+    pages = ['Programme\n' + listing('Opening Night', 'May 1, 2025'),
+             'Later that month\n' + listing('Closing Night', 'May 9, 2025')]
+    model = FakeModel(events_in)
+    events = extract_events(pages, build_prompt, model, SCHEMA, max_chars=60, overlap_chars=40)
+    # The overlap repeats the first listing in the second chunk; the merge keeps one copy.
+    assert [prompt.count('Opening Night') for prompt in model.prompts] == [1, 1]
+    assert events == [{'name': 'Opening Night', 'event_date': 'May 1, 2025'},
+                      {'name': 'Closing Night', 'event_date': 'May 9, 2025'}]
+def test_extract_events_partial_failure_returns_other_chunks():
+    def responder(prompt):
+        if 'BROKEN' in prompt:
+            raise RuntimeError('model unavailable')
+        return events_in(prompt)
+    pages = [listing('First', 'June 1'), 'BROKEN page', listing('Third', 'June 3')]
+    events = extract_events(pages, build_prompt, FakeModel(responder), SCHEMA, max_chars=20, overlap_chars=0)
+    assert [event['name'] for event in events] == ['First', 'Third']
+def test_extract_events_invalid_json_chunk_counts_as_empty():
+    class BadJsonModel(FakeModel):
+        def generate_content(self, prompt, generation_config=None, timeout=None):
+            response = super().generate_content(prompt, generation_config, timeout)
+            if 'GARBLED' in prompt:
+                response.text = '[{"name": '
+            return response
+    pages = [listing('Kept', 'July 4'), 'GARBLED']
+    events = extract_events(pages, build_prompt, BadJsonModel(events_in), SCHEMA, max_chars=20, overlap_chars=0)
+    assert events == [{'name': 'Kept', 'event_date': 'July 4'}]
+def test_extract_events_total_failure_raises_first_error():
+    def responder(prompt):
+        raise ValueError(f'failed on {prompt[:6]}')
+    pages = ['page 1 text', 'page 2 text']
+    with pytest.raises(ValueError, match='failed on page 1'):
+        extract_events(pages, build_prompt, FakeModel(responder), SCHEMA, max_chars=12, overlap_chars=0)
+def test_extract_events_empty_document_makes_no_calls():
+    model = FakeModel(events_in)
+    assert extract_events(['', '  \n'], build_prompt, model, SCHEMA) == []
+    assert model.prompts == []
+def test_extract_events_through_client_matches_direct_calls():
+    pages = [listing(f'Show {n}', f'Aug {n}') for n in range(1, 9)]
+    direct = extract_events(pages, build_prompt, FakeModel(events_in), SCHEMA, max_chars=30, overlap_chars=0)
+    client = LLMClient(FakeModel(events_in, latency=0.01), max_concurrency=4, requests_per_minute=0, max_retries=0)
+    pooled = extract_events(pages, build_prompt, client, SCHEMA, max_chars=30, overlap_chars=0)
+    assert pooled == direct
+    assert [event['name'] for event in pooled] == [f'Show {n}' for n in range(1, 9)]
@@ -0,0 +1,99 @@
+import json
+import pytest
+from transform_registry import TRANSFORM_SPECS, TransformerRegistry
+# The hand-written per-source transforms the registry replaced are kept in benchmarks.py.
+benchmarks = pytest.importorskip('benchmarks')
+# Same routing as transform_data.transformers, with the LLM-backed PDF handler left out.
+registry = TransformerRegistry({
+    **TRANSFORM_SPECS,
+    'pdf': {'handler': lambda raw_item: None, 'match_prefixes': ['manual_upload_'], 'uses_llm': True},
+})
+STRUCTURED_SPIDERS = ['nashville_arcgis', 'ticketmaster', 'yelp', 'google_places', 'generic', 'seatgeek',
+                      'document', 'document_csv', 'sheet_xlsx', 'legacy_xls', 'minutes_docx']
+FULL_ROW = {
+    'name': 'Harvest Nights', 'venue_name': 'Farmers Market', 'venue_address': '900 Rosa L Parks Blvd',
+    'venue_city': 'Nashville', 'description': 'Food and music', 'url': 'https://example.com/harvest',
+    'category': 'live_music', 'event_date': '2025-10-02T17:00:00', 'latitude': '36.17', 'longitude': '-86.79',
+    'season': 'Fall', 'genre': 'Bluegrass',
+}
+ROWS = {
+    'full': FULL_ROW,
+    'name_only': {'name': 'Harvest Nights'},
+    'empty_values': {**{key: '' for key in FULL_ROW}, 'name': 'Harvest Nights'},
+    'null_values': {**{key: None for key in FULL_ROW}, 'name': 'Harvest Nights', 'category': 'Event'},
+    'no_venue_name': {key: value for key, value in FULL_ROW.items() if key != 'venue_name'},
+    'empty_name': {**FULL_ROW, 'name': ''},
+    'missing_name': {key: value for key, value in FULL_ROW.items() if key != 'name'},
+    'numeric_coordinates': {**FULL_ROW, 'latitude': 36.17, 'longitude': 0},
+    'bad_latitude': {**FULL_ROW, 'latitude': 'north'},
+    'bad_longitude': {**FULL_ROW, 'longitude': [86.79]},
+    'null_category': {**FULL_ROW, 'category': None},
+    'numeric_category': {**FULL_ROW, 'category': 7},
+}
+def registry_row(raw_json, source_spider):
+    transformer = registry.resolve(source_spider)
+    outputs, errors = transformer.transform_batch([(1, raw_json, source_spider)])
+    if errors:
+        raise errors[0]
+    return outputs[0]
+def outcome(transform, raw_json, source_spider):
+    """A transform's result as a list of events, or the type of the exception it raised."""
+    try:
+        result = transform(raw_json, source_spider)
+    except Exception as e:
+        return type(e)
+    if not result:
+        return []
+    return result if isinstance(result, list) else [result]
+def legacy_row(raw_json, source_spider):
+    return benchmarks.legacy_transform_row(1, raw_json, source_spider)
+@pytest.mark.parametrize('row', ROWS)
+@pytest.mark.parametrize('source_spider', STRUCTURED_SPIDERS)
+def test_registry_matches_legacy(source_spider, row):
+    raw_json = json.dumps(ROWS[row])
+    assert outcome(registry_row, raw_json, source_spider) == outcome(legacy_row, raw_json, source_spider)
+def test_registry_matches_legacy_on_benchmark_rows():
+    for _, raw_json, source_spider in benchmarks.make_raw_rows(rows=500):
+        assert outcome(registry_row, raw_json, source_spider) == outcome(legacy_row, raw_json, source_spider)
+def test_missing_and_empty_keys_differ():
+    missing = registry_row(json.dumps(ROWS['name_only']), 'yelp')
+    empty = registry_row(json.dumps(ROWS['empty_values']), 'yelp')
+    # A missing key takes the default; an empty value is kept as it is.
+    assert (missing['venue_city'], missing['category']) == ('Nashville', 'Business')
+    assert (empty['venue_city'], empty['category']) == ('', '')
+    assert registry_row(json.dumps(ROWS['name_only']), 'ticketmaster') is None
+@pytest.mark.parametrize('row, error', [('bad_latitude', ValueError), ('bad_longitude', TypeError),
+                                        ('null_category', AttributeError), ('numeric_category', AttributeError)])
+@pytest.mark.parametrize('source_spider', ['ticketmaster', 'yelp', 'google_places', 'generic', 'seatgeek'])
+def test_bad_values_fail_the_row(source_spider, row, error):
+    with pytest.raises(error):
+        registry_row(json.dumps(ROWS[row]), source_spider)
+@pytest.mark.parametrize('row', ['null_category', 'numeric_category'])
+@pytest.mark.parametrize('source_spider', ['nashville_arcgis', 'document'])
+def test_bad_label_fails_the_row(source_spider, row):
+    with pytest.raises(AttributeError):
+        registry_row(json.dumps(ROWS[row]), source_spider)
+def test_document_coordinates_are_safe_per_field():
+    item = registry_row(json.dumps(ROWS['bad_latitude']), 'document_csv')
+    assert (item['latitude'], item['longitude']) == (None, -86.79)
+    assert item['source'] == 'Document Upload (CSV)'
+    assert item['category'] == 'Live Music'
+@pytest.mark.parametrize('row', ['bad_latitude', 'bad_longitude'])
+def test_arcgis_bad_coordinate_drops_both(row):
+    item = registry_row(json.dumps(ROWS[row]), 'nashville_arcgis')
+    assert (item['latitude'], item['longitude']) == (None, None)
+    assert item['venue_name'] == 'Harvest Nights'
+@pytest.mark.parametrize('source_spider, name', [
+    ('seatgeek', 'seatgeek'),
+    ('pdf', 'pdf'),
+    ('manual_upload_pdf', 'pdf'),
+    # manual_upload_ was matched before the document extensions in the old dispatch too.
+    ('manual_upload_csv', 'pdf'),
+    ('document_csv', 'document'),
+    ('events.xlsx', 'document'),
+    ('docx', 'document'),
+])
+def test_resolve_prefixes_and_substrings(source_spider, name):
+    assert registry.resolve(source_spider).name == name
+def test_resolve_unknown_spider():
+    assert registry.resolve('nashville.com-events') is None
@@ -2,8 +2,15 @@ import os
 import json
 import psycopg2
 import re
+from collections import Counter
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from metrics import incr
+from llm_extraction import extract_events, fan_out
+from llm_cache import llm_cache
+from llm_prefilter import prefilter_pages
+from llm_client import LLMClient, LLM_BACKEND, build_backend
+from transform_registry import TRANSFORM_SPECS, TransformerRegistry, document_file_type
 try:
     genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
     model = genai.GenerativeModel(
@@ -23,6 +30,11 @@ except KeyError:
 except Exception as e:
     print(f"CRITICAL ERROR: Failed to configure AI model. Error: {e}")
     model = None
+# Every AI extraction shares one client so concurrency and the requests-per-minute limit hold process-wide.
+backend = build_backend(LLM_BACKEND, model)
+model = LLMClient(backend) if backend else None
+PDF_PROMPT_VERSION = 'pdf-v1'
+DOCUMENT_PROMPT_VERSION = 'document-v1'
 event_schema = {
     "type": "ARRAY",
     "items": {
@@ -51,194 +63,6 @@ def get_db_connection():
     except Exception as e:
         print(f"CRITICAL ERROR: Could not connect to database. Error: {e}")
         return None
-def transform_arcgis_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    category = raw_data.get('category', 'Civic Facility')
-    try:
-        latitude = float(raw_data.get('latitude')) if raw_data.get(
-            'latitude') else None
-        longitude = float(raw_data.get('longitude')
-                          ) if raw_data.get('longitude') else None
-    except (ValueError, TypeError):
-        latitude = None
-        longitude = None
-        print(
-            f"WARNING: Skipped bad coordinates for ArcGIS item: {raw_data.get('name')}")
-    clean_item = {
-        'source': 'Nashville ArcGIS',
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': category.replace('_', ' ').title(),
-        'latitude': latitude,
-        'longitude': longitude,
-        'event_date': None,
-        'season': None,
-        'genre': None,
-    }
-    if not clean_item.get('name') or not clean_item.get('venue_name'):
-        return None
-    return clean_item
-def transform_ticketmaster_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    event_date = raw_data.get('event_date')
-    clean_item = {
-        'source': 'Ticketmaster',
-        'name': raw_data.get('name'),
-        'url': raw_data.get('url'),
-        'venue_name': raw_data.get('venue_name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city'),
-        'description': raw_data.get('description'),
-        'event_date': event_date,
-        'category': raw_data.get('category', 'Event').title(),
-        'genre': raw_data.get('genre'),
-        'season': raw_data.get('season'),
-        'latitude': float(raw_data.get('latitude')) if raw_data.get('latitude') else None,
-        'longitude': float(raw_data.get('longitude')) if raw_data.get('longitude') else None,
-    }
-    if not clean_item.get('name') or not clean_item.get('venue_name'):
-        return None
-    return clean_item
-def transform_yelp_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    clean_item = {
-        'source': 'Yelp',
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': raw_data.get('category', 'Business').title(),
-        'latitude': float(raw_data.get('latitude')) if raw_data.get('latitude') else None,
-        'longitude': float(raw_data.get('longitude')) if raw_data.get('longitude') else None,
-        'event_date': None,
-        'season': None,
-        'genre': None,
-    }
-    if not clean_item.get('name'):
-        return None
-    return clean_item
-def transform_google_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    clean_item = {
-        'source': 'Google Places',
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': raw_data.get('category', 'Attraction').title(),
-        'latitude': float(raw_data.get('latitude')) if raw_data.get('latitude') else None,
-        'longitude': float(raw_data.get('longitude')) if raw_data.get('longitude') else None,
-        'event_date': None,
-        'season': None,
-        'genre': None, }
-    if not clean_item.get('name'):
-        return None
-    return clean_item
-def transform_generic_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    source_map = {
-        'nashville.com-events': 'Nashville Events',
-        'nashville.com-hotels': 'Nashville Hotels',
-        'underdog': 'Underdog Venue',
-    }
-    display_source = source_map.get(raw_item.get(
-        'source_spider', 'Unknown'), raw_item.get('source_spider', 'Unknown'))
-    clean_item = {
-        'source': display_source,
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('venue_name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': raw_data.get('category', 'General').title(),
-        'event_date': raw_data.get('event_date'),
-        'latitude': float(raw_data.get('latitude')) if raw_data.get('latitude') else None,
-        'longitude': float(raw_data.get('longitude')) if raw_data.get('longitude') else None,
-        'season': raw_data.get('season'),
-        'genre': raw_data.get('genre'),
-    }
-    if not clean_item.get('name'):
-        return None
-    return clean_item
-def transform_seatgeek_data(raw_item: dict) -> dict:
-    raw_data = json.loads(raw_item['raw_json'])
-    clean_item = {
-        'source': 'SeatGeek',
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('venue_name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': raw_data.get('category', 'Event').title(),
-        'event_date': raw_data.get('event_date'),
-        'latitude': float(raw_data.get('latitude')) if raw_data.get('latitude') else None,
-        'longitude': float(raw_data.get('longitude')) if raw_data.get('longitude') else None,
-        'season': raw_data.get('season'),
-        'genre': raw_data.get('genre'),
-    }
-    if not clean_item.get('name') or not clean_item.get('venue_name'):
-        return None
-    return clean_item
-def transform_document_data(raw_item: dict) -> list[dict]:
-    """
-    Transform data from document spider (CSV, Excel, Word).
-    Handles both structured data and AI-extracted content.
-    Args:
-        raw_item: Raw data dictionary from database
-    Returns:
-        List of cleaned event dictionaries
-    """
-    try:
-        raw_data = json.loads(raw_item['raw_json'])
-    except json.JSONDecodeError:
-        print(
-            f"ERROR: Could not parse raw_json for {raw_item.get('source_spider')}. Skipping.")
-        return []
-    source_spider = raw_item.get('source_spider', '')
-    file_type = 'unknown'
-    if 'csv' in source_spider:
-        file_type = 'csv'
-    elif 'xlsx' in source_spider or 'xls' in source_spider:
-        file_type = 'excel'
-    elif 'docx' in source_spider:
-        file_type = 'word'
-    if 'text' in raw_data and 'original_filepath' in raw_data:
-        return _extract_with_ai(raw_data, file_type)
-    clean_item = {
-        'source': f'Document Upload ({file_type.upper()})',
-        'name': raw_data.get('name'),
-        'venue_name': raw_data.get('venue_name') or raw_data.get('name'),
-        'venue_address': raw_data.get('venue_address'),
-        'venue_city': raw_data.get('venue_city', 'Nashville'),
-        'description': raw_data.get('description'),
-        'url': raw_data.get('url'),
-        'category': raw_data.get('category', 'Document Extracted').replace('_', ' ').title(),
-        'event_date': raw_data.get('event_date'),
-        'latitude': _safe_float(raw_data.get('latitude')),
-        'longitude': _safe_float(raw_data.get('longitude')),
-        'season': raw_data.get('season'),
-        'genre': raw_data.get('genre'),
-    }
-    if not clean_item.get('name'):
-        print(f"WARNING: Document item skipped, no name.")
-        return []
-    return [clean_item]
-def _safe_float(value: any) -> float:
-    """Safely convert value to float."""
-    try:
-        return float(value) if value else None
-    except (ValueError, TypeError):
-        return None
 def _extract_with_ai(raw_data: dict, file_type: str) -> list[dict]:
     """
     Extract events from unstructured document text using AI.
@@ -263,9 +87,10 @@ def _extract_with_ai(raw_data: dict, file_type: str) -> list[dict]:
     print(
         f"--- Calling AI to extract events from {file_type.upper()}: {os.path.basename(filepath)} ---")
 
-    try:
-        prompt = f"""
+    def build_prompt(chunk: dict, chunk_count: int) -> str:
+        return f"""
         Analyze the following text extracted from a {file_type.upper()} document named '{os.path.basename(filepath)}'.
+        This is part of the document covering pages {chunk['first_page']}-{chunk['last_page']} ({chunk_count} parts in total); parts overlap slightly.
         Your task is to identify and extract distinct events, attractions, or points of interest mentioned.
         
         Guidelines:
@@ -281,22 +106,13 @@ def _extract_with_ai(raw_data: dict, file_type: str) -> list[dict]:
         
         TEXT_TO_PARSE:
         --- START TEXT ---
-        {raw_text[:15000]}
+        {chunk['text']}
         --- END TEXT ---
         """
-
-        response = model.generate_content(
-            prompt,
-            generation_config={"response_schema": event_schema}
-        )
-
-        try:
-            extracted_events_json = json.loads(response.text)
-        except json.JSONDecodeError as json_err:
-            print(
-                f"CRITICAL ERROR: AI returned invalid JSON for {filepath}. Error: {json_err}")
-            print(f"AI Response Text: {response.text[:500]}...")
-            return []
+    try:
+        extracted_events_json = extract_events(
+            raw_data.get('pages') or [raw_text], build_prompt, model, event_schema, label=filepath,
+            cache=llm_cache, prompt_version=DOCUMENT_PROMPT_VERSION)
         print(
             f"--- AI successfully extracted {len(extracted_events_json)} events from {filepath} ---")
         clean_events = []
@@ -357,18 +173,22 @@ def transform_pdf_data(raw_item: dict) -> list[dict]:
         print(
             f"ERROR: Could not parse raw_json for {raw_item.get('source_spider')}. Skipping.")
         return []
-    if 'text' in raw_data and 'original_filepath' in raw_data:
-        raw_text = raw_data.get('text', '')
+    if ('pages' in raw_data or 'text' in raw_data) and 'original_filepath' in raw_data:
+        # Uploads store only 'pages'; rows queued before that carry the joined 'text' instead.
+        pages = raw_data.get('pages') or [raw_data.get('text', '')]
+        raw_text = '\n'.join(pages)
         filepath = raw_data.get('original_filepath', 'Untitled PDF')
+        display_name = raw_data.get('original_filename') or os.path.basename(filepath)
         print(
-            f"--- Calling AI to extract events from PDF: {os.path.basename(filepath)} ---")
+            f"--- Calling AI to extract events from PDF: {display_name} ---")
         if not raw_text or len(raw_text.strip()) < 20:
             print(
                 f"WARNING: Skipping AI call for {filepath} due to minimal text content.")
             return []
-        try:
-            prompt = f"""
-            Analyze the following text extracted from a PDF document named '{os.path.basename(filepath)}'.
+        def build_prompt(chunk: dict, chunk_count: int) -> str:
+            return f"""
+            Analyze the following text extracted from a PDF document named '{display_name}'.
+            This is part of the document covering pages {chunk['first_page']}-{chunk['last_page']} ({chunk_count} parts in total); parts overlap slightly.
             Your task is to identify and extract distinct events, attractions, or points of interest mentioned.
             Ignore advertisements unless they are describing a specific, dated event.
             Ignore general directories or lists of businesses unless they contain specific event details (name, date/season, venue).
@@ -380,20 +200,14 @@ def transform_pdf_data(raw_item: dict) -> list[dict]:
 
             TEXT_TO_PARSE:
             --- START TEXT ---
-            {raw_text[:15000]}
+            {chunk['text']}
             --- END TEXT ---
             """
-            response = model.generate_content(
-                prompt,
-                generation_config={"response_schema": event_schema}
-            )
-            try:
-                extracted_events_json = json.loads(response.text)
-            except json.JSONDecodeError as json_err:
-                print(
-                    f"CRITICAL ERROR: AI returned invalid JSON for {filepath}. Error: {json_err}")
-                print(f"AI Response Text: {response.text[:500]}...")
-                return []
+        try:
+            extracted_events_json = extract_events(
+                prefilter_pages(pages, label=display_name),
+                build_prompt, model, event_schema, label=display_name,
+                cache=llm_cache, prompt_version=PDF_PROMPT_VERSION)
             print(
                 f"--- AI successfully extracted {len(extracted_events_json)} potential events from {filepath} ---")
             clean_events = []
@@ -462,49 +276,49 @@ def transform_pdf_data(raw_item: dict) -> list[dict]:
             print(f"WARNING: Structured PDF item skipped, no name or URL.")
             return []
         return [clean_item]
-def run_transformations():
-    print("transform started")
-    conn = get_db_connection()
-    if not conn:
-        print("CRITICAL: No database connection. Transform task exiting.")
-        return
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT id, raw_json, source_spider FROM raw_data")
-        raw_results = cursor.fetchall()
-    except Exception as e:
-        print(f"CRITICAL: Failed to fetch from raw_data. Error: {e}")
-        conn.close()
-        return
+def _extract_document_with_ai(raw_data: dict, source_spider: str) -> list[dict]:
+    return _extract_with_ai(raw_data, document_file_type(source_spider))
+transformers = TransformerRegistry({
+    **TRANSFORM_SPECS,
+    'document': {**TRANSFORM_SPECS['document'], 'unstructured': _extract_document_with_ai},
+    'pdf': {'handler': transform_pdf_data, 'match_prefixes': ['manual_upload_'], 'uses_llm': True},
+})
+def _uses_llm(source_spider):
+    transformer = transformers.resolve(source_spider)
+    return bool(transformer and transformer.uses_llm)
+def _transform_rows(rows, items_in, items_out, item_errors, parallel=False):
+    """
+    Transform raw rows a source at a time through the registry, returning (events, processed raw ids).
+    With parallel set every row is its own job on the model's worker pool, for sources that wait on the model.
+    """
+    batches = {}
+    for row in rows:
+        transformer = transformers.resolve(row[2])
+        if transformer is None:
+            items_in[row[2]] += 1
+            print(f"WARNING: No transformer for spider '{row[2]}', skipping item id {row[0]}")
+            continue
+        batches.setdefault(transformer, []).append(row)
+    if parallel:
+        work = [(transformer, [row]) for transformer, batch in batches.items() for row in batch]
+    else:
+        work = list(batches.items())
+    def run(job):
+        transformer, batch = job
+        outputs, errors = transformer.transform_batch(batch)
+        return [(row, outputs[index], errors.get(index)) for index, row in enumerate(batch)]
+    if parallel:
+        results = [result for batch_results in fan_out(model, run, work) for result in batch_results]
+    else:
+        results = [result for job in work for result in run(job)]
     transformed_events = []
     processed_raw_ids = []
-    for row in raw_results:
-        raw_id, raw_json_str, source_spider = row
-        raw_item = {'raw_json': raw_json_str, 'source_spider': source_spider}
-        transformed = None
-        try:
-            if source_spider == 'nashville_arcgis':
-                transformed = transform_arcgis_data(raw_item)
-            elif source_spider == 'ticketmaster':
-                transformed = transform_ticketmaster_data(raw_item)
-            elif source_spider == 'yelp':
-                transformed = transform_yelp_data(raw_item)
-            elif source_spider == 'google_places':
-                transformed = transform_google_data(raw_item)
-            elif source_spider == 'generic':
-                transformed = transform_generic_data(raw_item)
-            elif source_spider == 'pdf' or source_spider.startswith('manual_upload_'):
-                transformed = transform_pdf_data(raw_item)
-            elif source_spider == 'document' or any(ext in source_spider for ext in ['csv', 'xlsx', 'xls', 'docx']):
-                transformed = transform_document_data(raw_item)
-            elif source_spider == 'seatgeek':
-                transformed = transform_seatgeek_data(raw_item)
-            else:
-                print(
-                    f"WARNING: No transformer for spider '{source_spider}', skipping item id {raw_id}")
-        except Exception as e:
+    for (raw_id, _, source_spider), transformed, error in results:
+        items_in[source_spider] += 1
+        if error:
             print(
-                f"CRITICAL ERROR: Failed to process item id {raw_id} from {source_spider}. Error: {str(e)}")
+                f"CRITICAL ERROR: Failed to process item id {raw_id} from {source_spider}. Error: {str(error)}")
+            item_errors[source_spider] += 1
             continue
         if transformed:
             processed_raw_ids.append(raw_id)
@@ -512,55 +326,56 @@ def run_transformations():
                 for item in transformed:
                     if item:
                         transformed_events.append(item)
+                        items_out[source_spider] += 1
             else:
                 transformed_events.append(transformed)
-    print(
-        f"Transforming {len(raw_results)} raw items... {len(transformed_events)} clean events created.")
-    if not transformed_events:
-        print("No events to insert. Transform task finished.")
-        cursor.close()
-        conn.close()
-        return
-    ts_vector_sql = "to_tsvector('english', COALESCE(%s, '') || ' ' || COALESCE(%s, '') || ' ' || COALESCE(%s, '') || ' ' || COALESCE(%s, ''))"
-    insert_query = f"""
-        INSERT INTO events (name, url, event_date, venue_name, venue_address, description, source, category, genre, season, latitude, longitude, search_vector)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, {ts_vector_sql})
-        ON CONFLICT (url) DO NOTHING
-        """
-    records_to_insert = []
-    for event in transformed_events:
-        text_for_search = (event.get('name'), event.get(
-            'venue_name'), event.get('venue_address'), event.get('description'))
-        event_values = (
-            event.get('name'),
-            event.get('url'),
-            event.get('event_date'),
-            event.get('venue_name'),
-            event.get('venue_address'),
-            event.get('description'),
-            event.get('source'),
-            event.get('category'),
-            event.get('genre'),
-            event.get('season'),
-            event.get('latitude'),
-            event.get('longitude')
-        )
-        records_to_insert.append(event_values + text_for_search)
+                items_out[source_spider] += 1
+    return transformed_events, processed_raw_ids
+def _load_events(conn, cursor, transformed_events, processed_raw_ids):
+    """Insert clean events and delete the raw rows they came from. Returns the number of rows loaded."""
     items_loaded = 0
-    try:
-        for record in records_to_insert:
-            try:
-                cursor.execute(insert_query, record)
-                items_loaded += cursor.rowcount
-            except Exception as e:
-                print(f"ERROR inserting record: {record[0]}. Error: {e}")
-                conn.rollback()
-        conn.commit()
-        print(
-            f"Successfully inserted/updated {items_loaded} items into events table.")
-    except Exception as e:
-        print(f"CRITICAL: Database commit failed. Error: {e}")
-        conn.rollback()
+    if transformed_events:
+        ts_vector_sql = "to_tsvector('english', COALESCE(%s, '') || ' ' || COALESCE(%s, '') || ' ' || COALESCE(%s, '') || ' ' || COALESCE(%s, ''))"
+        insert_query = f"""
+            INSERT INTO events (name, url, event_date, venue_name, venue_address, description, source, category, genre, season, latitude, longitude, search_vector)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, {ts_vector_sql})
+            ON CONFLICT (url) DO NOTHING
+            """
+        records_to_insert = []
+        for event in transformed_events:
+            text_for_search = (event.get('name'), event.get(
+                'venue_name'), event.get('venue_address'), event.get('description'))
+            event_values = (
+                event.get('name'),
+                event.get('url'),
+                event.get('event_date'),
+                event.get('venue_name'),
+                event.get('venue_address'),
+                event.get('description'),
+                event.get('source'),
+                event.get('category'),
+                event.get('genre'),
+                event.get('season'),
+                event.get('latitude'),
+                event.get('longitude')
+            )
+            records_to_insert.append(event_values + text_for_search)
+        try:
+            for record in records_to_insert:
+                try:
+                    cursor.execute(insert_query, record)
+                    items_loaded += cursor.rowcount
+                except Exception as e:
+                    print(f"ERROR inserting record: {record[0]}. Error: {e}")
+                    conn.rollback()
+            conn.commit()
+            print(
+                f"Successfully inserted/updated {items_loaded} items into events table.")
+            incr('etl_items_in_total', {'stage': 'load', 'source': 'events'}, len(records_to_insert))
+            incr('etl_items_out_total', {'stage': 'load', 'source': 'events'}, items_loaded)
+        except Exception as e:
+            print(f"CRITICAL: Database commit failed. Error: {e}")
+            conn.rollback()
     if processed_raw_ids:
         try:
             delete_query = "DELETE FROM raw_data WHERE id IN %s"
@@ -571,6 +386,39 @@ def run_transformations():
         except Exception as e:
             print(f"ERROR: Failed to delete processed raw_data. Error: {e}")
             conn.rollback()
+    return items_loaded
+def run_transformations():
+    print("transform started")
+    conn = get_db_connection()
+    if not conn:
+        print("CRITICAL: No database connection. Transform task exiting.")
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, raw_json, source_spider FROM raw_data")
+        raw_results = cursor.fetchall()
+    except Exception as e:
+        print(f"CRITICAL: Failed to fetch from raw_data. Error: {e}")
+        conn.close()
+        return
+    items_in, items_out, item_errors = Counter(), Counter(), Counter()
+    structured_rows = [row for row in raw_results if not _uses_llm(row[2])]
+    llm_rows = [row for row in raw_results if _uses_llm(row[2])]
+    items_loaded = 0
+    # Structured sources are loaded first so they never wait on model latency.
+    for phase, rows, parallel in (('structured', structured_rows, False), ('llm', llm_rows, True)):
+        if not rows:
+            continue
+        transformed_events, processed_raw_ids = _transform_rows(rows, items_in, items_out, item_errors, parallel)
+        print(
+            f"Transforming {len(rows)} {phase} raw items... {len(transformed_events)} clean events created.")
+        items_loaded += _load_events(conn, cursor, transformed_events, processed_raw_ids)
+    for source_spider, count in items_in.items():
+        incr('etl_items_in_total', {'stage': 'transform', 'source': source_spider}, count)
+    for source_spider, count in items_out.items():
+        incr('etl_items_out_total', {'stage': 'transform', 'source': source_spider}, count)
+    for source_spider, count in item_errors.items():
+        incr('etl_item_errors_total', {'stage': 'transform', 'source': source_spider}, count)
     cursor.close()
     conn.close()
     print(f"transform all done. {items_loaded} items loaded to events table.")
@@ -0,0 +1,216 @@
+import json
+from functools import lru_cache
+OUTPUT_FIELDS = ('source', 'name', 'venue_name', 'venue_address', 'venue_city', 'description', 'url',
+                 'category', 'event_date', 'latitude', 'longitude', 'season', 'genre')
+def to_float(value):
+    """Convert value to float, None when empty; raises on values that are not numbers."""
+    return float(value) if value else None
+def safe_float(value):
+    """Convert value to float, or None when it is empty or not a number."""
+    try:
+        return float(value) if value else None
+    except (ValueError, TypeError):
+        return None
+def title(value):
+    return value.title()
+def label(value):
+    return value.replace('_', ' ').title()
+# Coercions raise on bad input (failing the row) unless named safe_*, like the transforms they replace.
+COERCIONS = {'float': to_float, 'safe_float': safe_float, 'title': title, 'label': label}
+GENERIC_SOURCE_NAMES = {
+    'nashville.com-events': 'Nashville Events',
+    'nashville.com-hotels': 'Nashville Hotels',
+    'underdog': 'Underdog Venue',
+}
+def document_file_type(source_spider):
+    if 'csv' in source_spider:
+        return 'csv'
+    if 'xlsx' in source_spider or 'xls' in source_spider:
+        return 'excel'
+    if 'docx' in source_spider:
+        return 'word'
+    return 'unknown'
+# Applied under every spec; a spec's own defaults, coercions and required fields take precedence.
+BASE_SPEC = {
+    'defaults': {'venue_city': 'Nashville'},
+    'coerce': {'category': 'title', 'latitude': 'float', 'longitude': 'float'},
+    'required': ['name'],
+}
+PLACE_FIELDS = {'venue_name': 'name', 'event_date': None, 'season': None, 'genre': None}
+# Declarative transforms from raw_data rows to events rows, keyed by source_spider:
+#   source: display source, or a callable taking the source_spider value
+#   fields: output field -> raw key, tuple of raw keys (first non-empty wins) or None (always null);
+#       unlisted fields read the raw key of the same name
+#   defaults: value used when the raw key is missing (None disables a base default)
+#   coerce: output field -> name in COERCIONS, applied after defaults
+#   coerce_together: fields coerced as a group; if any of them fails to coerce they are all null
+#   required: fields that must be non-empty or the row is dropped
+#   match_prefixes / match_substrings: also route source_spider values starting with / containing these
+#   handler: per-row function taking {'raw_json', 'source_spider'}, used instead of the field mapping
+#   unstructured: function taking (raw_data, source_spider) for rows carrying free 'text' to extract
+#   uses_llm: rows call the model, so they are transformed after structured sources
+TRANSFORM_SPECS = {
+    'nashville_arcgis': {
+        'source': 'Nashville ArcGIS',
+        'fields': PLACE_FIELDS,
+        'defaults': {'category': 'Civic Facility'},
+        'coerce': {'category': 'label'},
+        'coerce_together': ['latitude', 'longitude'],
+        'required': ['name', 'venue_name'],
+    },
+    'ticketmaster': {
+        'source': 'Ticketmaster',
+        'defaults': {'venue_city': None, 'category': 'Event'},
+        'required': ['name', 'venue_name'],
+    },
+    'yelp': {
+        'source': 'Yelp',
+        'fields': PLACE_FIELDS,
+        'defaults': {'category': 'Business'},
+    },
+    'google_places': {
+        'source': 'Google Places',
+        'fields': PLACE_FIELDS,
+        'defaults': {'category': 'Attraction'},
+    },
+    'generic': {
+        'source': lambda source_spider: GENERIC_SOURCE_NAMES.get(source_spider, source_spider),
+        'defaults': {'category': 'General'},
+    },
+    'seatgeek': {
+        'source': 'SeatGeek',
+        'defaults': {'category': 'Event'},
+        'required': ['name', 'venue_name'],
+    },
+    'document': {
+        'source': lambda source_spider: f"Document Upload ({document_file_type(source_spider).upper()})",
+        'fields': {'venue_name': ('venue_name', 'name')},
+        'defaults': {'category': 'Document Extracted'},
+        'coerce': {'category': 'label', 'latitude': 'safe_float', 'longitude': 'safe_float'},
+        'match_substrings': ['csv', 'xlsx', 'xls', 'docx'],
+    },
+}
+def _field_plan(field, spec):
+    keys = spec['fields'].get(field, field)
+    if isinstance(keys, str):
+        keys = (keys,)
+    coercion = spec['coerce'].get(field)
+    return field, keys, spec['defaults'].get(field), COERCIONS[coercion] if coercion else None
+def _read(data, keys, default):
+    if keys is None:
+        return None
+    if len(keys) == 1:
+        return data.get(keys[0], default)
+    for key in keys:
+        if value := data.get(key):
+            return value
+    return default
+def compile_builder(spec):
+    """
+    Turn a merged spec into a function building one event from a decoded raw dict and its
+    display source. Returns None when a required field is empty; a coercion error propagates.
+    """
+    together = spec['coerce_together']
+    plan = [_field_plan(field, spec) for field in OUTPUT_FIELDS if field != 'source' and field not in together]
+    grouped = [_field_plan(field, spec) for field in together]
+    required = spec['required']
+    def build(data, source):
+        item = {'source': source}
+        for field, keys, default, coerce in plan:
+            value = _read(data, keys, default)
+            item[field] = coerce(value) if coerce else value
+        try:
+            for field, keys, default, coerce in grouped:
+                value = _read(data, keys, default)
+                item[field] = coerce(value) if coerce else value
+        except (ValueError, TypeError):
+            for field in together:
+                item[field] = None
+        return item if all(item[field] for field in required) else None
+    return build
+def _decode_rows(rows):
+    """Decode raw_json for a batch in one call, falling back to row by row if any row is malformed."""
+    try:
+        return json.loads('[' + ','.join(raw_json for _, raw_json, _ in rows) + ']'), None
+    except (json.JSONDecodeError, TypeError):
+        decoded, errors = [], {}
+        for index, (_, raw_json, _) in enumerate(rows):
+            try:
+                decoded.append(json.loads(raw_json))
+            except (json.JSONDecodeError, TypeError) as e:
+                decoded.append(None)
+                errors[index] = e
+        return decoded, errors
+class SourceTransformer:
+    """One compiled TRANSFORM_SPECS entry."""
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        self.uses_llm = spec.get('uses_llm', False)
+        self.handler = spec.get('handler')
+        self.unstructured = spec.get('unstructured')
+        source = spec.get('source', name)
+        self.source_for = source if callable(source) else lambda _: source
+        if not self.handler:
+            merged = {
+                'fields': spec.get('fields', {}),
+                'defaults': {**BASE_SPEC['defaults'], **spec.get('defaults', {})},
+                'coerce': {**BASE_SPEC['coerce'], **spec.get('coerce', {})},
+                'coerce_together': spec.get('coerce_together', ()),
+                'required': spec.get('required', BASE_SPEC['required']),
+            }
+            self.build = compile_builder(merged)
+    def transform_batch(self, rows):
+        """
+        Transform raw_data rows routed to this source.
+        Args:
+            rows: List of (raw id, raw_json, source_spider) tuples
+        Returns:
+            Tuple of (per-row output: an event dict, a list of them or None; mapping of row index to exception)
+        """
+        outputs, errors = [None] * len(rows), {}
+        if self.handler:
+            for index, (_, raw_json, source_spider) in enumerate(rows):
+                try:
+                    outputs[index] = self.handler({'raw_json': raw_json, 'source_spider': source_spider})
+                except Exception as e:
+                    errors[index] = e
+            return outputs, errors
+        datas, decode_errors = _decode_rows(rows)
+        errors.update(decode_errors or {})
+        structured = []
+        for index, data in enumerate(datas):
+            if index in errors:
+                continue
+            if self.unstructured and isinstance(data, dict) and 'text' in data and 'original_filepath' in data:
+                try:
+                    outputs[index] = self.unstructured(data, rows[index][2])
+                except Exception as e:
+                    errors[index] = e
+            else:
+                structured.append(index)
+        source_by_spider = {spider: self.source_for(spider) for spider in {row[2] for row in rows}}
+        for index in structured:
+            try:
+                outputs[index] = self.build(datas[index], source_by_spider[rows[index][2]])
+            except Exception as e:
+                errors[index] = e
+        return outputs, errors
+class TransformerRegistry:
+    """
+    Compiles every spec once and routes source_spider values to them. Exact names are a dict
+    lookup; prefix and substring matches are resolved once per distinct value and cached.
+    """
+    def __init__(self, specs):
+        self.transformers = {name: SourceTransformer(name, spec) for name, spec in specs.items()}
+        self.resolve = lru_cache(maxsize=1024)(self._resolve)
+    def _resolve(self, source_spider):
+        if transformer := self.transformers.get(source_spider):
+            return transformer
+        for transformer in self.transformers.values():
+            if any(source_spider.startswith(prefix) for prefix in transformer.spec.get('match_prefixes', ())):
+                return transformer
+        for transformer in self.transformers.values():
+            if any(part in source_spider for part in transformer.spec.get('match_substrings', ())):
+                return transformer
+        return None
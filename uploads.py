@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import hashlib
+import tempfile
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_KEY_PREFIX = 'upload:'
+# Uploads still queued or processing after this long are treated as lost (e.g. a worker died)
+# and may be uploaded again; their Redis records also expire after it.
+UPLOAD_STALE_SECONDS = int(os.getenv('UPLOAD_STALE_SECONDS', '3600'))
+IN_FLIGHT_STATUSES = {'queued', 'processing'}
+def save_upload(file_storage, upload_folder, file_extension):
+    """
+    Stream an uploaded file to disk while hashing it, storing it content-addressed.
+    Args:
+        file_storage: werkzeug FileStorage from the request
+        upload_folder: Directory that holds uploaded files
+        file_extension: Lower-case extension without the dot
+    Returns:
+        Tuple of (sha256 hex digest, final file path)
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while chunk := file_storage.stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+        content_hash = digest.hexdigest()
+        filepath = os.path.join(upload_folder, f"{content_hash}.{file_extension}")
+        if os.path.exists(filepath):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, filepath)
+        return content_hash, filepath
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+def get_upload_status(redis_client, content_hash):
+    if not redis_client or not content_hash:
+        return None
+    try:
+        record = redis_client.hgetall(f"{UPLOAD_KEY_PREFIX}{content_hash}")
+        return record or None
+    except Exception as e:
+        print(f"Error reading upload status for {content_hash}: {e}", file=sys.stderr)
+        return None
+def is_duplicate_upload(record, now=None):
+    """
+    True when an upload with this content should not be processed again: it completed, or it
+    is queued or processing and was updated within UPLOAD_STALE_SECONDS. Failed uploads may be retried.
+    """
+    if not record:
+        return False
+    status = record.get('status')
+    if status == 'complete':
+        return True
+    if status in IN_FLIGHT_STATUSES:
+        age = (now or time.time()) - float(record.get('updated_at') or 0)
+        return age < UPLOAD_STALE_SECONDS
+    return False
+def set_upload_status(redis_client, content_hash, status, **fields):
+    if not redis_client or not content_hash:
+        return
+    record_key = f"{UPLOAD_KEY_PREFIX}{content_hash}"
+    record = {'status': status, 'updated_at': time.time()}
+    record.update({key: value for key, value in fields.items() if value is not None})
+    try:
+        redis_client.hset(record_key, mapping=record)
+        if status in IN_FLIGHT_STATUSES:
+            redis_client.expire(record_key, UPLOAD_STALE_SECONDS)
+        else:
+            redis_client.persist(record_key)
+    except Exception as e:
+        print(f"Error setting upload status for {content_hash}: {e}", file=sys.stderr)
+def clear_upload_records(redis_client):
+    if not redis_client:
+        return 0
+    cleared = 0
+    try:
+        for key in redis_client.scan_iter(match=f"{UPLOAD_KEY_PREFIX}*", count=500):
+            cleared += redis_client.delete(key)
+    except Exception as e:
+        print(f"Error clearing upload records: {e}", file=sys.stderr)
+    return cleared